@@ -0,0 +1,117 @@
+# api_server/ai_cache.py
+"""
+Result cache for POST /ai/enhance.
+
+Results are keyed by a hash of the normalized prompt fields, the provider
+and model, and PROMPT_VERSION, so re-enhancing an unchanged product is a
+lookup while any edit, model switch or prompt change misses. Entries live
+in Mongo (`ai_enhance_cache`, TTL index on `expires_at`, oldest-used entries
+trimmed past AI_CACHE_MAX_ENTRIES) with a small in-process LRU in front.
+
+Concurrent misses for the same key share one provider call (single-flight).
+"""
+import asyncio
+import hashlib
+import json
+from datetime import datetime, timedelta
+
+from ai_enhance import PROMPT_FIELDS, PROMPT_VERSION
+from cache import TTLCache
+
+# writes between size checks against AI_CACHE_MAX_ENTRIES
+EVICT_EVERY = 100
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def cache_key(provider, product: dict) -> str:
+    fields = {f: _normalize(product.get(f)) for f in PROMPT_FIELDS}
+    payload = json.dumps(
+        [fields, provider.name, provider.model, PROMPT_VERSION],
+        sort_keys=True, ensure_ascii=False, default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class EnhanceCache:
+    def __init__(self, collection, ttl: float, max_entries: int, memory_size: int = 512):
+        self.col = collection
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.memory = TTLCache(maxsize=memory_size, ttl=ttl)
+        self.coalesced = 0
+        self.provider_calls = 0
+        self._inflight = {}
+        self._writes = 0
+
+    async def enhance(self, provider, product: dict):
+        """Returns (result, cached)."""
+        key = cache_key(provider, product)
+        result = self.memory.get(key)
+        if result is not None:
+            return result, True
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._load(key, provider, product))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # shielded: a client that disconnects must not cancel the shared call
+        return await asyncio.shield(task)
+
+    async def _load(self, key, provider, product):
+        now = datetime.utcnow()
+        doc = await self.col.find_one_and_update(
+            {"_id": key, "expires_at": {"$gt": now}},
+            {"$set": {"used_at": now}},
+            projection={"result": 1},
+        )
+        if doc is not None:
+            self.memory.set(key, doc["result"])
+            return doc["result"], True
+
+        self.provider_calls += 1
+        result = await provider.enhance(product)
+        await self.col.update_one(
+            {"_id": key},
+            {"$set": {
+                "result": result,
+                "provider": provider.name,
+                "model": provider.model,
+                "prompt_version": PROMPT_VERSION,
+                "created_at": now,
+                "used_at": now,
+                "expires_at": now + timedelta(seconds=self.ttl),
+            }},
+            upsert=True,
+        )
+        self.memory.set(key, result)
+        self._writes += 1
+        if self._writes % EVICT_EVERY == 0:
+            await self._evict()
+        return result, False
+
+    async def _evict(self):
+        excess = await self.col.estimated_document_count() - self.max_entries
+        if excess > 0:
+            oldest = self.col.find({}, {"_id": 1}).sort("used_at", 1).limit(excess)
+            await self.col.delete_many({"_id": {"$in": [d["_id"] async for d in oldest]}})
+
+    def stats(self) -> dict:
+        return {
+            "memory": self.memory.stats(),
+            "max_entries": self.max_entries,
+            "provider_calls": self.provider_calls,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._inflight),
+        }
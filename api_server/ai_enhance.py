@@ -0,0 +1,213 @@
+# api_server/ai_enhance.py
+"""
+Product copy enhancement through an LLM provider.
+
+Shared by POST /ai/enhance (one product, interactive) and the bulk job
+runner in ai_jobs.py. Each provider is created once per process and carries
+its own concurrency limit and request rate limit, so interactive calls and
+background jobs share the same budget.
+
+Providers (AI_PROVIDER env, or per job):
+  groq  - Groq chat completions (GROQ_API_KEY, GROQ_MODEL)
+  fake  - local deterministic stand-in for tests and benchmarks
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+
+from metrics import observe_outbound
+
+PROMPT_TEMPLATE = """
+You are an e-commerce SEO expert.
+Return ONLY JSON with two fields:
+{{"enhanced_description":"...", "meta_keywords":["...","..."]}}
+
+Product:
+Name: {name}
+Category: {category}
+Description: {description}
+Price: {price}
+Sizes: {sizes}
+Colors: {colors}
+
+Rules:
+- enhanced_description: 120-200 words
+- meta_keywords: 10-15 long-tail keywords
+- DO NOT output anything outside the JSON object
+"""
+
+PROMPT_FIELDS = ("name", "category", "description", "price", "sizes", "colors")
+
+# part of the enhance cache key: editing the template invalidates cached results
+PROMPT_VERSION = hashlib.sha256(PROMPT_TEMPLATE.encode()).hexdigest()[:12]
+
+
+class EnhanceError(Exception):
+    """The provider failed or returned something we could not use."""
+
+    def __init__(self, message, status_code=500):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def build_prompt(product: dict) -> str:
+    return PROMPT_TEMPLATE.format(**{f: product.get(f) for f in PROMPT_FIELDS})
+
+
+def parse_enhancement(raw: str) -> dict:
+    """Extracts the JSON object from the model output."""
+    start = raw.find("{")
+    if start == -1:
+        raise EnhanceError(f"AI did not return JSON. Raw start: {raw[:300]}")
+
+    raw_json = raw[start:]
+    try:
+        parsed = json.loads(raw_json)
+    except ValueError:
+        # try trimming trailing garbage
+        last = raw_json.rfind("}")
+        if last == -1:
+            raise EnhanceError("Failed to parse AI JSON output")
+        try:
+            parsed = json.loads(raw_json[: last + 1])
+        except ValueError:
+            raise EnhanceError("Failed to parse AI JSON output")
+
+    if not isinstance(parsed, dict) or "enhanced_description" not in parsed or "meta_keywords" not in parsed:
+        keys = list(parsed.keys()) if isinstance(parsed, dict) else []
+        raise EnhanceError(f"AI JSON missing required fields. Parsed keys: {keys}")
+    if not isinstance(parsed["meta_keywords"], list):
+        raise EnhanceError(f"AI meta_keywords is not a list: {type(parsed['meta_keywords']).__name__}")
+    return parsed
+
+
+class RateLimiter:
+    """Spaces calls evenly so no more than `per_minute` start in any minute."""
+
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next = 0.0
+        self._lock = None
+
+    async def wait(self):
+        if not self.interval:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class Provider:
+    name = "base"
+    model = ""
+
+    def __init__(self, max_concurrency: int, per_minute: float):
+        self.max_concurrency = max_concurrency
+        self.limiter = RateLimiter(per_minute)
+        self._semaphore = None
+
+    async def complete(self, prompt: str) -> str:
+        raise NotImplementedError
+
+    async def enhance(self, product: dict) -> dict:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            await self.limiter.wait()
+            raw = await self.complete(build_prompt(product))
+        return parse_enhancement(raw)
+
+
+class GroqProvider(Provider):
+    name = "groq"
+
+    def __init__(self):
+        super().__init__(
+            max_concurrency=int(os.getenv("GROQ_MAX_CONCURRENCY", "4")),
+            per_minute=float(os.getenv("GROQ_REQUESTS_PER_MINUTE", "30")),
+        )
+        self.model = os.getenv("GROQ_MODEL", "openai/gpt-oss-20b")  # recommended fallback
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            api_key = os.getenv("GROQ_API_KEY")
+            if not api_key:
+                raise EnhanceError("GROQ_API_KEY not set in environment")
+            from groq import Groq  # imported on first use; the SDK is heavy
+
+            self._client = Groq(api_key=api_key)
+        return self._client
+
+    def _complete_sync(self, prompt: str) -> str:
+        client = self._get_client()
+        started = time.perf_counter()
+        try:
+            chat = client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.7,
+                max_tokens=700,
+            )
+        except Exception as e:
+            observe_outbound("groq", "chat.completions", type(e).__name__, time.perf_counter() - started)
+            extra = ""
+            response = getattr(e, "response", None)
+            if getattr(response, "text", None):
+                extra = f" | response_text: {response.text}"
+            raise EnhanceError(
+                f"Groq model error: {e}{extra}. Check GROQ_MODEL and GROQ_API_KEY.", status_code=400
+            )
+        observe_outbound("groq", "chat.completions", "ok", time.perf_counter() - started)
+        return getattr(chat.choices[0].message, "content", "") or ""
+
+    async def complete(self, prompt: str) -> str:
+        # the Groq SDK is synchronous; keep it off the event loop
+        return await asyncio.to_thread(self._complete_sync, prompt)
+
+
+class FakeProvider(Provider):
+    """Deterministic local provider; AI_FAKE_LATENCY_MS simulates model latency."""
+
+    name = "fake"
+    model = "fake-1"
+
+    def __init__(self):
+        super().__init__(
+            max_concurrency=int(os.getenv("AI_FAKE_MAX_CONCURRENCY", "32")),
+            per_minute=float(os.getenv("AI_FAKE_REQUESTS_PER_MINUTE", "0")),
+        )
+        self.latency = float(os.getenv("AI_FAKE_LATENCY_MS", "50")) / 1000
+        self.calls = 0
+
+    async def complete(self, prompt: str) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        name = re.search(r"Name: (.*)", prompt).group(1).strip()
+        category = re.search(r"Category: (.*)", prompt).group(1).strip()
+        words = [w.lower() for w in re.findall(r"\w+", name)] or ["tee"]
+        return json.dumps({
+            "enhanced_description": f"{name} is a {category.lower()} tee built for everyday wear. " * 4,
+            "meta_keywords": [f"{w} {category.lower()} t-shirt" for w in words] + [f"{category.lower()} tee"],
+        })
+
+
+PROVIDERS = {"groq": GroqProvider, "fake": FakeProvider}
+_instances = {}
+
+
+def get_provider(name: str = None) -> Provider:
+    name = name or os.getenv("AI_PROVIDER", "groq")
+    if name not in PROVIDERS:
+        raise EnhanceError(f"Unknown AI provider '{name}'", status_code=400)
+    if name not in _instances:
+        _instances[name] = PROVIDERS[name]()
+    return _instances[name]
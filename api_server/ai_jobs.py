@@ -0,0 +1,357 @@
+# api_server/ai_jobs.py
+"""
+Background AI enhancement jobs.
+
+A job is a set of products to run through an ai_enhance provider. Jobs live
+in `ai_jobs` (status and counters) and their products in `ai_job_items`
+(one document per product), so a restarted server picks up where it left
+off: items that were in flight when the process died go back to pending.
+
+Each running job holds a lease on its job document, so with several uvicorn
+workers only one of them processes a given job. Inside a worker, a bounded
+pool of tasks pulls items from a queue; results are buffered and written
+back to products and items with unordered bulk_writes.
+"""
+import asyncio
+import os
+import socket
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+
+from ai_enhance import EnhanceError, get_provider
+
+JOB_WORKERS = int(os.getenv("AI_JOB_WORKERS", "8"))
+JOB_BATCH_SIZE = int(os.getenv("AI_JOB_BATCH_SIZE", "50"))
+JOB_MAX_ATTEMPTS = int(os.getenv("AI_JOB_MAX_ATTEMPTS", "3"))
+JOB_LEASE_SECONDS = int(os.getenv("AI_JOB_LEASE_SECONDS", "60"))
+
+ACTIVE_STATUSES = ("queued", "running")
+ITEM_INSERT_BATCH = 1000
+
+MISSING_META_KEYWORDS = {"$or": [{"meta_keywords": {"$exists": False}}, {"meta_keywords": {"$size": 0}}]}
+
+# fields the prompt needs, plus what the write-back touches
+PRODUCT_FIELDS = {
+    "name": 1, "category": 1, "description": 1, "price": 1, "sizes": 1,
+    "colors": 1, "slug": 1, "meta_keywords": 1, "createdAt": 1,
+}
+
+
+def job_summary(job: dict) -> dict:
+    """JSON-safe job status with progress and throughput."""
+    processed = job.get("done", 0) + job.get("failed", 0)
+    started = job.get("started_at")
+    elapsed = None
+    per_min = None
+    if started:
+        elapsed = ((job.get("finished_at") or datetime.utcnow()) - started).total_seconds()
+        if elapsed > 0:
+            per_min = round(job.get("done", 0) * 60 / elapsed, 1)
+    return {
+        "_id": str(job["_id"]),
+        "status": job.get("status"),
+        "provider": job.get("provider"),
+        "overwrite_description": job.get("overwrite_description", False),
+        "total": job.get("total", 0),
+        "done": job.get("done", 0),
+        "failed": job.get("failed", 0),
+        "progress": round(processed / job["total"], 4) if job.get("total") else 1.0,
+        "created_at": job.get("created_at"),
+        "started_at": started,
+        "finished_at": job.get("finished_at"),
+        "elapsed_seconds": elapsed,
+        "products_per_min": per_min,
+        "error": job.get("error"),
+    }
+
+
+class AIJobRunner:
+    def __init__(self, db, products_col, on_product_update=None,
+                 workers=JOB_WORKERS, batch_size=JOB_BATCH_SIZE):
+        self.jobs = db["ai_jobs"]
+        self.items = db["ai_job_items"]
+        self.products = products_col
+        # called with (before, after) for every product written back
+        self.on_product_update = on_product_update
+        self.workers = workers
+        self.batch_size = batch_size
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._tasks = {}
+
+    # --- Submitting and controlling jobs
+
+    async def submit(self, product_ids=None, missing_meta_keywords=False,
+                     provider=None, overwrite_description=False) -> dict:
+        provider = get_provider(provider).name  # validates the name
+        if product_ids:
+            try:
+                ids = list(dict.fromkeys(ObjectId(i) for i in product_ids))
+            except Exception:
+                raise EnhanceError("Invalid product id in product_ids", status_code=400)
+            query = {"_id": {"$in": ids}}
+        elif missing_meta_keywords:
+            query = MISSING_META_KEYWORDS
+        else:
+            raise EnhanceError("Pass product_ids or missing_meta_keywords=true", status_code=400)
+
+        now = datetime.utcnow()
+        job = {
+            "status": "queued",
+            "provider": provider,
+            "overwrite_description": bool(overwrite_description),
+            "total": 0,
+            "done": 0,
+            "failed": 0,
+            "created_at": now,
+        }
+        job_id = (await self.jobs.insert_one(job)).inserted_id
+
+        total, batch = 0, []
+        async for doc in self.products.find(query, {"_id": 1}):
+            batch.append({"job_id": job_id, "product_id": doc["_id"], "status": "pending", "attempts": 0})
+            if len(batch) == ITEM_INSERT_BATCH:
+                await self.items.insert_many(batch, ordered=False)
+                total += len(batch)
+                batch = []
+        if batch:
+            await self.items.insert_many(batch, ordered=False)
+            total += len(batch)
+
+        job["_id"] = job_id
+        job["total"] = total
+        if total:
+            await self.jobs.update_one({"_id": job_id}, {"$set": {"total": total}})
+            self.start(job_id)
+        else:
+            job.update(status="done", started_at=now, finished_at=now)
+            await self.jobs.update_one({"_id": job_id}, {"$set": {
+                "status": "done", "started_at": now, "finished_at": now,
+            }})
+        return job
+
+    async def get(self, job_id):
+        try:
+            return await self.jobs.find_one({"_id": ObjectId(job_id)})
+        except Exception:
+            return None
+
+    async def list(self, limit=20):
+        return await self.jobs.find().sort("created_at", -1).limit(limit).to_list(length=limit)
+
+    async def cancel(self, job_id):
+        return await self.jobs.find_one_and_update(
+            {"_id": ObjectId(job_id), "status": {"$in": list(ACTIVE_STATUSES)}},
+            {"$set": {"status": "cancelled", "finished_at": datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def start(self, job_id):
+        task = self._tasks.get(job_id)
+        if task is None or task.done():
+            self._tasks[job_id] = asyncio.create_task(self.run(job_id))
+
+    async def wait(self, job_id):
+        """Waits for this process's run of a job, if any, to finish."""
+        task = self._tasks.get(job_id)
+        if task is not None:
+            await asyncio.shield(task)
+
+    async def resume(self):
+        """Restarts every queued/running job (call on startup)."""
+        count = 0
+        async for job in self.jobs.find({"status": {"$in": list(ACTIVE_STATUSES)}}, {"_id": 1}):
+            self.start(job["_id"])
+            count += 1
+        return count
+
+    async def shutdown(self):
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
+
+    # --- Running a job
+
+    async def _acquire_lease(self, job_id):
+        now = datetime.utcnow()
+        return await self.jobs.find_one_and_update(
+            {
+                "_id": job_id,
+                "status": {"$in": list(ACTIVE_STATUSES)},
+                "$or": [
+                    {"lease_owner": self.owner},
+                    {"lease_until": {"$exists": False}},
+                    {"lease_until": {"$lt": now}},
+                ],
+            },
+            {"$set": {
+                "status": "running",
+                "lease_owner": self.owner,
+                "lease_until": now + timedelta(seconds=JOB_LEASE_SECONDS),
+            }},
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def run(self, job_id):
+        job = await self._acquire_lease(job_id)
+        if job is None:
+            return  # finished, cancelled, or another worker holds it
+        if not job.get("started_at"):
+            await self.jobs.update_one({"_id": job_id}, {"$set": {"started_at": datetime.utcnow()}})
+        # whatever was in flight when the last owner stopped goes back in the queue
+        await self.items.update_many(
+            {"job_id": job_id, "status": "running"}, {"$set": {"status": "pending"}}
+        )
+        provider = get_provider(job["provider"])
+        try:
+            await self._process(job, provider)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ AI job {job_id} failed:", e)
+            await self.items.update_many(
+                {"job_id": job_id, "status": "running"}, {"$set": {"status": "pending"}}
+            )
+            await self.jobs.update_one(
+                {"_id": job_id, "status": "running"},
+                {"$set": {"status": "failed", "error": str(e), "finished_at": datetime.utcnow()}},
+            )
+            return
+        await self.jobs.update_one(
+            {"_id": job_id, "status": "running"},
+            {"$set": {"status": "done", "finished_at": datetime.utcnow()},
+             "$unset": {"lease_owner": "", "lease_until": ""}},
+        )
+
+    async def _process(self, job, provider):
+        job_id = job["_id"]
+        queue = asyncio.Queue(maxsize=self.batch_size * 2)
+        results = []
+        flush_lock = asyncio.Lock()
+        in_flight = 0
+        write_errors = []
+
+        async def flush():
+            nonlocal results, in_flight
+            async with flush_lock:
+                batch, results = results, []
+                if not batch:
+                    return
+                try:
+                    await self._write_back(job, batch)
+                except Exception:
+                    # nothing of the batch is known to be written; queue it again
+                    await self.items.update_many(
+                        {"_id": {"$in": [i["_id"] for i in batch]}, "status": "running"},
+                        {"$set": {"status": "pending"}},
+                    )
+                    raise
+                finally:
+                    in_flight -= len(batch)
+
+        async def worker():
+            while True:
+                item = await queue.get()
+                product = item["product"]
+                try:
+                    if product is None:
+                        raise EnhanceError("product not found")
+                    item["result"] = await provider.enhance(product)
+                except EnhanceError as e:
+                    item["error"] = str(e)
+                except Exception as e:
+                    item["error"] = f"{type(e).__name__}: {e}"
+                results.append(item)
+                if len(results) >= self.batch_size:
+                    try:
+                        await flush()
+                    except Exception as e:
+                        # the main loop re-raises it, which fails the job; the
+                        # worker keeps draining the queue so that loop never blocks
+                        write_errors.append(e)
+
+        pool = [asyncio.create_task(worker()) for _ in range(self.workers)]
+        try:
+            while True:
+                if write_errors:
+                    raise write_errors[0]
+                current = await self.jobs.find_one({"_id": job_id}, {"status": 1})
+                if current is None or current["status"] != "running":
+                    break  # cancelled
+                await self._renew_lease(job_id)
+
+                pending = await self.items.find(
+                    {"job_id": job_id, "status": "pending"}
+                ).limit(self.batch_size).to_list(length=self.batch_size)
+                if not pending:
+                    if in_flight == 0:
+                        break
+                    await flush()  # items that failed go back to pending here
+                    await asyncio.sleep(0.05)
+                    continue
+
+                await self.items.update_many(
+                    {"_id": {"$in": [i["_id"] for i in pending]}}, {"$set": {"status": "running"}}
+                )
+                found = self.products.find({"_id": {"$in": [i["product_id"] for i in pending]}}, PRODUCT_FIELDS)
+                docs = {d["_id"]: d async for d in found}
+                in_flight += len(pending)
+                for item in pending:
+                    item["product"] = docs.get(item["product_id"])
+                    await queue.put(item)
+        finally:
+            # on a normal finish every worker is idle on queue.get(); on cancel,
+            # unfinished items stay "running" and are reset on the next run
+            for task in pool:
+                task.cancel()
+            await asyncio.gather(*pool, return_exceptions=True)
+            await flush()
+
+    async def _renew_lease(self, job_id):
+        await self.jobs.update_one(
+            {"_id": job_id, "lease_owner": self.owner},
+            {"$set": {"lease_until": datetime.utcnow() + timedelta(seconds=JOB_LEASE_SECONDS)}},
+        )
+
+    async def _write_back(self, job, batch):
+        now = datetime.utcnow()
+        product_ops, item_ops, updates = [], [], []
+        done = failed = 0
+        for item in batch:
+            result = item.get("result")
+            if result is not None:
+                fields = {
+                    "meta_keywords": [str(k) for k in result["meta_keywords"]],
+                    "enhanced_description": str(result["enhanced_description"]),
+                    "updatedAt": now,
+                }
+                if job.get("overwrite_description"):
+                    fields["description"] = fields["enhanced_description"]
+                product_ops.append(UpdateOne({"_id": item["product_id"]}, {"$set": fields}))
+                item_ops.append(UpdateOne({"_id": item["_id"]}, {
+                    "$set": {"status": "done", "updated_at": now}, "$inc": {"attempts": 1},
+                }))
+                updates.append((item["product"], {**item["product"], **fields}))
+                done += 1
+            else:
+                attempts = item.get("attempts", 0) + 1
+                gave_up = item["product"] is None or attempts >= JOB_MAX_ATTEMPTS
+                item_ops.append(UpdateOne({"_id": item["_id"]}, {"$set": {
+                    "status": "failed" if gave_up else "pending",
+                    "attempts": attempts,
+                    "error": item["error"],
+                    "updated_at": now,
+                }}))
+                failed += gave_up
+
+        if product_ops:
+            await self.products.bulk_write(product_ops, ordered=False)
+        if item_ops:
+            await self.items.bulk_write(item_ops, ordered=False)
+        if done or failed:
+            await self.jobs.update_one({"_id": job["_id"]}, {"$inc": {"done": done, "failed": failed}})
+        if self.on_product_update:
+            for before, after in updates:
+                self.on_product_update(before, after)
@@ -0,0 +1,24 @@
+"""
+Benchmark suite for the API: synthetic data, scripted traffic mixes, JSON
+results and regression checks. Run from api_server/:
+
+    # in-process against an in-memory Mongo stand-in (pip install mongomock-motor)
+    python -m bench run --mongo memory --scale 1k --mix storefront,cart
+
+    # seed a local mongod, then run in-process or over HTTP
+    python -m bench seed --scale 100k
+    python -m bench run --scale 100k --mix all
+    MONGODB_DB=TEE-TRIBE-bench uvicorn main:app --port 8000 &
+    python -m bench run --target http://localhost:8000 --scale 100k --mix checkout
+
+    # cold start: import breakdown and time to first request, 5 fresh workers
+    python -m bench startup --mongo memory --repeat 5
+
+    # compare two result files; exits 1 when anything regressed
+    python -m bench compare bench/results/base.json bench/results/new.json --threshold 0.1
+
+Seeding is deterministic for a given --seed: product i always has the same
+_id, slug, price and reviews, so runs at the same scale are comparable.
+The memory stand-in is for quick A/B checks of Python-side changes; query
+plans and index behaviour need a real mongod.
+"""
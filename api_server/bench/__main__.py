@@ -0,0 +1,188 @@
+"""CLI for the benchmark suite; see bench/__init__.py for usage."""
+import argparse
+import asyncio
+import json
+import os
+import sys
+from datetime import datetime
+
+from bench.compare import compare_runs, print_comparison
+from bench.datagen import SCALES, resolve_scale, seed
+from bench.mixes import Population, resolve_mixes
+from bench.runner import (
+    environment, git_revision, http_client, inprocess_client, print_summary, result_path, run_mix,
+)
+from bench.startup import API_DIR, print_profile, profile
+
+DEFAULT_MONGO = "mongodb://localhost:27017"
+DEFAULT_DB = "TEE-TRIBE-bench"
+
+
+def scale_from_args(args) -> dict:
+    return resolve_scale(args.scale, products=args.products, users=args.users, orders=args.orders, reviews=args.reviews)
+
+
+async def seed_command(args):
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    from db import client_options
+
+    client = AsyncIOMotorClient(args.mongo, **client_options())
+    try:
+        await seed(client[args.db], scale_from_args(args), seed=args.seed)
+    finally:
+        client.close()
+
+
+async def run_command(args):
+    scale = scale_from_args(args)
+    mixes = resolve_mixes(args.mix)
+    population = Population(scale["products"], scale["users"])
+
+    async def prepare(db):
+        # the memory stand-in starts empty; a real database is seeded on request
+        if args.mongo == "memory" or args.seed_data:
+            await seed(db, scale, seed=args.seed)
+        else:
+            meta = await db.bench_meta.find_one({"_id": "scale"})
+            if meta is None:
+                sys.exit(f"❌ {args.db} was not seeded by the bench (run `python -m bench seed` or pass --seed-data)")
+            population.products, population.users = meta["products"], meta["users"]
+
+    if args.target == "inproc":
+        client_cm = inprocess_client(args.mongo, args.db, args.timeout, before_startup=prepare)
+    else:
+        client_cm = http_client(args.target, args.concurrency, args.timeout)
+
+    runs = []
+    async with client_cm as client:
+        for mix in mixes:
+            run = await run_mix(client, mix, population, args.concurrency, args.duration, args.warmup, args.seed)
+            print_summary(run)
+            runs.append(run)
+
+    result = {
+        "label": args.label,
+        "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "git": git_revision(),
+        "env": environment(),
+        "config": {
+            "target": args.target,
+            "mongo": args.mongo if args.target == "inproc" else None,
+            "db": args.db,
+            "scale": args.scale,
+            "population": {"products": population.products, "users": population.users},
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "seed": args.seed,
+        },
+        "runs": runs,
+    }
+    return save_result(result, args)
+
+
+def startup_command(args):
+    run, imports = profile(args.app_dir, args.mongo, args.repeat, args.top)
+    print_profile(run, imports)
+    result = {
+        "label": args.label,
+        "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "git": git_revision(),
+        "env": environment(),
+        "config": {"app_dir": str(args.app_dir), "mongo": args.mongo, "repeat": args.repeat},
+        "runs": [run],
+        "imports": imports["modules"],
+    }
+    return save_result(result, args, min_requests=1)
+
+
+def save_result(result: dict, args, min_requests: int = 50) -> int:
+    path = str(args.out or result_path(args.label))
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"💾 {path}")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            rows, regressions = compare_runs(json.load(f), result, args.threshold, min_requests)
+        print_comparison(rows, regressions)
+        return 1 if regressions else 0
+    return 0
+
+
+def compare_command(args):
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+    rows, regressions = compare_runs(base, new, args.threshold, args.min_requests)
+    print_comparison(rows, regressions, verbose=args.verbose)
+    return 1 if regressions else 0
+
+
+def add_scale_args(parser):
+    parser.add_argument("--scale", choices=list(SCALES), default="1k")
+    parser.add_argument("--products", type=int)
+    parser.add_argument("--users", type=int)
+    parser.add_argument("--orders", type=int)
+    parser.add_argument("--reviews", type=int)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", default=DEFAULT_DB)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m bench")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    seed_p = sub.add_parser("seed", help="write a synthetic dataset (drops the bench collections first)")
+    add_scale_args(seed_p)
+    seed_p.add_argument("--mongo", default=DEFAULT_MONGO)
+
+    run_p = sub.add_parser("run", help="run traffic mixes and save a result file")
+    add_scale_args(run_p)
+    run_p.add_argument("--target", default="inproc", help="'inproc' or a base URL like http://localhost:8000")
+    run_p.add_argument("--mongo", default=DEFAULT_MONGO, help="URI, or 'memory' for mongomock-motor (inproc only)")
+    run_p.add_argument("--seed-data", action="store_true", help="seed the database before running (inproc)")
+    run_p.add_argument("--mix", default="storefront", help="comma-separated mixes or 'all'")
+    run_p.add_argument("--concurrency", type=int, default=32)
+    run_p.add_argument("--duration", type=float, default=20.0, help="measured seconds per mix")
+    run_p.add_argument("--warmup", type=float, default=3.0, help="unmeasured seconds before each mix")
+    run_p.add_argument("--timeout", type=float, default=30.0)
+    run_p.add_argument("--label", default="run")
+    run_p.add_argument("--out", help="result file (default bench/results/<time>-<label>.json)")
+    run_p.add_argument("--baseline", help="compare against this result file when done")
+    run_p.add_argument("--threshold", type=float, default=0.10)
+
+    start_p = sub.add_parser("startup", help="profile imports and time-to-first-request of fresh workers")
+    start_p.add_argument("--mongo", default="memory", help="URI, or 'memory' for mongomock-motor")
+    start_p.add_argument("--app-dir", default=API_DIR, help="api_server directory to profile (e.g. a baseline checkout)")
+    start_p.add_argument("--repeat", type=int, default=5, help="cold starts to sample")
+    start_p.add_argument("--top", type=int, default=15, help="slowest imports to keep")
+    start_p.add_argument("--label", default="startup")
+    start_p.add_argument("--out", help="result file (default bench/results/<time>-<label>.json)")
+    start_p.add_argument("--baseline", help="compare against this result file when done")
+    start_p.add_argument("--threshold", type=float, default=0.10)
+
+    cmp_p = sub.add_parser("compare", help="compare two result files")
+    cmp_p.add_argument("base")
+    cmp_p.add_argument("new")
+    cmp_p.add_argument("--threshold", type=float, default=0.10, help="relative change that counts as a regression")
+    cmp_p.add_argument("--min-requests", type=int, default=50)
+    cmp_p.add_argument("--verbose", action="store_true", help="show every metric, not just p99/rps and flagged ones")
+
+    args = parser.parse_args()
+    if args.command == "seed":
+        asyncio.run(seed_command(args))
+    elif args.command == "run":
+        if args.target != "inproc" and args.seed_data:
+            parser.error("--seed-data only applies to --target inproc; use `python -m bench seed` first")
+        sys.exit(asyncio.run(run_command(args)))
+    elif args.command == "startup":
+        sys.exit(startup_command(args))
+    else:
+        sys.exit(compare_command(args))
+
+
+if __name__ == "__main__":
+    main()
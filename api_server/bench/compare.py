@@ -0,0 +1,57 @@
+# api_server/bench/compare.py
+"""
+Compares two result files mix by mix and endpoint by endpoint. A change
+is flagged when a latency percentile grows, or throughput drops, by more
+than the threshold (relative). Endpoints with too few samples on either
+side are reported but never flagged; their percentiles are noise.
+"""
+LATENCY_METRICS = ("p50_ms", "p95_ms", "p99_ms")
+MIN_REQUESTS = 50
+
+
+def _change(base: float, new: float):
+    if not base:
+        return None
+    return (new - base) / base
+
+
+def compare_runs(base: dict, new: dict, threshold: float = 0.10, min_requests: int = MIN_REQUESTS):
+    """Returns (rows, regressions); each row is (mix, endpoint, metric, base, new, change, flagged)."""
+    rows, regressions = [], []
+    base_runs = {r["mix"]: r for r in base["runs"]}
+    for run in new["runs"]:
+        before = base_runs.get(run["mix"])
+        if before is None:
+            continue
+        for name in sorted(set(before["endpoints"]) | set(run["endpoints"])):
+            b, n = before["endpoints"].get(name), run["endpoints"].get(name)
+            if b is None or n is None:
+                rows.append((run["mix"], name, "missing", b and b["requests"], n and n["requests"], None, False))
+                continue
+            enough = min(b["requests"], n["requests"]) >= min_requests
+            for metric in (*LATENCY_METRICS, "rps"):
+                change = _change(b[metric], n[metric])
+                worse = change is not None and (change < -threshold if metric == "rps" else change > threshold)
+                flagged = enough and worse
+                row = (run["mix"], name, metric, b[metric], n[metric], change, flagged)
+                rows.append(row)
+                if flagged:
+                    regressions.append(row)
+            if n["errors"] > b["errors"]:
+                row = (run["mix"], name, "errors", b["errors"], n["errors"], None, True)
+                rows.append(row)
+                regressions.append(row)
+    return rows, regressions
+
+
+def print_comparison(rows, regressions, verbose: bool = False):
+    for mix, name, metric, b, n, change, flagged in rows:
+        if not (verbose or flagged or metric in ("p99_ms", "rps", "missing")):
+            continue
+        delta = f"{change:+.1%}" if change is not None else ""
+        mark = "❌" if flagged else "  "
+        print(f"{mark} {mix:<11} {name:<18} {metric:<8} {b!s:>10} -> {n!s:>10} {delta:>8}")
+    if regressions:
+        print(f"❌ {len(regressions)} regression(s)")
+    else:
+        print("✅ No regressions")
@@ -0,0 +1,233 @@
+# api_server/bench/datagen.py
+"""
+Deterministic synthetic data: products (with reviews and rating summaries),
+categories, carts, orders and customer stats, written in batches through a
+Motor (or mongomock-motor) database.
+
+Product i has _id `product_id(i)` and slug `product_slug(i)`, and user u is
+`user_id(u)`, so traffic mixes can address data without reading it back.
+"""
+import random
+import time
+import uuid
+from array import array
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from category_counts import category_key
+from customer_stats import customer_key
+from indexes import apply_indexes_async
+from review_stats import empty_rating
+from slugs import slug_key
+
+SCALES = {
+    "1k": {"products": 1_000, "users": 200, "orders": 2_000, "reviews": 3_000},
+    "10k": {"products": 10_000, "users": 2_000, "orders": 20_000, "reviews": 30_000},
+    "100k": {"products": 100_000, "users": 10_000, "orders": 100_000, "reviews": 200_000},
+    "1m": {"products": 1_000_000, "users": 100_000, "orders": 500_000, "reviews": 2_000_000},
+}
+
+ADJECTIVES = [
+    "neon", "retro", "tribal", "urban", "cosmic", "vintage", "glitch", "savage",
+    "minimal", "electric", "midnight", "desert", "arctic", "lunar", "crimson", "golden",
+]
+NOUNS = [
+    "tiger", "wave", "skull", "circuit", "dragon", "pixel", "falcon", "lotus",
+    "serpent", "rocket", "samurai", "wolf", "panther", "comet", "phoenix", "orbit",
+]
+CATEGORIES = ["Graphic", "Tribal", "Typography", "Abstract", "Tech", "Accessories"]
+SIZES = ["XS", "S", "M", "L", "XL", "XXL"]
+COLORS = ["black", "white", "grey", "navy", "maroon", "olive", "sand"]
+STATUSES = ["Pending", "Processing", "Shipped", "Delivered", "Cancelled"]
+
+BATCH = 5000
+# share of users holding a saved cart
+CART_SHARE = 0.3
+# everything is dated inside this window before the seed time
+HISTORY = timedelta(days=365)
+
+
+def product_id(i: int) -> ObjectId:
+    return ObjectId(f"{i + 1:024x}")
+
+
+def product_slug(i: int) -> str:
+    return f"bench-tee-{i}"
+
+
+def product_name(i: int) -> str:
+    return f"{ADJECTIVES[i % len(ADJECTIVES)].title()} {NOUNS[(i // len(ADJECTIVES)) % len(NOUNS)].title()} Tee {i}"
+
+
+def user_id(u: int) -> str:
+    return f"bench-user-{u}"
+
+
+def user_email(u: int) -> str:
+    return f"user{u}@bench.test"
+
+
+def resolve_scale(name: str, **overrides) -> dict:
+    if name not in SCALES:
+        raise ValueError(f"Unknown scale '{name}', expected one of {list(SCALES)}")
+    return {**SCALES[name], **{k: v for k, v in overrides.items() if v is not None}}
+
+
+async def ensure_indexes(db, log=print):
+    """The indexes the API relies on (the registry in indexes.py)."""
+    await apply_indexes_async(db, log=log)
+
+
+class _Writer:
+    """Buffers documents per collection and inserts them BATCH at a time."""
+
+    def __init__(self, db):
+        self.db = db
+        self.buffers = {}
+        self.counts = {}
+
+    async def add(self, collection: str, doc: dict):
+        buf = self.buffers.setdefault(collection, [])
+        buf.append(doc)
+        if len(buf) >= BATCH:
+            await self.flush(collection)
+
+    async def flush(self, collection: str = None):
+        for name in [collection] if collection else list(self.buffers):
+            buf = self.buffers.get(name)
+            if buf:
+                await self.db[name].insert_many(buf, ordered=False)
+                self.counts[name] = self.counts.get(name, 0) + len(buf)
+                self.buffers[name] = []
+
+
+async def seed(db, scale: dict, seed: int = 42, drop: bool = True, log=print) -> dict:
+    """Writes a full synthetic dataset; returns the bench_meta document."""
+    rng = random.Random(seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    started = time.perf_counter()
+    if drop:
+        for name in ("products", "categories", "reviews", "carts", "orders", "customers", "bench_meta"):
+            await db[name].drop()
+
+    writer = _Writer(db)
+    n_products, n_users = scale["products"], scale["users"]
+    prices = array("d")
+    category_counts = {}
+    reviews_per_product = scale["reviews"] / max(n_products, 1)
+
+    # --- products with their reviews
+    for i in range(n_products):
+        pid = product_id(i)
+        price = float(rng.randrange(800, 6000, 50))
+        category = CATEGORIES[rng.randrange(len(CATEGORIES))]
+        rating = empty_rating()
+        n_reviews = int(reviews_per_product) + (rng.random() < reviews_per_product % 1)
+        for r in range(n_reviews):
+            stars = rng.choices((1, 2, 3, 4, 5), weights=(1, 1, 3, 5, 6))[0]
+            rating["count"] += 1
+            rating["total"] += stars
+            rating["histogram"][str(stars)] += 1
+            await writer.add("reviews", {
+                "product_id": str(pid),
+                "user_name": user_email(rng.randrange(n_users)),
+                "rating": stars,
+                "comment": f"Bench review {r} of {product_name(i)}",
+                "created_at": now - HISTORY * rng.random(),
+            })
+        if rating["count"]:
+            rating["mean"] = rating["total"] / rating["count"]
+
+        name = product_name(i)
+        await writer.add("products", {
+            "_id": pid,
+            "name": name,
+            "slug": product_slug(i),
+            "slug_key": slug_key(product_slug(i)),
+            "category": category,
+            "price": price,
+            "image": f"https://cdn.bench.test/{i}.jpg",
+            "description": f"{name}: heavyweight cotton, {rng.choice(ADJECTIVES)} print, {rng.choice(NOUNS)} motif.",
+            "sizes": sorted(rng.sample(SIZES, rng.randint(2, len(SIZES))), key=SIZES.index),
+            "colors": rng.sample(COLORS, rng.randint(1, 3)),
+            "meta_keywords": [rng.choice(ADJECTIVES), rng.choice(NOUNS), category.lower()],
+            "rating": rating,
+            "createdAt": now - HISTORY * rng.random(),
+            "updatedAt": now,
+        })
+        prices.append(price)
+        category_counts[category] = category_counts.get(category, 0) + 1
+        if i and i % 100_000 == 0:
+            log(f"  … {i:,} products")
+    await writer.flush()
+
+    for name, count in category_counts.items():
+        await writer.add("categories", {
+            "name": name, "name_key": category_key(name), "status": "Active",
+            "productCount": count, "createdAt": now,
+        })
+
+    def random_lines(k):
+        lines = []
+        for i in rng.sample(range(n_products), k=min(k, n_products)):
+            lines.append({
+                "id": str(product_id(i)), "name": product_name(i), "price": prices[i],
+                "image": f"https://cdn.bench.test/{i}.jpg", "size": rng.choice(SIZES),
+                "quantity": rng.randint(1, 3),
+            })
+        return lines
+
+    # --- carts
+    for u in range(n_users):
+        if rng.random() < CART_SHARE:
+            await writer.add("carts", {
+                "user_id": user_id(u), "items": random_lines(rng.randint(1, 4)),
+                "version": 1, "updated_at": now - HISTORY * rng.random() / 12,
+            })
+
+    # --- orders, folding customer stats as we go
+    customers = {}
+    for _ in range(scale["orders"]):
+        u = rng.randrange(n_users)
+        lines = random_lines(rng.randint(1, 3))
+        total = round(sum(line["price"] * line["quantity"] for line in lines), 2)
+        created = now - HISTORY * rng.random()
+        await writer.add("orders", {
+            "user_id": user_id(u),
+            "items": lines,
+            "total": total,
+            "contact": {"email": user_email(u), "phone": f"0300{u:07d}"},
+            "shipping": {"name": f"Bench User {u}", "address": f"{u} Bench Street", "city": "Lahore"},
+            "payment_method": rng.choice(["COD", "Card"]),
+            "status": rng.choice(STATUSES),
+            "created_at": created,
+            # checkout always sends one (and mongomock ignores the index's partial filter)
+            "idempotency_key": str(uuid.UUID(int=rng.getrandbits(128))),
+        })
+        stats = customers.setdefault(u, [0, 0.0, created, created])
+        stats[0] += 1
+        stats[1] += total
+        stats[2] = min(stats[2], created)
+        stats[3] = max(stats[3], created)
+
+    for u, (count, value, first, last) in customers.items():
+        await writer.add("customers", {
+            "email": user_email(u), "email_key": customer_key(user_email(u)), "user_id": user_id(u),
+            "full_name": f"Bench User {u}", "total_orders": count, "lifetime_value": round(value, 2),
+            "first_order_at": first, "last_order_at": last, "created_at": first,
+        })
+    await writer.flush()
+    await ensure_indexes(db, log)
+
+    meta = {
+        "_id": "scale",
+        **scale,
+        "seed": seed,
+        "counts": writer.counts,
+        "seeded_at": now,
+        "seconds": round(time.perf_counter() - started, 1),
+    }
+    await db.bench_meta.replace_one({"_id": "scale"}, meta, upsert=True)
+    log(f"🌱 Seeded {writer.counts} in {meta['seconds']}s")
+    return meta
@@ -0,0 +1,156 @@
+# api_server/bench/mixes.py
+"""
+Scripted traffic mixes. A mix is a weighted list of scenarios; each
+scenario turns (rng, population) into one request:
+(endpoint name, method, path, params, json body, headers).
+
+Results are reported per endpoint name, so keep names stable across
+changes or comparisons lose their baseline.
+"""
+import uuid
+
+from bench.datagen import ADJECTIVES, CATEGORIES, NOUNS, SIZES, product_id, product_slug, user_email, user_id
+
+
+class Population:
+    """What the scenarios may address: products 0..products-1, users 0..users-1."""
+
+    def __init__(self, products: int, users: int):
+        self.products = products
+        self.users = users
+
+    def product(self, rng) -> int:
+        # a fifth of the catalog gets most of the traffic, like real shops
+        hot = max(1, self.products // 5)
+        return rng.randrange(hot) if rng.random() < 0.8 else rng.randrange(self.products)
+
+    def user(self, rng) -> int:
+        return rng.randrange(self.users)
+
+
+# --- storefront
+
+def browse(rng, pop):
+    return "products", "GET", "/products", {"limit": 24, "page": rng.randint(1, 5), "fields": "card"}, None, None
+
+
+def browse_filtered(rng, pop):
+    low = rng.randrange(0, 4000, 500)
+    params = {
+        "categories": rng.sample(CATEGORIES, rng.randint(1, 2)),
+        "min_price": low, "max_price": low + 2000,
+        "sort": rng.choice(["default", "price_asc", "newest"]), "limit": 24, "fields": "card",
+    }
+    return "products_filtered", "GET", "/products", params, None, None
+
+
+def facets(rng, pop):
+    params = {"categories": [rng.choice(CATEGORIES)], "limit": 24, "fields": "card", "facets": 1}
+    return "products_facets", "GET", "/products", params, None, None
+
+
+def search(rng, pop):
+    q = rng.choice(ADJECTIVES) if rng.random() < 0.5 else f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)[:3]}"
+    return "search", "GET", "/products", {"q": q, "limit": 24, "fields": "card"}, None, None
+
+
+def product_page(rng, pop):
+    return "product_slug", "GET", f"/products/slug/{product_slug(pop.product(rng))}", None, None, None
+
+
+def related(rng, pop):
+    return "related", "GET", f"/products/{product_id(pop.product(rng))}/related", {"limit": 8}, None, None
+
+
+def reviews(rng, pop):
+    return "reviews", "GET", f"/reviews/{product_id(pop.product(rng))}", {"limit": 10}, None, None
+
+
+# --- cart
+
+def cart_line(rng, pop):
+    i = pop.product(rng)
+    return {"id": str(product_id(i)), "name": f"Tee {i}", "price": 1000, "size": rng.choice(SIZES), "quantity": 1, "image": ""}
+
+
+def cart_get(rng, pop):
+    return "cart_get", "GET", f"/cart/{user_id(pop.user(rng))}", None, None, None
+
+
+def cart_add(rng, pop):
+    return "cart_add", "POST", f"/cart/{user_id(pop.user(rng))}/items", None, cart_line(rng, pop), None
+
+
+def cart_save(rng, pop):
+    items = [cart_line(rng, pop) for _ in range(rng.randint(1, 4))]
+    return "cart_save", "POST", f"/cart/{user_id(pop.user(rng))}", None, {"items": items}, None
+
+
+def cart_remove(rng, pop):
+    line = cart_line(rng, pop)
+    path = f"/cart/{user_id(pop.user(rng))}/items/{line['id']}"
+    return "cart_remove", "DELETE", path, {"size": line["size"]}, None, None
+
+
+# --- checkout
+
+def place_order(rng, pop):
+    u = pop.user(rng)
+    body = {
+        "items": [
+            {"id": str(product_id(pop.product(rng))), "size": rng.choice(SIZES), "quantity": rng.randint(1, 2)}
+            for _ in range(rng.randint(1, 3))
+        ],
+        "contact": {"email": user_email(u)},
+        "shipping": {"name": f"Bench User {u}", "address": f"{u} Bench Street", "city": "Lahore"},
+        "payment_method": "COD",
+    }
+    headers = {"Idempotency-Key": str(uuid.UUID(int=rng.getrandbits(128)))}
+    return "place_order", "POST", f"/orders/{user_id(u)}", None, body, headers
+
+
+def my_orders(rng, pop):
+    return "my_orders", "GET", f"/orders/{user_id(pop.user(rng))}", {"limit": 20, "fields": "summary"}, None, None
+
+
+# --- admin
+
+def admin_orders(rng, pop):
+    params = {"limit": 50, "fields": "summary"}
+    if rng.random() < 0.5:
+        params["status"] = rng.choice(["Pending", "Shipped", "Delivered"])
+    return "admin_orders", "GET", "/admin/orders", params, None, None
+
+
+def customers(rng, pop):
+    sort = rng.choice(["newest", "last_order", "value", "orders"])
+    return "customers", "GET", "/customers", {"sort": sort, "limit": 50}, None, None
+
+
+def categories(rng, pop):
+    return "categories", "GET", "/categories", None, None, None
+
+
+MIXES = {
+    "storefront": [
+        (30, browse), (12, browse_filtered), (8, facets), (15, search), (25, product_page), (10, related), (10, reviews),
+    ],
+    "cart": [(40, cart_get), (25, cart_add), (20, cart_save), (15, cart_remove)],
+    "checkout": [(45, place_order), (35, my_orders), (20, cart_get)],
+    "admin": [(35, admin_orders), (35, customers), (30, categories)],
+}
+# every scenario, weighted like storefront traffic
+MIXES["mixed"] = [
+    *[(w * 0.75, s) for w, s in MIXES["storefront"]],
+    *[(w * 0.15, s) for w, s in MIXES["cart"]],
+    *[(w * 0.07, s) for w, s in MIXES["checkout"]],
+    *[(w * 0.03, s) for w, s in MIXES["admin"]],
+]
+
+
+def resolve_mixes(spec: str) -> list:
+    names = list(MIXES) if spec == "all" else [s.strip() for s in spec.split(",") if s.strip()]
+    unknown = [n for n in names if n not in MIXES]
+    if unknown:
+        raise ValueError(f"Unknown mix {unknown}, expected some of {list(MIXES)} or 'all'")
+    return names
@@ -0,0 +1,172 @@
+# api_server/bench/runner.py
+"""
+Runs a traffic mix against an httpx.AsyncClient (in-process ASGI or a real
+server) and summarizes throughput and latency per endpoint.
+
+Each worker draws its requests from its own seeded RNG, so two runs with
+the same seed send the same request sequence (how far each worker gets
+still depends on speed). Requests started during the warmup are not
+counted.
+"""
+import asyncio
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+
+from bench.mixes import MIXES, Population
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    k = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[k]
+
+
+def _picker(mix):
+    weights = [w for w, _ in mix]
+    scenarios = [s for _, s in mix]
+    return lambda rng: rng.choices(scenarios, weights=weights)[0]
+
+
+async def _worker(client, pick, pop, rng, measure_from, deadline, samples, errors, client_errors):
+    while True:
+        started = time.perf_counter()
+        if started >= deadline:
+            return
+        name, method, path, params, body, headers = pick(rng)(rng, pop)
+        try:
+            r = await client.request(method, path, params=params, json=body, headers=headers)
+            status = r.status_code
+        except httpx.HTTPError:
+            status = None
+        if started < measure_from:
+            continue
+        samples[name].append((time.perf_counter() - started) * 1000)
+        if status is None or status >= 500:
+            errors[name] += 1
+        elif status >= 400:
+            client_errors[name] += 1
+
+
+async def run_mix(client, mix_name: str, pop: Population, concurrency: int, duration: float,
+                  warmup: float = 0.0, seed: int = 42) -> dict:
+    pick = _picker(MIXES[mix_name])
+    samples, errors, client_errors = defaultdict(list), defaultdict(int), defaultdict(int)
+    begin = time.perf_counter()
+    measure_from = begin + warmup
+    deadline = measure_from + duration
+    await asyncio.gather(*(
+        _worker(client, pick, pop, random.Random(seed * 1000 + i), measure_from, deadline,
+                samples, errors, client_errors)
+        for i in range(concurrency)
+    ))
+    elapsed = time.perf_counter() - measure_from
+
+    every = [x for xs in samples.values() for x in xs]
+    return {
+        "mix": mix_name,
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 2),
+        "requests": len(every),
+        "errors": sum(errors.values()),
+        "client_errors": sum(client_errors.values()),
+        "rps": round(len(every) / elapsed, 1),
+        "p50_ms": round(percentile(every, 50), 2),
+        "p95_ms": round(percentile(every, 95), 2),
+        "p99_ms": round(percentile(every, 99), 2),
+        "endpoints": {
+            name: {
+                "requests": len(xs),
+                "errors": errors[name],
+                "client_errors": client_errors[name],
+                "rps": round(len(xs) / elapsed, 1),
+                "mean_ms": round(statistics.fmean(xs), 2),
+                "p50_ms": round(percentile(xs, 50), 2),
+                "p95_ms": round(percentile(xs, 95), 2),
+                "p99_ms": round(percentile(xs, 99), 2),
+                "max_ms": round(max(xs), 2),
+            }
+            for name, xs in sorted(samples.items())
+        },
+    }
+
+
+@asynccontextmanager
+async def http_client(url: str, concurrency: int, timeout: float):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=timeout) as client:
+        yield client
+
+
+@asynccontextmanager
+async def inprocess_client(mongo: str, db_name: str, timeout: float, before_startup=None):
+    """
+    Imports the app against `mongo` (a URI, or "memory" for mongomock-motor)
+    and serves it through ASGITransport. `before_startup(db)` runs before the
+    startup hooks build their in-memory views, e.g. to seed.
+    """
+    os.environ["MONGODB_DB"] = db_name
+    if mongo == "memory":
+        try:
+            import mongomock_motor
+        except ImportError:
+            sys.exit("❌ --mongo memory needs mongomock-motor (pip install mongomock-motor)")
+        import motor.motor_asyncio
+        motor.motor_asyncio.AsyncIOMotorClient = lambda *a, **k: mongomock_motor.AsyncMongoMockClient()
+        # read preferences mean nothing in memory; Motor keeps the async wrapper here, the mock does not
+        mongomock_motor.AsyncMongoMockCollection.with_options = lambda self, **options: self
+    else:
+        os.environ["MONGODB_URI"] = mongo
+
+    import main
+
+    if before_startup is not None:
+        await before_startup(main.db)
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=timeout) as client:
+            yield client
+
+
+def git_revision() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True).stdout.strip())
+        return {"commit": commit, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+def environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def result_path(label: str) -> Path:
+    return RESULTS_DIR / f"{datetime.utcnow():%Y%m%d-%H%M%S}-{label}.json"
+
+
+def print_summary(run: dict):
+    print(f"▶ {run['mix']}: {run['requests']} requests in {run['duration_s']}s -> {run['rps']} req/s, "
+          f"p50 {run['p50_ms']} ms, p95 {run['p95_ms']} ms, p99 {run['p99_ms']} ms, "
+          f"{run['errors']} errors, {run['client_errors']} 4xx")
+    for name, s in run["endpoints"].items():
+        print(f"  {name:<18} {s['requests']:>7} req {s['rps']:>8} req/s  p50 {s['p50_ms']:>8} ms  "
+              f"p95 {s['p95_ms']:>8} ms  p99 {s['p99_ms']:>8} ms  err {s['errors']}")
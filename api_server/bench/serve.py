@@ -0,0 +1,55 @@
+# api_server/bench/serve.py
+"""
+Starts the API under uvicorn for `python -m bench startup` and reports, as
+JSON lines on stdout, how long importing main and running the startup hooks
+took in this process. Run as a script so --app-dir can point at another
+checkout (e.g. the baseline revision).
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+
+def report(**fields):
+    print(json.dumps(fields), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--app-dir", required=True)
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--mongo", default="mongodb://localhost:27017")
+    args = parser.parse_args()
+
+    sys.path.insert(0, args.app_dir)
+    os.chdir(args.app_dir)
+    if args.mongo == "memory":
+        import mongomock_motor
+        import motor.motor_asyncio
+
+        motor.motor_asyncio.AsyncIOMotorClient = lambda *a, **k: mongomock_motor.AsyncMongoMockClient()
+        # read preferences mean nothing in memory; Motor keeps the async wrapper here, the mock does not
+        mongomock_motor.AsyncMongoMockCollection.with_options = lambda self, **options: self
+    else:
+        os.environ["MONGODB_URI"] = args.mongo
+
+    import uvicorn
+
+    before = time.perf_counter()
+    import main as app_module
+
+    imported = time.perf_counter()
+    report(phase="import", ms=(imported - before) * 1000)
+
+    async def startup_done():
+        report(phase="startup", ms=(time.perf_counter() - imported) * 1000)
+
+    # appended last, so it runs after every startup hook of the app
+    app_module.app.router.on_startup.append(startup_done)
+    uvicorn.run(app_module.app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+# api_server/bench/startup.py
+"""
+Cold-start profile of the API: how long `import main` takes (with the
+heaviest imports from `python -X importtime`), how long the startup hooks
+run, and the time from spawning a uvicorn worker to its first 200 on
+/health. Every sample is a fresh process, so nothing is warm except the
+OS file cache.
+
+Phases are stored like endpoints of a run ("startup" mix), so result files
+compare with `python -m bench compare ... --min-requests 1`.
+"""
+import json
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+from bench.runner import percentile
+
+API_DIR = Path(__file__).resolve().parent.parent
+SERVE = Path(__file__).resolve().parent / "serve.py"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def import_profile(app_dir=API_DIR, top: int = 15) -> dict:
+    """Runs `python -X importtime -c "import main"` and returns the total and the slowest top-level imports."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=app_dir, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import main failed:\n{proc.stderr[-2000:]}")
+
+    # lines look like "import time:   self [us] |  cumulative | imported package"
+    modules, total_ms = [], 0.0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        entry = {"module": name.strip(), "self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000}
+        if entry["module"] == "main":
+            total_ms = entry["cumulative_ms"]
+        elif depth <= 1:
+            # depth 0 are imports of `python -c` itself; depth 1 are imported directly by main
+            modules.append(entry)
+    modules.sort(key=lambda m: m["cumulative_ms"], reverse=True)
+    return {"import_main_ms": total_ms, "modules": modules[:top]}
+
+
+def first_request(app_dir=API_DIR, mongo: str = "memory", timeout: float = 60.0) -> dict:
+    """Spawns bench/serve.py and polls /health; returns the phase timings in ms."""
+    port = _free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, str(SERVE), "--app-dir", str(app_dir), "--port", str(port), "--mongo", mongo],
+        stdout=subprocess.PIPE, text=True,
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=5.0) as client:
+            while True:
+                if proc.poll() is not None:
+                    raise RuntimeError(f"server exited with {proc.returncode} before answering")
+                if time.perf_counter() - started > timeout:
+                    raise RuntimeError(f"no answer on /health within {timeout}s")
+                try:
+                    if client.get("/health").status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.005)
+        first_ms = (time.perf_counter() - started) * 1000
+    finally:
+        proc.terminate()
+        try:
+            out, _ = proc.communicate(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            out, _ = proc.communicate()
+
+    phases = {}
+    for line in out.splitlines():
+        try:
+            report = json.loads(line)
+        except ValueError:
+            continue
+        phases[f"{report['phase']}_ms"] = report["ms"]
+    return {"first_request_ms": first_ms, **phases}
+
+
+def _summary(xs: list) -> dict:
+    return {
+        "requests": len(xs),
+        "errors": 0,
+        "client_errors": 0,
+        "rps": 0.0,
+        "mean_ms": round(statistics.fmean(xs), 2),
+        "p50_ms": round(percentile(xs, 50), 2),
+        "p95_ms": round(percentile(xs, 95), 2),
+        "p99_ms": round(percentile(xs, 99), 2),
+        "max_ms": round(max(xs), 2),
+    }
+
+
+def profile(app_dir=API_DIR, mongo: str = "memory", repeat: int = 5, top: int = 15) -> tuple:
+    """Returns (run, imports): a "startup" run with one endpoint per phase, and the last import breakdown."""
+    samples = {"import_main": [], "server_import": [], "startup_hooks": [], "first_request": []}
+    imports = None
+    for i in range(repeat):
+        imports = import_profile(app_dir, top)
+        samples["import_main"].append(imports["import_main_ms"])
+        timings = first_request(app_dir, mongo)
+        samples["server_import"].append(timings["import_ms"])
+        samples["startup_hooks"].append(timings["startup_ms"])
+        samples["first_request"].append(timings["first_request_ms"])
+        print(f"  #{i + 1}: import {imports['import_main_ms']:.0f} ms, "
+              f"first request after {timings['first_request_ms']:.0f} ms")
+    run = {
+        "mix": "startup",
+        "concurrency": 1,
+        "duration_s": 0.0,
+        "requests": repeat,
+        "errors": 0,
+        "client_errors": 0,
+        "rps": 0.0,
+        "p50_ms": round(percentile(samples["first_request"], 50), 2),
+        "p95_ms": round(percentile(samples["first_request"], 95), 2),
+        "p99_ms": round(percentile(samples["first_request"], 99), 2),
+        "endpoints": {name: _summary(xs) for name, xs in samples.items()},
+    }
+    return run, imports
+
+
+def print_profile(run: dict, imports: dict):
+    print(f"▶ startup: {run['requests']} cold starts")
+    for name, s in run["endpoints"].items():
+        print(f"  {name:<18} p50 {s['p50_ms']:>8} ms  max {s['max_ms']:>8} ms")
+    print("  slowest imports (cumulative):")
+    for m in imports["modules"]:
+        print(f"    {m['module']:<30} {m['cumulative_ms']:>8.1f} ms")
@@ -0,0 +1,133 @@
+# api_server/catalog_cache.py
+"""
+Read cache for catalog endpoints: GET /products results, facet counts and
+GET /products/slug documents.
+
+Each cached listing remembers the filter it was built from, so a product
+write only evicts the listings that product could appear in (before or
+after the change) and the slug entries it owns, instead of flushing
+everything. Facet counts span the whole catalog and are dropped on any write.
+"""
+import threading
+
+from cache import TTLCache
+from slugs import slug_key
+
+
+def _price(doc):
+    try:
+        return float(doc.get("price"))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class ListingFilter:
+    """The parts of a /products request that decide which products match."""
+
+    __slots__ = ("categories", "min_price", "max_price")
+
+    def __init__(self, categories=None, min_price=None, max_price=None):
+        self.categories = frozenset(categories) if categories else None
+        self.min_price = min_price
+        self.max_price = max_price
+
+    def could_contain(self, doc) -> bool:
+        # a document we know nothing about (e.g. a delete event) may be anywhere
+        if "category" not in doc or "price" not in doc:
+            return True
+        if self.categories is not None and doc.get("category") not in self.categories:
+            return False
+        price = _price(doc)
+        if self.min_price is not None and price < self.min_price:
+            return False
+        if self.max_price is not None and price > self.max_price:
+            return False
+        return True
+
+
+class CatalogCache:
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.listings = TTLCache(maxsize=maxsize, ttl=ttl)  # request key -> response
+        self.products = TTLCache(maxsize=maxsize, ttl=ttl)  # slug_key -> document
+        self.facets = TTLCache(maxsize=maxsize, ttl=ttl)    # filter key -> facet counts
+        self._filters = {}   # listing key -> ListingFilter
+        self._slug_by_id = {}  # product id -> cached slug key
+        self._lock = threading.Lock()
+        # bumped by every invalidation; a read that started before a write
+        # must not store what it fetched
+        self.generation = 0
+
+    # --- listings ---
+
+    def get_listing(self, key):
+        return self.listings.get(key)
+
+    def set_listing(self, key, listing_filter: ListingFilter, response, generation: int):
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._filters[key] = listing_filter
+            self.listings.set(key, response)
+
+    # --- facet counts ---
+
+    def get_facets(self, key):
+        return self.facets.get(key)
+
+    def set_facets(self, key, facets, generation: int):
+        with self._lock:
+            if generation != self.generation:
+                return
+            self.facets.set(key, facets)
+
+    # --- product documents ---
+
+    def get_product(self, slug: str):
+        return self.products.get(slug_key(slug))
+
+    def set_product(self, slug: str, doc, generation: int):
+        key = slug_key(slug)
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._slug_by_id[str(doc["_id"])] = key
+            self.products.set(key, doc)
+
+    # --- invalidation ---
+
+    def invalidate(self, before=None, after=None):
+        """
+        Evicts everything a product write could have changed. `before` and
+        `after` are the product document around the write; either may be
+        None (insert/delete) or partial (change events without pre-images).
+        """
+        docs = [d for d in (before, after) if d is not None]
+        with self._lock:
+            self.generation += 1
+            self.facets.clear()
+            for doc in docs:
+                doc_id = str(doc.get("_id"))
+                cached_key = self._slug_by_id.pop(doc_id, None)
+                if cached_key:
+                    self.products.pop(cached_key)
+                if doc.get("slug"):
+                    self.products.pop(slug_key(doc["slug"]))
+
+            for key, listing_filter in list(self._filters.items()):
+                if key not in self.listings:
+                    del self._filters[key]  # already expired/evicted
+                elif any(listing_filter.could_contain(d) for d in docs):
+                    self.listings.pop(key)
+                    del self._filters[key]
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self.listings.clear()
+            self.products.clear()
+            self.facets.clear()
+            self._filters.clear()
+            self._slug_by_id.clear()
+
+    def stats(self) -> dict:
+        return {"listings": self.listings.stats(), "products": self.products.stats(), "facets": self.facets.stats()}
@@ -0,0 +1,600 @@
+# api_server/catalog_snapshot.py
+"""
+Read-only catalog snapshot: products, categories, the slug map and rating
+summaries compiled into one binary file that workers memory-map.
+
+With CATALOG_SNAPSHOT set, GET /products (without `q`), GET
+/products/slug/{slug} and GET /categories are answered from the mapped file
+with no database round trips. Every product is stored pre-encoded as JSON
+(whole document, `card` and `detail` presets), so a listing page is the
+concatenation of its records. The OS page cache shares the file between
+worker processes, and a worker starts without reading the catalog from Mongo.
+
+Layout (native byte order, sections 8-byte aligned):
+
+    header     magic, directory offset, directory length
+    data       JSON records; product i has full/card/detail at offsets[3i:3i+4]
+    oids       12-byte ObjectIds; products are numbered in _id order
+    prices     float64 per product
+    created    int64 µs since epoch per product (NULL_TIME when missing)
+    newest     product numbers by (createdAt, _id) descending
+    by_price   product numbers by (price, _id) ascending
+    cat_*      the default/newest/by_price orders grouped by category
+    slug_*     slug keys per product, and product numbers sorted by slug key
+    categories the GET /categories response body
+    directory  JSON: counts, category names and ranges, section offsets
+
+Writers build the file under a temporary name and os.replace() it, so
+readers only ever map a complete file. SnapshotStore notices the swap.
+"""
+import asyncio
+import heapq
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+
+from bson import ObjectId
+
+from category_counts import category_view
+from projections import PRODUCT_PRESETS, apply_projection
+from responses import dumps, json_fragment
+from slugs import slug_key
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+MAGIC = b"TTCSNAP1"
+VERSION = 1
+HEADER = struct.Struct("<8sQQ")
+NULL_TIME = -(2 ** 63)
+EPOCH = datetime(1970, 1, 1)
+MAX_CATEGORIES = 0xFFFF
+
+# record variants per product, in file order
+VARIANTS = (None, PRODUCT_PRESETS["card"], PRODUCT_PRESETS["detail"])
+
+# sort name -> (order, descending); "ids" is the identity order
+SORTS = {
+    "default": ("ids", False),
+    "newest": ("newest", True),
+    "price_asc": ("by_price", False),
+    "price_desc": ("by_price", True),
+}
+
+
+def _loads(raw):
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+
+def _price(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _micros(value) -> int:
+    if not isinstance(value, datetime):
+        return NULL_TIME
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def _datetime(micros: int):
+    return None if micros == NULL_TIME else EPOCH + timedelta(microseconds=micros)
+
+
+def _first(seq, pred) -> int:
+    """First position in `seq` where the monotone `pred` holds (len(seq) if none)."""
+    lo, hi = 0, len(seq)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if pred(seq[mid]):
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo
+
+
+class _Reversed:
+    """Random-access reversed view of a sequence (price_desc walks by_price backwards)."""
+
+    __slots__ = ("seq",)
+
+    def __init__(self, seq):
+        self.seq = seq
+
+    def __len__(self):
+        return len(self.seq)
+
+    def __getitem__(self, k):
+        return self.seq[len(self.seq) - 1 - k]
+
+    def iter_from(self, start: int):
+        return (self.seq[j] for j in range(len(self.seq) - 1 - start, -1, -1))
+
+
+def _iter_from(stream, start: int):
+    if isinstance(stream, _Reversed):
+        return stream.iter_from(start)
+    return iter(stream[start:])
+
+
+# --- writing
+
+class SnapshotWriter:
+    """
+    Streams products into a new snapshot; they must arrive in _id order
+    (find().sort("_id", 1)). finish() writes the indexes and installs the
+    file unless a snapshot built from a later read is already in place.
+    """
+
+    def __init__(self, path: str, built_at: float = None):
+        self.path = path
+        self.tmp_path = f"{path}.tmp-{os.getpid()}"
+        self.built_at = time.time() if built_at is None else built_at
+        self.skipped = 0
+        self.installed = False
+        self._file = open(self.tmp_path, "wb")
+        self._file.write(HEADER.pack(MAGIC, 0, 0))
+        self._sections = {}
+        self._written = 0
+        self._offsets = array("Q", [0])
+        self._oids = bytearray()
+        self._prices = array("d")
+        self._created = array("q")
+        self._categories = array("H")
+        self._category_codes = {}
+        self._slugs = []
+        self._last_oid = b""
+
+    def __len__(self):
+        return len(self._prices)
+
+    def add(self, doc: dict):
+        oid = doc.get("_id")
+        if not isinstance(oid, ObjectId):
+            self.skipped += 1
+            return
+        if oid.binary <= self._last_oid:
+            raise ValueError("Snapshot products must be added in ascending _id order")
+        self._last_oid = oid.binary
+
+        for projection in VARIANTS:
+            record = dumps(apply_projection(doc, projection))
+            self._file.write(record)
+            self._written += len(record)
+            self._offsets.append(self._written)
+
+        category = doc.get("category")
+        code = self._category_codes.get(category)
+        if code is None:
+            code = self._category_codes[category] = len(self._category_codes)
+            if code >= MAX_CATEGORIES:
+                raise ValueError(f"Snapshots hold at most {MAX_CATEGORIES} categories")
+        self._oids += oid.binary
+        self._prices.append(_price(doc.get("price")))
+        self._created.append(_micros(doc.get("createdAt")))
+        self._categories.append(code)
+        self._slugs.append(slug_key(doc.get("slug")).encode())
+
+    def _section(self, name: str, data):
+        pad = -self._file.tell() % 8
+        if pad:
+            self._file.write(b"\0" * pad)
+        offset = self._file.tell()
+        data = memoryview(data).cast("B")
+        self._file.write(data)
+        self._sections[name] = [offset, len(data)]
+
+    def finish(self, categories_body: bytes) -> bool:
+        """Writes indexes and directory; returns False if a newer snapshot won."""
+        try:
+            self._sections["data"] = [HEADER.size, self._written]
+            n = len(self)
+            created, prices, codes = self._created, self._prices, self._categories
+            orders = {
+                "ids": range(n),
+                "newest": sorted(range(n), key=lambda i: (created[i], i), reverse=True),
+                "by_price": sorted(range(n), key=lambda i: (prices[i], i)),
+            }
+
+            # category ranges are the same in every grouped order
+            sizes = [0] * len(self._category_codes)
+            for code in codes:
+                sizes[code] += 1
+            ranges, start = [], 0
+            for size in sizes:
+                ranges.append([start, start + size])
+                start += size
+            for name, order in orders.items():
+                grouped = array("I", bytes(4 * n))
+                fill = [r[0] for r in ranges]
+                for i in order:
+                    code = codes[i]
+                    grouped[fill[code]] = i
+                    fill[code] += 1
+                self._section(f"cat_{name}", grouped)
+
+            slug_offsets = array("Q", [0])
+            for key in self._slugs:
+                slug_offsets.append(slug_offsets[-1] + len(key))
+            slug_order = array("I", sorted((i for i in range(n) if self._slugs[i]), key=self._slugs.__getitem__))
+
+            self._section("offsets", self._offsets)
+            self._section("oids", self._oids)
+            self._section("prices", prices)
+            self._section("created", created)
+            self._section("newest", array("I", orders["newest"]))
+            self._section("by_price", array("I", orders["by_price"]))
+            self._section("slug_keys", b"".join(self._slugs))
+            self._section("slug_offsets", slug_offsets)
+            self._section("slug_order", slug_order)
+            self._section("categories", categories_body)
+
+            directory = json.dumps({
+                "version": VERSION,
+                "byteorder": sys.byteorder,
+                "built_at": self.built_at,
+                "count": n,
+                "categories": list(self._category_codes),
+                "category_ranges": ranges,
+                "sections": self._sections,
+            }).encode()
+            offset = self._file.tell()
+            self._file.write(directory)
+            self._file.seek(0)
+            self._file.write(HEADER.pack(MAGIC, offset, len(directory)))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+
+            current = snapshot_built_at(self.path)
+            if current is not None and current > self.built_at:
+                os.remove(self.tmp_path)
+                return False
+            os.replace(self.tmp_path, self.path)
+            return True
+        except BaseException:
+            self.abort()
+            raise
+
+    def abort(self):
+        if not self._file.closed:
+            self._file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+def categories_body(docs) -> bytes:
+    """The GET /categories response for category documents."""
+    return dumps({"categories": [category_view(c) for c in docs]})
+
+
+def snapshot_built_at(path: str):
+    """`built_at` of the snapshot at `path`, or None when there is no readable one."""
+    try:
+        with open(path, "rb") as f:
+            magic, offset, length = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC:
+                return None
+            f.seek(offset)
+            return json.loads(f.read(length))["built_at"]
+    except (OSError, ValueError, KeyError, struct.error):
+        return None
+
+
+async def build_snapshot(products_col, categories_col, path: str) -> SnapshotWriter:
+    """
+    Reads the catalog through Motor and writes a snapshot at `path`.
+    Returns the writer; `installed` says whether the file was swapped in.
+    """
+    writer = SnapshotWriter(path)
+    try:
+        async for doc in products_col.find({}).sort("_id", 1):
+            writer.add(doc)
+        body = categories_body(await categories_col.find({}).to_list(length=None))
+    except BaseException:
+        writer.abort()
+        raise
+    writer.installed = await asyncio.to_thread(writer.finish, body)
+    return writer
+
+
+# --- reading
+
+class CatalogSnapshot:
+    """One mapped snapshot file. Instances are immutable and safe to share between requests."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, offset, length = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a catalog snapshot")
+        directory = json.loads(self._map[offset:offset + length])
+        if directory["version"] != VERSION or directory["byteorder"] != sys.byteorder:
+            raise ValueError(f"{path} was written by an incompatible version or platform")
+
+        self.built_at = directory["built_at"]
+        self.count = directory["count"]
+        self.category_codes = {name: code for code, name in enumerate(directory["categories"])}
+        self.category_ranges = directory["category_ranges"]
+
+        view = memoryview(self._map)
+
+        def section(name, fmt="B"):
+            start, size = directory["sections"][name]
+            return view[start:start + size].cast(fmt)
+
+        self._data = section("data")
+        self._offsets = section("offsets", "Q")
+        self._oids = section("oids")
+        self.prices = section("prices", "d")
+        self.created = section("created", "q")
+        self._orders = {
+            "ids": range(self.count),
+            "newest": section("newest", "I"),
+            "by_price": section("by_price", "I"),
+        }
+        self._grouped = {name: section(f"cat_{name}", "I") for name in self._orders}
+        self._slug_keys = section("slug_keys")
+        self._slug_offsets = section("slug_offsets", "Q")
+        self._slug_order = section("slug_order", "I")
+        self._categories = section("categories")
+
+    def __len__(self):
+        return self.count
+
+    # --- records
+
+    def oid(self, i: int) -> bytes:
+        return self._oids[12 * i:12 * i + 12].tobytes()
+
+    def record(self, i: int, projection=None) -> bytes:
+        """Product i as JSON; presets are stored, other projections are cut from the full record."""
+        for variant, stored in enumerate(VARIANTS):
+            if projection == stored:
+                return self._data[self._offsets[3 * i + variant]:self._offsets[3 * i + variant + 1]].tobytes()
+        full = self._data[self._offsets[3 * i]:self._offsets[3 * i + 1]]
+        return dumps(apply_projection(_loads(full), projection))
+
+    def document(self, i: int) -> dict:
+        return _loads(self._data[self._offsets[3 * i]:self._offsets[3 * i + 1]])
+
+    def documents(self):
+        for i in range(self.count):
+            yield self.document(i)
+
+    def index_of(self, product_id):
+        """Product number for an ObjectId (or its hex string), or None."""
+        try:
+            target = ObjectId(str(product_id)).binary
+        except Exception:
+            return None
+        i = _first(range(self.count), lambda j: self.oid(j) >= target)
+        return i if i < self.count and self.oid(i) == target else None
+
+    def by_slug(self, slug):
+        target = slug_key(slug).encode()
+
+        def key(i):
+            return self._slug_keys[self._slug_offsets[i]:self._slug_offsets[i + 1]].tobytes()
+
+        k = _first(self._slug_order, lambda i: key(i) >= target)
+        if k < len(self._slug_order) and key(self._slug_order[k]) == target:
+            return self._slug_order[k]
+        return None
+
+    def items(self, ids, projection=None) -> list:
+        """Records for string ids (e.g. search hits), in order, skipping unknown ones."""
+        numbers = (self.index_of(i) for i in ids)
+        return [json_fragment(self.record(i, projection)) for i in numbers if i is not None]
+
+    def categories_body(self) -> bytes:
+        return self._categories.tobytes()
+
+    # --- listings
+
+    def _key(self, order: str):
+        if order == "newest":
+            return lambda i: (self.created[i], i)
+        if order == "by_price":
+            return lambda i: (self.prices[i], i)
+        return None
+
+    def _streams(self, categories, order: str):
+        """One sequence per selected category (or the whole catalog), each already in `order`."""
+        if not categories:
+            return [self._orders[order]]
+        grouped = self._grouped[order]
+        codes = sorted({self.category_codes[c] for c in categories if c in self.category_codes})
+        return [grouped[self.category_ranges[c][0]:self.category_ranges[c][1]] for c in codes]
+
+    def _price_slice(self, stream, min_price, max_price):
+        """Bounds of the price range within a by_price stream."""
+        lo = 0 if min_price is None else _first(stream, lambda i: self.prices[i] >= min_price)
+        hi = len(stream) if max_price is None else _first(stream, lambda i: self.prices[i] > max_price)
+        return lo, max(lo, hi)
+
+    def _select(self, categories, min_price, max_price, sort: str, after=None):
+        """
+        (total, iterator of product numbers) for a filter in sort order,
+        optionally starting strictly after the `after` sort key.
+        """
+        order, descending = SORTS[sort]
+        min_price = None if min_price is None else float(min_price)
+        max_price = None if max_price is None else float(max_price)
+        price_filtered = min_price is not None or max_price is not None
+
+        # totals always come from by_price: per category, the price range is one slice
+        total = 0
+        for stream in self._streams(categories, "by_price"):
+            lo, hi = self._price_slice(stream, min_price, max_price) if price_filtered else (0, len(stream))
+            total += hi - lo
+
+        key = self._key(order) or (lambda i: i)
+        streams = []
+        for stream in self._streams(categories, order):
+            if order == "by_price" and price_filtered:
+                lo, hi = self._price_slice(stream, min_price, max_price)
+                stream = stream[lo:hi]
+            if descending and order == "by_price":
+                stream = _Reversed(stream)
+            start = 0
+            if after is not None:
+                if descending:
+                    start = _first(stream, lambda i: key(i) < after)
+                else:
+                    start = _first(stream, lambda i: key(i) > after)
+            streams.append(_iter_from(stream, start))
+
+        if not streams:
+            return 0, iter(())
+        merged = streams[0] if len(streams) == 1 else heapq.merge(*streams, key=key, reverse=descending)
+        if price_filtered and order != "by_price":
+            low = float("-inf") if min_price is None else min_price
+            high = float("inf") if max_price is None else max_price
+            merged = (i for i in merged if low <= self.prices[i] <= high)
+        return total, merged
+
+    def page(self, categories, min_price, max_price, sort: str, skip: int, limit: int, projection=None):
+        """(total, items) for page mode."""
+        total, numbers = self._select(categories, min_price, max_price, sort)
+        return total, [json_fragment(self.record(i, projection)) for i in islice(numbers, skip, skip + limit)]
+
+    def seek(self, categories, min_price, max_price, sort: str, position: dict, limit: int, projection=None):
+        """
+        (total, items, last product number) for cursor mode. `position` is a
+        decoded pagination cursor ({"id", "v"}), so cursors issued by the
+        Mongo path and by the snapshot are interchangeable.
+        """
+        after = None
+        if position:
+            after = self._cursor_key(SORTS[sort][0], position)
+        total, numbers = self._select(categories, min_price, max_price, sort, after)
+        chosen = list(islice(numbers, limit))
+        items = [json_fragment(self.record(i, projection)) for i in chosen]
+        return total, items, (chosen[-1] if chosen else None)
+
+    def _cursor_key(self, order: str, position: dict):
+        # the cursor's product may be gone: between two numbers it sits at n - 0.5
+        target = ObjectId(str(position["id"])).binary
+        n = _first(range(self.count), lambda j: self.oid(j) >= target)
+        number = n if n < self.count and self.oid(n) == target else n - 0.5
+        if order == "newest":
+            return (_micros(position.get("v")), number)
+        if order == "by_price":
+            return (_price(position.get("v")), number)
+        return number
+
+    def cursor_doc(self, i: int, field: str) -> dict:
+        """The fields cursor_for() needs for product i."""
+        doc = {"_id": ObjectId(self.oid(i))}
+        if field == "createdAt":
+            doc[field] = _datetime(self.created[i])
+        elif field == "price":
+            doc[field] = self.prices[i]
+        return doc
+
+
+class SnapshotStore:
+    """
+    The current CatalogSnapshot for a path. refresh() maps the file again
+    when it was replaced; watch() polls for that; schedule_rebuild()
+    coalesces a burst of catalog writes into one rebuild.
+    """
+
+    def __init__(self, path: str, poll: float = 1.0, debounce: float = 2.0, on_swap=None):
+        self.path = path
+        self.poll = poll
+        self.debounce = debounce
+        self.on_swap = on_swap
+        self.current = None
+        self.rebuilds = 0
+        self._stamp = None
+        self._dirty = False
+        self._rebuild_task = None
+
+    def _load(self) -> bool:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if stamp == self._stamp:
+            return False
+        # the previous snapshot stays mapped until in-flight requests drop it
+        self.current = CatalogSnapshot(self.path)
+        self._stamp = stamp
+        return True
+
+    async def refresh(self, notify: bool = True) -> bool:
+        """Maps the file again if it was replaced; `notify` runs on_swap after a swap."""
+        if not self._load():
+            return False
+        print(f"🗂️ Catalog snapshot loaded: {self.current.count} products from {self.path}")
+        if notify and self.on_swap is not None:
+            await self.on_swap(self.current)
+        return True
+
+    async def watch(self):
+        while True:
+            await asyncio.sleep(self.poll)
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print("❌ Catalog snapshot reload failed:", e)
+
+    def schedule_rebuild(self, build):
+        """`build(path)` runs `debounce` seconds after the first write of a burst, again if writes continue."""
+        self._dirty = True
+        if self._rebuild_task is None or self._rebuild_task.done():
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return
+            self._rebuild_task = loop.create_task(self._rebuild(build))
+
+    async def _rebuild(self, build):
+        while self._dirty:
+            await asyncio.sleep(self.debounce)
+            self._dirty = False
+            started = time.perf_counter()
+            try:
+                writer = await build(self.path)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # keep serving the previous snapshot; the next write retries
+                print("❌ Catalog snapshot rebuild failed:", e)
+                continue
+            self.rebuilds += 1
+            print(f"🗂️ Catalog snapshot rebuilt: {len(writer)} products in {time.perf_counter() - started:.2f}s")
+            await self.refresh()
+
+    def stats(self) -> dict:
+        snapshot = self.current
+        return {
+            "path": self.path,
+            "products": snapshot.count if snapshot else None,
+            "built_at": datetime.utcfromtimestamp(snapshot.built_at) if snapshot else None,
+            "rebuilds": self.rebuilds,
+            "rebuild_pending": self._dirty,
+        }
+
+    def close(self):
+        if self._rebuild_task is not None:
+            self._rebuild_task.cancel()
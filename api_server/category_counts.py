@@ -0,0 +1,110 @@
+# api_server/category_counts.py
+"""
+Per-category product counts, materialized on the category documents as
+`productCount`.
+
+The product write endpoints keep the counts current with `$inc` upserts;
+`rebuild_ops` and `count_reset_op` recompute them from scratch (one `$group`
+over products) for backfill or repair.
+"""
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import UpdateMany, UpdateOne
+
+
+def category_key(name) -> str:
+    """Case-insensitive form of a category name, used for duplicate checks."""
+    return str(name or "").strip().lower()
+
+
+# fields GET /categories reads
+CATEGORY_PROJECTION = {"name": 1, "Name": 1, "status": 1, "createdAt": 1, "productCount": 1}
+
+
+def category_view(doc: dict) -> dict:
+    """A category as GET /categories returns it (legacy `Name`, counts clamped at 0)."""
+    return {
+        "_id": str(doc.get("_id")),
+        "name": doc.get("name") or doc.get("Name") or "Unnamed Category",
+        "status": doc.get("status", "Active"),
+        "createdAt": doc.get("createdAt"),
+        "productCount": max(0, int(doc.get("productCount", 0))),
+    }
+
+
+def count_update(name: str, delta: int) -> UpdateOne:
+    """Adjusts one category's count, creating the category on first use."""
+    return UpdateOne(
+        {"name": name},
+        {
+            "$inc": {"productCount": delta},
+            "$setOnInsert": {
+                "name_key": category_key(name),
+                "status": "Active",
+                "createdAt": datetime.utcnow(),
+            },
+        },
+        upsert=True,
+    )
+
+
+def count_changes(before, after):
+    """UpdateOne ops for a product write; `before`/`after` are None on insert/delete."""
+    old = (before or {}).get("category")
+    new = (after or {}).get("category")
+    if old == new:
+        return []
+    ops = []
+    if old:
+        ops.append(count_update(old, -1))
+    if new:
+        ops.append(count_update(new, 1))
+    return ops
+
+
+COUNT_PIPELINE = [
+    {"$match": {"category": {"$type": "string", "$ne": ""}}},
+    {"$group": {"_id": "$category", "count": {"$sum": 1}}},
+]
+
+
+def rebuild_ops(groups, run_id) -> list:
+    """
+    Turns COUNT_PIPELINE output into upserts that set every count, create
+    missing categories and backfill `name_key`, each stamped with the
+    rebuild's run id; count_reset_op(run_id) then zeroes the rest.
+    """
+    now = datetime.utcnow()
+    return [
+        UpdateOne(
+            {"name": group["_id"]},
+            {
+                "$set": {"productCount": group["count"], "name_key": category_key(group["_id"]), "rebuild_id": run_id},
+                "$setOnInsert": {"status": "Active", "createdAt": now},
+            },
+            upsert=True,
+        )
+        for group in groups
+    ]
+
+
+def count_reset_op(run_id) -> UpdateMany:
+    """Zeroes categories the rebuild did not stamp, i.e. with no products (run after the rebuild ops)."""
+    return UpdateMany(
+        {"rebuild_id": {"$ne": run_id}},
+        [{"$set": {"productCount": 0, "name_key": {"$toLower": {"$trim": {"input": "$name"}}}}}],
+    )
+
+
+def rebuild_counts(categories_col, groups) -> tuple:
+    """Runs a rebuild through pymongo (scripts, db_setup); returns (upserted, modified)."""
+    run_id = ObjectId()
+    upserted = modified = 0
+    ops = rebuild_ops(groups, run_id)
+    if ops:
+        result = categories_col.bulk_write(ops, ordered=False)
+        upserted, modified = result.upserted_count, result.modified_count
+    # only after every stamp has landed, so no live category is zeroed
+    modified += categories_col.bulk_write([count_reset_op(run_id)]).modified_count
+    return upserted, modified
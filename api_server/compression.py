@@ -0,0 +1,144 @@
+# api_server/compression.py
+"""
+Response compression: brotli when the client accepts it and the `brotli`
+package is installed, gzip otherwise.
+
+Plain ASGI middleware like metrics.MetricsMiddleware. Bodies under
+`minimum_size` and types that do not compress (images, already encoded
+responses, 304s) pass through untouched. Streamed responses (order and
+product exports) are compressed chunk by chunk. A body sent with an ETag
+is the same bytes every time, so its compressed form is kept in a small
+cache keyed by (ETag, encoding) and repeat reads of a cached listing skip
+the compressor.
+"""
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from cache import TTLCache
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    "application/json", "application/x-ndjson", "application/javascript", "application/xml",
+    "text/", "image/svg+xml",
+)
+
+
+def accepted_encoding(accept_encoding: str):
+    """"br", "gzip" or None for an Accept-Encoding header, honouring q=0 and *."""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip()] = q
+    default = weights.get("*", 0.0)
+    candidates = (("br",) if brotli is not None else ()) + ("gzip",)
+    best = max(candidates, key=lambda e: weights.get(e, default))
+    return best if weights.get(best, default) > 0 else None
+
+
+def _compressor(encoding: str, gzip_level: int, brotli_quality: int):
+    if encoding == "br":
+        return brotli.Compressor(quality=brotli_quality)
+    # wbits 31: gzip container, zero mtime, so equal bodies compress to equal bytes
+    return zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+
+def _compress(encoding: str, body: bytes, gzip_level: int, brotli_quality: int) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=brotli_quality)
+    compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+    return compressor.compress(body) + compressor.flush()
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4,
+                 cache_size: int = 256, cache_ttl: float = 300.0):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        # 4-5 is the usual speed/ratio point for dynamic responses (11 is for static assets)
+        self.brotli_quality = brotli_quality
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+
+    def compress(self, encoding: str, body: bytes, tag=None) -> bytes:
+        key = (tag, encoding) if tag else None
+        data = self.cache.get(key) if key else None
+        if data is None:
+            data = _compress(encoding, body, self.gzip_level, self.brotli_quality)
+            if key:
+                self.cache.set(key, data)
+        return data
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        encoding = accepted_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+        stream = None
+
+        async def send_compressed(message):
+            nonlocal start, stream
+            if message["type"] == "http.response.start":
+                start = message  # held until the first body chunk shows the size
+                return
+            if message["type"] != "http.response.body":
+                return await send(message)
+
+            body = message.get("body", b"")
+            more = message.get("more_body", False)
+            if start is not None:
+                first, start = start, None
+                headers = MutableHeaders(raw=first["headers"])
+                if not self._compressible(first["status"], headers) or (not more and len(body) < self.minimum_size):
+                    await send(first)
+                    return await send(message)
+                headers["Content-Encoding"] = encoding
+                if "accept-encoding" not in headers.get("vary", "").lower():
+                    headers.add_vary_header("Accept-Encoding")
+                tag = headers.get("etag")
+                if tag and not tag.startswith("W/"):
+                    # the compressed bytes differ, so a strong validator no longer holds
+                    headers["ETag"] = "W/" + tag
+                if not more:
+                    data = self.compress(encoding, body, tag)
+                    headers["Content-Length"] = str(len(data))
+                    await send(first)
+                    return await send({"type": "http.response.body", "body": data})
+                if "content-length" in headers:
+                    del headers["Content-Length"]
+                stream = _compressor(encoding, self.gzip_level, self.brotli_quality)
+                await send(first)
+            elif stream is None:
+                return await send(message)
+
+            data = stream.process(body) if encoding == "br" else stream.compress(body)
+            if not more:
+                data += stream.finish() if encoding == "br" else stream.flush()
+            elif not data:
+                return  # the compressor is still buffering
+            await send({"type": "http.response.body", "body": data, "more_body": more})
+
+        await self.app(scope, receive, send_compressed)
+
+    @staticmethod
+    def _compressible(status: int, headers) -> bool:
+        if status < 200 or status in (204, 304) or "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "")
+        return content_type.startswith(COMPRESSIBLE_TYPES)
@@ -0,0 +1,112 @@
+# api_server/customer_stats.py
+"""
+Per-customer order statistics, materialized on the customer documents.
+
+Customers are keyed by `email_key` (normalized contact email). place_order
+upserts the stats with `$inc`/`$min`/`$max`, so the admin listing never has
+to aggregate orders; `rebuild_ops` recomputes everything from the orders
+collection (one `$group`) for backfill or repair.
+"""
+from datetime import datetime
+
+from pymongo import UpdateMany, UpdateOne
+
+STAT_FIELDS = ("total_orders", "lifetime_value", "first_order_at", "last_order_at")
+
+# upserts per bulk_write during a rebuild
+REBUILD_BATCH = 1000
+
+
+def customer_key(email) -> str:
+    return str(email or "").strip().lower()
+
+
+def order_email(order: dict) -> str:
+    contact = order.get("contact")
+    return customer_key(contact.get("email") if isinstance(contact, dict) else None)
+
+
+def order_value(order: dict) -> float:
+    try:
+        return float(order.get("total") or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def order_update(order: dict):
+    """Upsert that folds one new order into its customer's stats (None without an email)."""
+    key = order_email(order)
+    if not key:
+        return None
+    created_at = order.get("created_at") or datetime.utcnow()
+    fields = {"email": order["contact"]["email"].strip(), "user_id": order.get("user_id")}
+    shipping = order.get("shipping")
+    if isinstance(shipping, dict) and shipping.get("name"):
+        fields["full_name"] = shipping["name"]
+    return UpdateOne(
+        {"email_key": key},
+        {
+            "$inc": {"total_orders": 1, "lifetime_value": order_value(order)},
+            "$min": {"first_order_at": created_at, "created_at": created_at},
+            "$max": {"last_order_at": created_at},
+            "$set": fields,
+        },
+        upsert=True,
+    )
+
+
+def order_removal(order: dict):
+    """Takes a deleted order back out of the count and lifetime value."""
+    key = order_email(order)
+    if not key:
+        return None
+    return UpdateOne(
+        {"email_key": key},
+        {"$inc": {"total_orders": -1, "lifetime_value": -order_value(order)}},
+    )
+
+
+STATS_PIPELINE = [
+    {"$match": {"contact.email": {"$type": "string", "$ne": ""}}},
+    {"$sort": {"created_at": 1}},
+    {"$group": {
+        "_id": {"$toLower": {"$trim": {"input": "$contact.email"}}},
+        "email": {"$last": {"$trim": {"input": "$contact.email"}}},
+        "user_id": {"$last": "$user_id"},
+        "full_name": {"$last": "$shipping.name"},
+        "total_orders": {"$sum": 1},
+        "lifetime_value": {"$sum": {"$convert": {
+            "input": "$total", "to": "double", "onError": 0, "onNull": 0,
+        }}},
+        "first_order_at": {"$min": "$created_at"},
+        "last_order_at": {"$max": "$created_at"},
+    }},
+]
+
+
+# customers created before email_key existed
+KEY_BACKFILL = UpdateMany(
+    {"email_key": {"$exists": False}},
+    [{"$set": {"email_key": {"$toLower": {"$trim": {"input": {"$ifNull": ["$email", ""]}}}}}}],
+)
+
+
+def rebuild_op(group: dict, run_id) -> UpdateOne:
+    """Sets one customer's stats from a STATS_PIPELINE group, stamped with the rebuild's run id."""
+    fields = {f: group[f] for f in STAT_FIELDS}
+    fields.update(email=group["email"], user_id=group.get("user_id"), rebuild_id=run_id)
+    if group.get("full_name"):
+        fields["full_name"] = group["full_name"]
+    return UpdateOne(
+        {"email_key": group["_id"]},
+        {"$set": fields, "$setOnInsert": {"created_at": group["first_order_at"] or datetime.utcnow()}},
+        upsert=True,
+    )
+
+
+def reset_op(run_id) -> UpdateMany:
+    """Zeroes customers the rebuild did not stamp, i.e. with no orders left (run after the rebuild ops)."""
+    return UpdateMany(
+        {"rebuild_id": {"$ne": run_id}},
+        {"$set": {"total_orders": 0, "lifetime_value": 0.0, "first_order_at": None, "last_order_at": None}},
+    )
@@ -1,23 +1,219 @@
-from pymongo import MongoClient
+# api_server/db.py
+"""
+Mongo connections for the API, db_setup.py, the scripts and the bench.
+
+One client per process and driver: get_async_client() (Motor, the API) and
+get_client() (pymongo, scripts), both built from client_options() so pool
+size, timeouts and compression come from the same MONGO_* settings.
+Nothing happens at import: `from db import products_col` still works and
+connects on first access. Call load_dotenv() before importing if the
+settings live in .env.
+
+Collections belong to groups with their own read preference and read/write
+concern (collection(db, name)); PoolStats counts connections per server for
+/admin/db/pool and /metrics.
+"""
 import os
-from dotenv import load_dotenv
+import threading
+from collections import defaultdict
 
-load_dotenv()
+from pymongo import MongoClient, ReadPreference, monitoring
+from pymongo.read_concern import ReadConcern
+from pymongo.write_concern import WriteConcern
 
-# MongoDB connection URI
 MONGO_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
 DB_NAME = os.getenv("MONGODB_DB", "TEE-TRIBE")
 
-client = MongoClient(MONGO_URI)
-db = client[DB_NAME]
-
-# Collections
-products_col = db["products"]
-# add after products_col defined
-# creates a text index on meta_keywords for faster search (optional)
-try:
-    db.products.create_index([("meta_keywords", "text")], default_language="none")
-except Exception:
-    pass
-orders_col = db["orders"]
-users_col = db["users"]
+# env var -> (client option, default); size these against the Mongo tier's
+# connection limit: workers x MONGO_MAX_POOL_SIZE x mongos/members
+POOL_SETTINGS = {
+    "MONGO_MAX_POOL_SIZE": ("maxPoolSize", "100"),
+    "MONGO_MIN_POOL_SIZE": ("minPoolSize", "0"),
+    "MONGO_MAX_CONNECTING": ("maxConnecting", "2"),
+    "MONGO_MAX_IDLE_TIME_MS": ("maxIdleTimeMS", "60000"),
+    "MONGO_CONNECT_TIMEOUT_MS": ("connectTimeoutMS", "5000"),
+    "MONGO_SERVER_SELECTION_TIMEOUT_MS": ("serverSelectionTimeoutMS", "5000"),
+    "MONGO_SOCKET_TIMEOUT_MS": ("socketTimeoutMS", "20000"),
+    "MONGO_WAIT_QUEUE_TIMEOUT_MS": ("waitQueueTimeoutMS", "5000"),
+}
+# scripts run long aggregations and bulk writes one at a time
+SCRIPT_OVERRIDES = {"maxPoolSize": 10, "socketTimeoutMS": None, "waitQueueTimeoutMS": None}
+
+# --- Collection groups: MONGO_<GROUP>_READ_PREFERENCE / _READ_CONCERN / _WRITE_CONCERN
+# override these. Uncached catalog reads (reviews, categories, exports)
+# tolerate replication lag; reads that fill a cache go through primary() so
+# they cannot bring back what a write just invalidated. Order writes wait
+# for a majority so a failover cannot lose them.
+COLLECTION_GROUPS = {
+    "products": "catalog", "categories": "catalog", "reviews": "catalog",
+    "orders": "orders", "customers": "orders", "stripe_prices": "orders", "fx_rates": "orders",
+    "carts": "carts",
+    "ai_jobs": "jobs", "ai_job_items": "jobs", "ai_enhance_cache": "jobs",
+}
+GROUP_DEFAULTS = {
+    "catalog": {"read_preference": "secondaryPreferred", "read_concern": "", "write_concern": ""},
+    "orders": {"read_preference": "primary", "read_concern": "", "write_concern": "majority"},
+    "carts": {"read_preference": "primary", "read_concern": "", "write_concern": ""},
+    "jobs": {"read_preference": "primary", "read_concern": "", "write_concern": ""},
+}
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
+_COLLECTIONS = {"products_col": "products", "orders_col": "orders", "users_col": "users"}
+_client = None
+_async_client = None
+
+
+def client_options(**overrides) -> dict:
+    """Client keyword arguments from the MONGO_* environment; `overrides` win."""
+    options = {option: int(os.getenv(env, default)) for env, (option, default) in POOL_SETTINGS.items()}
+    # e.g. "zstd,zlib": worth it when Mongo is across a network; zstd needs the zstandard package
+    compressors = os.getenv("MONGO_COMPRESSORS", "")
+    if compressors:
+        options["compressors"] = compressors
+        options["zlibCompressionLevel"] = int(os.getenv("MONGO_ZLIB_LEVEL", "-1"))
+    options["appname"] = os.getenv("MONGO_APP_NAME", "tee-tribe")
+    options.update(overrides)
+    return options
+
+
+def group_options(group: str) -> dict:
+    """get_collection() keyword arguments for a collection group ({} for unknown groups)."""
+    defaults = GROUP_DEFAULTS.get(group)
+    if defaults is None:
+        return {}
+    prefix = f"MONGO_{group.upper()}_"
+    read_preference = os.getenv(prefix + "READ_PREFERENCE", defaults["read_preference"])
+    read_concern = os.getenv(prefix + "READ_CONCERN", defaults["read_concern"])
+    write_concern = os.getenv(prefix + "WRITE_CONCERN", defaults["write_concern"])
+    if read_preference not in READ_PREFERENCES:
+        raise ValueError(f"{prefix}READ_PREFERENCE must be one of {', '.join(READ_PREFERENCES)}")
+    options = {"read_preference": READ_PREFERENCES[read_preference]}
+    # empty means the server default (not sent with each command)
+    if read_concern:
+        options["read_concern"] = ReadConcern(read_concern)
+    if write_concern:
+        w = int(write_concern) if write_concern.isdigit() else write_concern
+        options["write_concern"] = WriteConcern(w=w)
+    return options
+
+
+def collection(database, name: str):
+    """`database[name]` with its group's read preference and concerns (Motor or pymongo)."""
+    return database.get_collection(name, **group_options(COLLECTION_GROUPS.get(name, "")))
+
+
+def primary(col):
+    """The same collection reading from the primary, for read-then-write paths."""
+    return col.with_options(read_preference=ReadPreference.PRIMARY)
+
+
+# --- Clients
+
+def get_client(**overrides) -> MongoClient:
+    """The process-wide pymongo client (scripts and tooling)."""
+    global _client
+    if _client is None:
+        _client = MongoClient(MONGO_URI, **client_options(**{**SCRIPT_OVERRIDES, **overrides}))
+    return _client
+
+
+def get_db():
+    return get_client()[DB_NAME]
+
+
+def get_async_client(**overrides):
+    """The process-wide Motor client; `overrides` (e.g. event_listeners) apply on first call only."""
+    global _async_client
+    if _async_client is None:
+        import motor.motor_asyncio
+
+        _async_client = motor.motor_asyncio.AsyncIOMotorClient(MONGO_URI, **client_options(**overrides))
+    return _async_client
+
+
+def get_async_db():
+    return get_async_client()[DB_NAME]
+
+
+def __getattr__(name):
+    # module-level `client`, `db` and *_col, created on first use
+    if name == "client":
+        return get_client()
+    if name == "db":
+        return get_db()
+    if name in _COLLECTIONS:
+        return collection(get_db(), _COLLECTIONS[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# --- Pool stats
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """
+    Connection counts per server from pool events: open, in use, waiting
+    for a connection, plus totals. Pass it in event_listeners when the
+    client is created; events arrive from driver threads, hence the lock.
+    Callbacks added with subscribe() get every change as (server, deltas).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._servers = defaultdict(lambda: dict.fromkeys(
+            ("open", "in_use", "waiting", "created", "closed", "checkouts", "checkout_failures", "cleared"), 0,
+        ))
+        self._subscribers = []
+
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+
+    def _add(self, address, **deltas):
+        name = f"{address[0]}:{address[1]}"
+        with self._lock:
+            server = self._servers[name]
+            for key, delta in deltas.items():
+                server[key] += delta
+        for callback in self._subscribers:
+            callback(name, deltas)
+
+    def pool_created(self, event):
+        self._add(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._add(event.address, cleared=1)
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._add(event.address, open=1, created=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._add(event.address, open=-1, closed=1)
+
+    def connection_check_out_started(self, event):
+        self._add(event.address, waiting=1)
+
+    def connection_check_out_failed(self, event):
+        self._add(event.address, waiting=-1, checkout_failures=1)
+
+    def connection_checked_out(self, event):
+        self._add(event.address, waiting=-1, in_use=1, checkouts=1)
+
+    def connection_checked_in(self, event):
+        self._add(event.address, in_use=-1)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {address: dict(counts) for address, counts in self._servers.items()}
@@ -1,70 +1,28 @@
 # api_server/db_setup.py
-import json
-import pymongo
-from datetime import datetime
-from pathlib import Path
-
-MONGO_URI = "mongodb://localhost:27017"
-DB_NAME = "TEE-TRIBE"
-
-client = pymongo.MongoClient(MONGO_URI)
-db = client[DB_NAME]
-
-# --- Create collection with basic validation if missing
-product_schema = {
-    "$jsonSchema": {
-        "bsonType": "object",
-        "required": ["name", "slug", "category", "price", "image"],
-        "properties": {
-            "name": {"bsonType": "string"},
-            "slug": {"bsonType": "string"},
-            "category": {"bsonType": "string"},
-            "price": {"bsonType": "number", "minimum": 0},
-            "image": {"bsonType": "string"},
-            "description": {"bsonType": "string"},
-            "sizes": {"bsonType": "array", "items": {"bsonType": "string"}},
-            "colors": {"bsonType": "array", "items": {"bsonType": "string"}},
-            "frontendId": {"bsonType": "string"},
-            "createdAt": {"bsonType": "date"},
-            "updatedAt": {"bsonType": "date"}
-        }
-    }
-}
+"""
+One-time database setup: collections with validators, every index the API
+and scripts rely on, and the products.json seed.
 
-if "products" not in db.list_collection_names():
-    db.create_collection("products", validator={"$jsonSchema": product_schema["$jsonSchema"]})
-    print("✅ Created 'products' collection with validation")
-else:
-    print("ℹ️ 'products' collection exists")
+Run it on deploy (or once locally) rather than from worker start-up:
 
-# Indexes
-db.products.create_index("slug", unique=True)
-db.products.create_index("category")
-db.products.create_index("price")
+    python db_setup.py                 # collections, indexes, seed
+    python db_setup.py --indexes-only  # collections and indexes only
 
-# --- Load products.json next to this file
-json_path = Path(__file__).with_name("products.json")
-if not json_path.exists():
-    raise FileNotFoundError(f"Missing {json_path}. Put products.json beside db_setup.py.")
-
-with open(json_path, "r", encoding="utf-8") as f:
-    data = json.load(f)
-
-for p in data:
-    p.setdefault("createdAt", datetime.utcnow())
-    p.setdefault("updatedAt", datetime.utcnow())
-    p.setdefault("meta_keywords", []) 
-
-if db.products.count_documents({}) == 0:
-    db.products.insert_many(data)
-    print(f"🛍️ Inserted {len(data)} products")
-else:
-    print("ℹ️ Products already seeded, skipping")
+Workers then start with MONGO_ENSURE_INDEXES=0 (see main.py).
+"""
+import argparse
+import json
+from datetime import datetime
+from pathlib import Path
 
-print("🎉 DB ready at mongodb://localhost:27017/TEE-TRIBE")
+from category_counts import COUNT_PIPELINE, rebuild_counts
+from db import DB_NAME, MONGO_URI, get_db
+from indexes import apply_indexes
+from product_schema import product_schema
+from review_stats import empty_rating
+from slugs import slug_key
 
-# --- Create 'carts' collection if missing
-cart_schema = {
+CART_SCHEMA = {
     "$jsonSchema": {
         "bsonType": "object",
         "required": ["user_id", "items"],
@@ -92,8 +50,61 @@ cart_schema = {
     }
 }
 
-if "carts" not in db.list_collection_names():
-    db.create_collection("carts", validator={"$jsonSchema": cart_schema["$jsonSchema"]})
-    print("✅ Created 'carts' collection")
-else:
-    print("ℹ️ 'carts' collection exists")
+
+def ensure_collections(db):
+    """Creates validated collections; must run before ensure_indexes, which would create them bare."""
+    existing = set(db.list_collection_names())
+    for name, schema in (("products", product_schema), ("carts", CART_SCHEMA)):
+        if name not in existing:
+            db.create_collection(name, validator={"$jsonSchema": schema["$jsonSchema"]})
+            print(f"✅ Created '{name}' collection with validation")
+        else:
+            print(f"ℹ️ '{name}' collection exists")
+
+
+def ensure_indexes(db):
+    """Every index in the registry (indexes.py)."""
+    apply_indexes(db)
+    print("🗂️ Indexes ensured")
+
+
+def seed_products(db):
+    """Inserts products.json (next to this file) into an empty products collection."""
+    json_path = Path(__file__).with_name("products.json")
+    if not json_path.exists():
+        raise FileNotFoundError(f"Missing {json_path}. Put products.json beside db_setup.py.")
+
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    for p in data:
+        p.setdefault("createdAt", datetime.utcnow())
+        p.setdefault("updatedAt", datetime.utcnow())
+        p.setdefault("meta_keywords", [])
+        p.setdefault("rating", empty_rating())
+        p.setdefault("slug_key", slug_key(p["slug"]))
+
+    if db.products.count_documents({}) == 0:
+        db.products.insert_many(data)
+        print(f"🛍️ Inserted {len(data)} products")
+        rebuild_counts(db.categories, db.products.aggregate(COUNT_PIPELINE))
+        print("🏷️ Category counts materialized")
+    else:
+        print("ℹ️ Products already seeded, skipping")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create collections and indexes, and seed products.json.")
+    parser.add_argument("--indexes-only", action="store_true", help="skip the products.json seed")
+    args = parser.parse_args()
+
+    db = get_db()
+    ensure_collections(db)
+    ensure_indexes(db)
+    if not args.indexes_only:
+        seed_products(db)
+    print(f"🎉 DB ready at {MONGO_URI}/{DB_NAME}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# api_server/facets.py
+"""
+Facet counts for the storefront filter sidebar (GET /products?facets=1).
+
+Counts are disjunctive, like most shop sidebars: the category counts apply
+every filter except the category one (so ticking a second category shows
+what it would add), the price buckets every filter except the price range,
+and sizes/colors all of them.
+
+With the in-memory search index the counts come from its posting sets
+(ProductSearchIndex.facet_counts); otherwise one `$facet` aggregation
+returns them, together with the requested page of items when there is one.
+"""
+from collections import Counter
+from bisect import bisect_right
+
+FACET_FIELDS = ("category", "sizes", "colors", "price")
+
+# lower edges of the price buckets (store currency); the last one is open-ended
+PRICE_EDGES = (0, 1000, 2000, 3000, 5000)
+
+
+def price_bucket(price) -> int:
+    """Index of the PRICE_EDGES bucket holding `price`."""
+    return max(0, bisect_right(PRICE_EDGES, price) - 1)
+
+
+def category_filter(categories) -> dict:
+    return {"category": {"$in": list(categories)}} if categories else {}
+
+
+def price_filter(min_price, max_price) -> dict:
+    rng = {}
+    if min_price is not None:
+        rng["$gte"] = float(min_price)
+    if max_price is not None:
+        rng["$lte"] = float(max_price)
+    return {"price": rng} if rng else {}
+
+
+def _value_counts(field: str) -> list:
+    return [
+        {"$unwind": f"${field}"},
+        {"$group": {"_id": f"${field}", "count": {"$sum": 1}}},
+    ]
+
+
+def facet_pipeline(base: dict, categories=None, min_price=None, max_price=None, page=None) -> list:
+    """
+    One aggregation for every facet. `base` is the filter shared by all of
+    them (the search query); `page` = (sort, skip, limit, projection) also
+    returns that page of items and the total.
+    """
+    by_category = category_filter(categories)
+    by_price = price_filter(min_price, max_price)
+    both = {**by_category, **by_price}
+    stages = {
+        "category": [{"$match": by_price}, {"$group": {"_id": "$category", "count": {"$sum": 1}}}],
+        "sizes": [{"$match": both}, *_value_counts("sizes")],
+        "colors": [{"$match": both}, *_value_counts("colors")],
+        "price": [
+            {"$match": by_category},
+            {"$bucket": {
+                "groupBy": "$price",
+                "boundaries": [*PRICE_EDGES, float("inf")],
+                "default": "other",
+                "output": {"count": {"$sum": 1}},
+            }},
+        ],
+    }
+    if page is not None:
+        sort, skip, limit, projection = page
+        items = [{"$match": both}, {"$sort": dict(sort)}, {"$skip": skip}, {"$limit": limit}]
+        if projection:
+            items.append({"$project": projection})
+        stages["items"] = items
+        stages["total"] = [{"$match": both}, {"$count": "n"}]
+    return [{"$match": base}, {"$facet": stages}]
+
+
+def counts_from_aggregation(result: dict) -> dict:
+    """facet_pipeline output -> the {field: Counter} shape facet_counts returns."""
+    counts = {field: Counter() for field in FACET_FIELDS}
+    for field in ("category", "sizes", "colors"):
+        for row in result.get(field, []):
+            counts[field][row["_id"]] += row["count"]
+    for row in result.get("price", []):
+        if row["_id"] != "other":
+            counts["price"][price_bucket(row["_id"])] += row["count"]
+    return counts
+
+
+def format_facets(counts: dict) -> dict:
+    """Response shape: value lists by count (then value); every price bucket, empty ones too."""
+    out = {}
+    for field in ("category", "sizes", "colors"):
+        values = [(v, n) for v, n in counts[field].items() if v not in (None, "") and n > 0]
+        values.sort(key=lambda vn: (-vn[1], str(vn[0])))
+        out[field] = [{"value": v, "count": n} for v, n in values]
+    out["price"] = [
+        {
+            "min": low,
+            "max": PRICE_EDGES[i + 1] if i + 1 < len(PRICE_EDGES) else None,
+            "count": counts["price"].get(i, 0),
+        }
+        for i, low in enumerate(PRICE_EDGES)
+    ]
+    return out
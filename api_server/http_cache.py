@@ -0,0 +1,80 @@
+# api_server/http_cache.py
+"""
+Conditional GETs for catalog reads (GET /products, /products/slug/{slug},
+/categories).
+
+The ETag is a weak hash of the encoded body, so every worker (and the
+snapshot and Mongo paths) gives the same tag for the same bytes, and any
+field change gives a new one. Cached bodies keep their tag next to them,
+so a repeat view is a cache hit plus an empty 304. Product pages read from
+Mongo or the catalog cache also send Last-Modified from updatedAt
+(createdAt for never-edited products); snapshot records carry the ETag only.
+
+Cache-Control comes from CATALOG_CACHE_CONTROL; the default lets browsers
+revalidate every time (cheap with the ETag) and a CDN serve a listing for
+s-maxage seconds, then stale for stale-while-revalidate more while it
+refetches in the background.
+"""
+import hashlib
+import os
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi.responses import Response
+
+CATALOG_CACHE_CONTROL = os.getenv(
+    "CATALOG_CACHE_CONTROL", "public, max-age=0, s-maxage=30, stale-while-revalidate=60",
+)
+
+
+def etag(body: bytes) -> str:
+    return 'W/"%s"' % hashlib.blake2b(body, digest_size=12).hexdigest()
+
+
+def last_modified(doc: dict):
+    """updatedAt, or createdAt, as a datetime; None when neither is one."""
+    for field in ("updatedAt", "createdAt"):
+        value = doc.get(field)
+        if isinstance(value, datetime):
+            return value
+    return None
+
+
+def _opaque(tag: str) -> str:
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def not_modified(request, tag: str, modified=None) -> bool:
+    """RFC 9110 revalidation: If-None-Match (weak comparison) wins over If-Modified-Since."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        wanted = _opaque(tag)
+        return any(_opaque(t.strip()) == wanted for t in if_none_match.split(","))
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return _utc(modified).replace(microsecond=0) <= since
+    return False
+
+
+def _utc(value: datetime) -> datetime:
+    # Mongo hands back naive UTC datetimes
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def cached_json_response(request, body: bytes, tag: str = None, modified=None,
+                         cache_control: str = CATALOG_CACHE_CONTROL) -> Response:
+    """`body` as JSON with validators and Cache-Control, or a 304 when the client's copy is current."""
+    headers = {"ETag": tag or etag(body), "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if modified is not None:
+        headers["Last-Modified"] = format_datetime(_utc(modified), usegmt=True)
+    if not_modified(request, headers["ETag"], modified):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,325 @@
+# api_server/indexes.py
+"""
+Every index the API and scripts rely on, declared per collection.
+
+    python scripts/db_indexes.py apply   # create what is missing
+    python scripts/db_indexes.py drift   # missing / changed / extra indexes
+    python scripts/db_indexes.py audit   # explain() each endpoint's queries
+
+Apply sends one createIndexes per collection with only the missing
+indexes, so the server builds them together in a single pass over the
+collection. Since MongoDB 4.2 every build is a hybrid build that holds an
+exclusive lock only at its start and end (the old `background` option is
+ignored), so applying on a live deployment is safe. Indexes whose options
+changed and indexes nobody declares are reported (drift), never dropped.
+
+QUERY_SHAPES are the queries the endpoints send, built with the same
+helpers main.py uses. The audit fails any shape whose winning plan scans a
+collection, unless the shape says why it may (`scan_ok`).
+"""
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+
+from category_counts import CATEGORY_PROJECTION
+from facets import category_filter, facet_pipeline, price_filter
+from pagination import PRODUCT_SORTS, seek_filter, sort_spec
+
+INDEXES = {
+    "products": [
+        IndexModel("slug", unique=True),
+        # case-insensitive slug lookups (GET /products/slug/{slug}); backfill older
+        # documents first with scripts/backfill_slug_key.py
+        IndexModel("slug_key", unique=True, partialFilterExpression={"slug_key": {"$exists": True}}),
+        # keyset pagination: (sort key, _id) so GET /products?cursor= can seek instead of
+        # skip; the category/price prefixes also serve the plain filters
+        IndexModel([("price", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("createdAt", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("category", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("category", ASCENDING), ("price", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("category", ASCENDING), ("createdAt", DESCENDING), ("_id", DESCENDING)]),
+        # keyword lookups for admin tooling
+        IndexModel([("meta_keywords", TEXT)], default_language="none"),
+    ],
+    "categories": [
+        # exact name (count upserts) and name_key (duplicate checks)
+        IndexModel("name"),
+        IndexModel("name_key"),
+    ],
+    "reviews": [
+        # per-product pages, newest first
+        IndexModel([("product_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ],
+    "carts": [
+        # one cart per user; also makes racing cart upserts safe
+        IndexModel("user_id", unique=True),
+    ],
+    "orders": [
+        # newest-first listings, optionally filtered by status or user
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        # retries with the same Idempotency-Key collide here instead of creating a second order
+        IndexModel(
+            [("user_id", ASCENDING), ("idempotency_key", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"idempotency_key": {"$exists": True}},
+        ),
+    ],
+    "customers": [
+        # one per normalized email (stat upserts from place_order), plus the admin listing sorts
+        IndexModel("email_key", unique=True, partialFilterExpression={"email_key": {"$exists": True}}),
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("last_order_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("lifetime_value", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("total_orders", DESCENDING), ("_id", DESCENDING)]),
+    ],
+    "ai_jobs": [
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING)]),
+        # GET /ai/jobs lists every job newest first
+        IndexModel([("created_at", DESCENDING)]),
+    ],
+    "ai_job_items": [
+        IndexModel([("job_id", ASCENDING), ("product_id", ASCENDING)], unique=True),
+        IndexModel([("job_id", ASCENDING), ("status", ASCENDING)]),
+    ],
+    "ai_enhance_cache": [
+        IndexModel("expires_at", expireAfterSeconds=0),
+        IndexModel("used_at"),
+    ],
+}
+
+# options that change what an index enforces or serves
+COMPARED_OPTIONS = ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds", "collation",
+                    "default_language", "weights")
+
+
+def is_constraint(model: IndexModel) -> bool:
+    """Unique and TTL indexes: the API is wrong without them, not just slow."""
+    return bool(model.document.get("unique")) or "expireAfterSeconds" in model.document
+
+
+def _selected(collections=None):
+    for name, models in INDEXES.items():
+        if collections is None or name in collections:
+            yield name, models
+
+
+def _normalized(doc: dict) -> dict:
+    key = list(doc["key"].items())
+    spec = {o: doc[o] for o in COMPARED_OPTIONS if o in doc}
+    text_fields = [field for field, kind in key if kind == TEXT]
+    if text_fields:
+        # the server stores text indexes as _fts/_ftsx plus per-field weights
+        key = [(f, k) for f, k in key if k != TEXT and f not in ("_fts", "_ftsx")] + [("_fts", TEXT), ("_ftsx", 1)]
+        spec.setdefault("weights", {field: 1 for field in text_fields})
+    if "weights" in spec:
+        spec["weights"] = dict(spec["weights"])
+    return {"key": key, **spec}
+
+
+def diff_indexes(models, existing) -> dict:
+    """Compares declared IndexModels with list_indexes() output, by index name."""
+    actual = {doc["name"]: doc for doc in existing if doc["name"] != "_id_"}
+    declared = {m.document["name"]: m for m in models}
+    missing, changed = [], []
+    for name, model in declared.items():
+        doc = actual.get(name)
+        if doc is None:
+            missing.append(model)
+        elif _normalized(model.document) != _normalized(doc):
+            changed.append({"name": name, "declared": _normalized(model.document), "actual": _normalized(doc)})
+    extra = []
+    for name, doc in actual.items():
+        if name in declared:
+            continue
+        key = list(doc["key"].items())
+        # a plain index whose keys prefix a declared one only costs writes
+        covered_by = next(
+            (n for n, m in declared.items() if len(m.document["key"]) > len(key)
+             and list(m.document["key"].items())[:len(key)] == key and not _normalized(doc).keys() - {"key"}),
+            None,
+        )
+        extra.append({"name": name, "redundant_with": covered_by})
+    return {"missing": missing, "changed": changed, "extra": extra}
+
+
+def _report(name, diff, created, log):
+    if created:
+        log(f"🗂️ {name}: created {', '.join(created)}")
+    for c in diff["changed"]:
+        log(f"⚠️ {name}.{c['name']} differs from the registry (see scripts/db_indexes.py drift)")
+
+
+def apply_indexes(db, collections=None, constraints_only=False, log=print) -> dict:
+    """Creates the missing declared indexes (pymongo); returns {collection: diff before applying}."""
+    report = {}
+    for name, models in _selected(collections):
+        col = db[name]
+        diff = diff_indexes(models, col.list_indexes())
+        wanted = [m for m in diff["missing"] if not constraints_only or is_constraint(m)]
+        created = col.create_indexes(wanted) if wanted else []
+        _report(name, diff, created, log)
+        report[name] = diff
+    return report
+
+
+async def apply_indexes_async(db, collections=None, constraints_only=False, log=print) -> dict:
+    """apply_indexes() through Motor."""
+    report = {}
+    for name, models in _selected(collections):
+        col = db[name]
+        diff = diff_indexes(models, await col.list_indexes().to_list(length=None))
+        wanted = [m for m in diff["missing"] if not constraints_only or is_constraint(m)]
+        created = await col.create_indexes(wanted) if wanted else []
+        _report(name, diff, created, log)
+        report[name] = diff
+    return report
+
+
+def index_drift(db, collections=None) -> dict:
+    """{collection: diff} for collections whose indexes differ from the registry."""
+    drift = {}
+    for name, models in _selected(collections):
+        diff = diff_indexes(models, db[name].list_indexes())
+        if diff["missing"] or diff["changed"] or diff["extra"]:
+            drift[name] = diff
+    return drift
+
+
+# --- Query-plan audit
+
+_SAMPLE_ID = ObjectId("000000000000000000000000")
+_SAMPLE_TIME = datetime(2024, 1, 1)
+
+
+def _product_listing(sort, categories=None, min_price=None, max_price=None, after=False):
+    field, direction = PRODUCT_SORTS[sort]
+    query = {**category_filter(categories), **price_filter(min_price, max_price)}
+    if after:
+        value = {"_id": None, "createdAt": _SAMPLE_TIME, "price": 1500.0}[field]
+        seek = seek_filter(field, direction, value, _SAMPLE_ID)
+        query = {"$and": [query, seek]} if query else seek
+    label = "GET /products " + " ".join(filter(None, [
+        f"sort={sort}", categories and "categories", (min_price or max_price) and "price", after and "cursor",
+    ]))
+    return {"endpoint": label, "collection": "products", "filter": query,
+            "sort": sort_spec(field, direction), "limit": 120}
+
+
+QUERY_SHAPES = [
+    *(_product_listing(sort) for sort in PRODUCT_SORTS),
+    *(_product_listing(sort, categories=["Graphic"]) for sort in PRODUCT_SORTS),
+    *(_product_listing(sort, categories=["Graphic", "Plain"], after=True) for sort in PRODUCT_SORTS),
+    *(_product_listing(sort, min_price=1000, max_price=2000) for sort in ("price_asc", "price_desc")),
+    _product_listing("newest", after=True),
+    {"endpoint": "GET /products?facets=1", "collection": "products",
+     "pipeline": facet_pipeline({}, ["Graphic"], 1000, 2000),
+     "scan_ok": "facet counts cover the whole catalog and are cached until the next product write"},
+    {"endpoint": "GET /products/slug/{slug}", "collection": "products", "filter": {"slug_key": "tee"}},
+    {"endpoint": "GET /products/slug/{slug} (legacy)", "collection": "products", "filter": {"slug": "tee"}},
+    {"endpoint": "GET /reviews/{product_id}", "collection": "reviews", "filter": {"product_id": str(_SAMPLE_ID)},
+     "sort": sort_spec("created_at", -1), "limit": 20},
+    {"endpoint": "GET /cart/{user_id}", "collection": "carts", "filter": {"user_id": "user"}},
+    {"endpoint": "GET /categories", "collection": "categories", "filter": {}, "projection": CATEGORY_PROJECTION,
+     "scan_ok": "returns every category"},
+    {"endpoint": "POST /categories", "collection": "categories", "filter": {"name_key": "graphic"}},
+    {"endpoint": "product writes (category counts)", "collection": "categories", "filter": {"name": "Graphic"}},
+    {"endpoint": "GET /orders/{user_id}", "collection": "orders", "filter": {"user_id": "user"},
+     "sort": sort_spec("created_at", -1), "limit": 50},
+    {"endpoint": "GET /orders/{user_id}?status=", "collection": "orders",
+     "filter": {"status": "Pending", "user_id": "user"}, "sort": sort_spec("created_at", -1), "limit": 50},
+    {"endpoint": "GET /admin/orders", "collection": "orders", "filter": {},
+     "sort": sort_spec("created_at", -1), "limit": 50},
+    {"endpoint": "GET /admin/orders?status=", "collection": "orders", "filter": {"status": "Pending"},
+     "sort": sort_spec("created_at", -1), "limit": 50},
+    {"endpoint": "GET /admin/orders?date_from=", "collection": "orders",
+     "filter": {"created_at": {"$gte": _SAMPLE_TIME}}, "sort": sort_spec("created_at", -1), "limit": 50},
+    {"endpoint": "POST /orders/{user_id} (Idempotency-Key)", "collection": "orders",
+     "filter": {"user_id": "user", "idempotency_key": "key"}},
+    *({"endpoint": f"GET /customers sort={field}", "collection": "customers", "filter": {},
+       "sort": sort_spec(field, -1), "limit": 100}
+      for field in ("created_at", "last_order_at", "lifetime_value", "total_orders")),
+    {"endpoint": "GET /customers?q=", "collection": "customers", "filter": {"email_key": {"$regex": "^ann"}},
+     "sort": sort_spec("created_at", -1), "limit": 100},
+    {"endpoint": "place order (customer stats)", "collection": "customers", "filter": {"email_key": "ann@example.com"}},
+    {"endpoint": "GET /ai/jobs", "collection": "ai_jobs", "filter": {}, "sort": [("created_at", -1)], "limit": 50},
+    {"endpoint": "startup (resume AI jobs)", "collection": "ai_jobs",
+     "filter": {"status": {"$in": ["queued", "running"]}}},
+    {"endpoint": "AI job worker", "collection": "ai_job_items", "filter": {"job_id": _SAMPLE_ID, "status": "pending"},
+     "limit": 100},
+    {"endpoint": "AI cache eviction", "collection": "ai_enhance_cache", "filter": {}, "sort": [("used_at", 1)],
+     "limit": 100},
+]
+
+
+def _stages(plan) -> list:
+    """Every stage name in a (possibly branching) plan tree."""
+    if isinstance(plan, list):
+        return [s for p in plan for s in _stages(p)]
+    if not isinstance(plan, dict):
+        return []
+    found = [plan["stage"]] if "stage" in plan else []
+    for key, value in plan.items():
+        if key != "rejectedPlans":
+            found.extend(_stages(value))
+    return found
+
+
+def _winning_plans(explain) -> list:
+    """Winning plans of a find explain, or of each $cursor stage of an aggregate explain."""
+    if isinstance(explain, dict):
+        if "winningPlan" in explain:
+            return [explain["winningPlan"]]
+        return [p for v in explain.values() for p in _winning_plans(v)]
+    if isinstance(explain, list):
+        return [p for v in explain for p in _winning_plans(v)]
+    return []
+
+
+def explain_shape(db, shape: dict) -> dict:
+    if "pipeline" in shape:
+        command = {"aggregate": shape["collection"], "pipeline": shape["pipeline"], "cursor": {}}
+    else:
+        command = {"find": shape["collection"], "filter": shape["filter"]}
+        for key in ("sort", "limit", "projection"):
+            if key in shape:
+                command[key] = dict(shape[key]) if key == "sort" else shape[key]
+    return db.command({"explain": command, "verbosity": "queryPlanner"})
+
+
+def audit_queries(db, shapes=QUERY_SHAPES) -> list:
+    """
+    Explains every shape; returns one result per shape with its plan stages
+    and `status`: ok, scan (a COLLSCAN not excused by scan_ok), allowed,
+    skipped (no such collection) or error. An in-memory SORT is reported but
+    does not fail the audit.
+    """
+    results = []
+    for shape in shapes:
+        result = {"endpoint": shape["endpoint"], "collection": shape["collection"]}
+        try:
+            plans = _winning_plans(explain_shape(db, shape))
+        except OperationFailure as e:
+            results.append({**result, "status": "error", "error": str(e)})
+            continue
+        stages = [s for plan in plans for s in _stages(plan)]
+        result["stages"] = stages
+        result["blocking_sort"] = "SORT" in stages
+        if not plans:
+            # aggregations that never read a collection, or an explain format we do not know
+            result["status"] = "error"
+            result["error"] = "no winning plan in explain output"
+        elif set(stages) == {"EOF"}:
+            result["status"] = "skipped"
+            result["error"] = "collection does not exist"
+        elif "COLLSCAN" in stages:
+            result["status"] = "allowed" if shape.get("scan_ok") else "scan"
+            if shape.get("scan_ok"):
+                result["reason"] = shape["scan_ok"]
+        else:
+            result["status"] = "ok"
+        results.append(result)
+    return results
@@ -1,47 +1,98 @@
 # main.py — top section (replace the imports + env loading block)
 import os
+import re
 import json
+import asyncio
+import io
+import tempfile
 from datetime import datetime
 from typing import Optional, List
 
 from dotenv import load_dotenv
-from fastapi import FastAPI, Query, Body, HTTPException
+from fastapi import FastAPI, Query, Body, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from bson import ObjectId
-from pymongo import MongoClient
-from groq import Groq
-from dotenv import load_dotenv
-load_dotenv()   # ✅ FIRST
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
-import stripe
-import os
+# .env (dev) is loaded once, before any module reads its settings
+load_dotenv()
 
-stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:8000")
 
-if not stripe.api_key:
+if not os.getenv("STRIPE_SECRET_KEY"):
     print("❌ STRIPE_SECRET_KEY is missing")
 
 # your local models
 from models import Product, Review  # adjust if unused
-
-# load .env (dev)
-load_dotenv()
+from search_index import ProductSearchIndex, INDEX_FIELDS
+from related_index import DIMS as RELATED_DIMS, K as RELATED_K, RelatedProductsIndex
+from pagination import PRODUCT_SORTS, cursor_for, decode_cursor, encode_cursor, seek_filter, sort_spec
+from cache import TTLCache
+from catalog_cache import CatalogCache, ListingFilter
+from slugs import SlugMap, slug_key
+from order_export import EXPORT_FORMATS, stream_orders
+from db import DB_NAME, PoolStats, client_options, collection, get_async_client, primary
+from indexes import apply_indexes_async
+from catalog_snapshot import SnapshotStore, build_snapshot, categories_body
+from category_counts import (
+    CATEGORY_PROJECTION, COUNT_PIPELINE, category_key, count_changes, count_reset_op, rebuild_ops,
+)
+from ai_enhance import EnhanceError, get_provider
+from ai_jobs import AIJobRunner, job_summary
+from ai_cache import EnhanceCache
+from facets import category_filter, counts_from_aggregation, facet_pipeline, format_facets, price_bucket, price_filter
+from projections import ORDER_PRESETS, PRODUCT_PRESETS, apply_projection, projection_for
+from responses import MongoJSONResponse, dumps
+from http_cache import cached_json_response, etag, last_modified
+from compression import CompressionMiddleware
+from product_io import EXPORT_PROJECTION, FORMATS as PRODUCT_IO_FORMATS, import_batches, run_import_async, stream_products
+from order_pricing import PriceBook, PricingError, line_ref, price_lines
+from metrics import MetricsMiddleware, MongoCommandMetrics, SlowQueryLog, metrics_response, register_pool_stats
+from payments import FxRates, StripeClient, StripeError, StripePriceCache, to_minor_units
+from review_stats import (
+    RATED_FILTER, RATING_PIPELINE, RATING_REBUILD_BATCH, empty_rating, rating_change, rating_rebuild_ops,
+    rating_reset_op, rating_summaries, review_rating,
+)
+from customer_stats import (
+    KEY_BACKFILL, REBUILD_BATCH, STATS_PIPELINE, customer_key, order_removal, order_update, rebuild_op, reset_op,
+)
 
 # Read the GROQ key correctly from environment
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 if not GROQ_API_KEY:
     print("WARNING: GROQ_API_KEY not found in environment. Set it in .env or system env to enable /ai/enhance.")
 
-# --- Setup Mongo connection
-mongo_client = MongoClient("mongodb://localhost:27017")
-db = mongo_client["TEE-TRIBE"]
-products_col = db["products"]
-reviews_col = db["reviews"]
-carts_col = db["carts"]
-categories_col = db["categories"]
-customers_col = db["customers"]
-orders_col = db["orders"]
+# --- Metrics (GET /metrics) and the slow Mongo command log (GET /admin/slow-queries)
+# METRICS_ENABLED=0 drops the request middleware and the command listener.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+# MONGO_SLOW_EXPLAIN: queryPlanner | executionStats (re-runs the query) | off
+MONGO_SLOW_EXPLAIN = os.getenv("MONGO_SLOW_EXPLAIN", "queryPlanner")
+slow_query_log = SlowQueryLog(
+    threshold_ms=float(os.getenv("MONGO_SLOW_MS", "100")),
+    size=int(os.getenv("SLOW_QUERY_LOG_SIZE", "200")),
+    verbosity=None if MONGO_SLOW_EXPLAIN == "off" else MONGO_SLOW_EXPLAIN,
+    explain_interval=float(os.getenv("MONGO_SLOW_EXPLAIN_INTERVAL", "600")),
+)
+mongo_metrics = MongoCommandMetrics(slow_query_log)
+
+# --- Setup Mongo connection (shared client from db.py; pool, timeouts and
+# per-group read/write concerns come from the MONGO_* env, see db.py)
+pool_stats = PoolStats()
+mongo_client = get_async_client(event_listeners=[pool_stats, mongo_metrics] if METRICS_ENABLED else [pool_stats])
+db = mongo_client[DB_NAME]
+products_col = collection(db, "products")
+reviews_col = collection(db, "reviews")
+carts_col = collection(db, "carts")
+categories_col = collection(db, "categories")
+customers_col = collection(db, "customers")
+orders_col = collection(db, "orders")
+# catalog reads may go to secondaries; reads that feed writes or caches
+# (listings, counts, facets, product pages, prices, snapshot, repairs,
+# uniqueness checks) stay on the primary, so a lagging secondary cannot
+# refill a cache with what a write just invalidated
+products_primary = primary(products_col)
 
 app = FastAPI(title="Swift Tribe Shop API")
 
@@ -62,172 +113,373 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# brotli/gzip above COMPRESSION_MIN_SIZE bytes; COMPRESSION_MIN_SIZE=0 turns it off
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+if COMPRESSION_MIN_SIZE > 0:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=COMPRESSION_MIN_SIZE,
+        gzip_level=int(os.getenv("GZIP_LEVEL", "6")),
+        brotli_quality=int(os.getenv("BROTLI_QUALITY", "4")),
+    )
+
+# added last so it wraps everything else, CORS included
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    register_pool_stats(pool_stats, client_options()["maxPoolSize"])
+
+# MONGO_WARMUP_CONNECTIONS opens that many pooled connections before the
+# worker takes traffic (the driver otherwise opens them on first use).
+MONGO_WARMUP_CONNECTIONS = int(os.getenv("MONGO_WARMUP_CONNECTIONS", "1"))
+
+
+@app.on_event("startup")
+async def warm_mongo():
+    try:
+        await asyncio.gather(*(db.command("ping") for _ in range(max(1, MONGO_WARMUP_CONNECTIONS))))
+    except Exception as e:
+        print("❌ Mongo not reachable at startup:", e)
+
+
+@app.on_event("startup")
+async def attach_slow_query_log():
+    slow_query_log.attach(mongo_client, asyncio.get_running_loop())
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return metrics_response()
+
+
+@app.get("/admin/db/pool")
+def db_pool():
+    """Connections per server (open, in use, waiting for one) and the pool settings they run against."""
+    options = client_options()
+    return {
+        "settings": {k: options[k] for k in ("maxPoolSize", "minPoolSize", "maxConnecting", "waitQueueTimeoutMS")},
+        "servers": pool_stats.snapshot(),
+    }
+
+
+@app.get("/admin/slow-queries")
+def slow_queries(limit: int = Query(50, ge=1, le=500)):
+    """Newest first: command, collection, ms, filter shape and explain() plan summary."""
+    return MongoJSONResponse({
+        "threshold_ms": slow_query_log.threshold_ms,
+        "explain": slow_query_log.verbosity,
+        "entries": slow_query_log.recent(limit),
+    })
+
+
 def serialize(doc):
     """Converts MongoDB document to a JSON-safe dictionary."""
     doc["_id"] = str(doc.get("_id"))
     return doc
 
 
-from fastapi import status
+# --- In-memory catalog views: search index (GET /products?q=), slug map and
+# related-products index (GET /products/{id}/related)
+# Set SEARCH_BACKEND=regex to fall back to the old Mongo $regex scan, and
+# RELATED_INDEX=0 to skip the related index (~1 KB per product at 256 dims).
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "index")
+RELATED_INDEX = os.getenv("RELATED_INDEX", "1") == "1"
+RELATED_INDEX_DIMS = int(os.getenv("RELATED_DIMS", str(RELATED_DIMS)))
+# catalogs up to this size are scanned on the event loop (~1 ms); the
+# thread hop costs more than that when the loop is busy
+RELATED_INLINE_SCAN = int(os.getenv("RELATED_INLINE_SCAN", "20000"))
+search_index = ProductSearchIndex()
+related_index = RelatedProductsIndex(dims=RELATED_INDEX_DIMS)
+slug_map = SlugMap()
 
-@app.post("/ai/enhance")
-def ai_enhance_debug(payload: dict = Body(...)):
+
+# --- Catalog snapshot (see catalog_snapshot.py)
+# CATALOG_SNAPSHOT=/path/catalog.snap serves GET /products (without q),
+# GET /products/slug/{slug} and GET /categories from a memory-mapped file
+# instead of Mongo; reads lag writes by the rebuild debounce. A process
+# with CATALOG_SNAPSHOT_REBUILD=1 rebuilds the file after the catalog
+# writes it sees; with several workers keep that to one of them (or run
+# scripts/build_catalog_snapshot.py --every N) and let the rest follow
+# the file.
+CATALOG_SNAPSHOT = os.getenv("CATALOG_SNAPSHOT", "")
+CATALOG_SNAPSHOT_REBUILD = os.getenv("CATALOG_SNAPSHOT_REBUILD", "1") == "1"
+
+
+async def snapshot_swapped(snapshot):
+    catalog_cache.clear()
+    await build_catalog_views()
+
+
+snapshot_store = SnapshotStore(
+    CATALOG_SNAPSHOT,
+    poll=float(os.getenv("CATALOG_SNAPSHOT_POLL", "1")),
+    debounce=float(os.getenv("CATALOG_SNAPSHOT_DEBOUNCE", "2")),
+    on_swap=snapshot_swapped,
+) if CATALOG_SNAPSHOT else None
+
+
+def catalog_snapshot():
+    """The mapped snapshot, or None when reads go to Mongo."""
+    return snapshot_store.current if snapshot_store is not None else None
+
+
+async def write_catalog_snapshot(path):
+    return await build_snapshot(products_primary, primary(categories_col), path)
+
+
+def catalog_changed():
+    """Queues a snapshot rebuild after a catalog write (no-op without CATALOG_SNAPSHOT)."""
+    if snapshot_store is not None and CATALOG_SNAPSHOT_REBUILD:
+        snapshot_store.schedule_rebuild(write_catalog_snapshot)
+
+
+@app.on_event("startup")
+async def open_catalog_snapshot():
+    if snapshot_store is None:
+        return
+    # build_catalog_views (the next startup hook) builds from whatever is mapped here
+    try:
+        loaded = await snapshot_store.refresh(notify=False)
+        if not loaded and CATALOG_SNAPSHOT_REBUILD:
+            writer = await write_catalog_snapshot(snapshot_store.path)
+            print(f"🗂️ Catalog snapshot written: {len(writer)} products")
+            await snapshot_store.refresh(notify=False)
+    except Exception as e:
+        print("❌ Catalog snapshot unavailable, serving from Mongo until it appears:", e)
+    app.state.snapshot_watch = asyncio.create_task(snapshot_store.watch())
+
+
+@app.on_event("shutdown")
+async def close_mongo():
+    await ai_job_runner.shutdown()
+    await stripe_client.close()
+    for name in ("change_stream", "snapshot_watch"):
+        task = getattr(app.state, name, None)
+        if task is not None:
+            task.cancel()
+    if snapshot_store is not None:
+        snapshot_store.close()
+    mongo_client.close()
+
+
+@app.on_event("startup")
+async def build_catalog_views(use_snapshot: bool = True):
     """
-    AI enhance route (dev). Uses GROQ_MODEL env or falls back to openai/gpt-oss-20b.
+    Slug map, search index and related index, from the snapshot when one
+    is mapped (no Mongo reads at startup) and from products_col otherwise.
+    The new indexes are built aside and swapped in, so reads keep working
+    meanwhile.
     """
-    try:
-        # Basic validation
-        if not payload.get("name"):
-            raise ValueError("Missing 'name' in payload")
-
-        groq_key = os.getenv("GROQ_API_KEY")
-        if not groq_key:
-            raise RuntimeError("GROQ_API_KEY not set in environment")
-
-        groq_model = os.getenv("GROQ_MODEL", "openai/gpt-oss-20b")  # recommended fallback
-
-        # Create Groq client
-        groq_client = Groq(api_key=groq_key)
-
-        # Prompt (keep short; model must return strict JSON)
-        prompt = f"""
-You are an e-commerce SEO expert.
-Return ONLY JSON with two fields:
-{{"enhanced_description":"...", "meta_keywords":["...","..."]}}
-
-Product:
-Name: {payload.get("name")}
-Category: {payload.get("category")}
-Description: {payload.get("description")}
-Price: {payload.get("price")}
-Sizes: {payload.get("sizes")}
-Colors: {payload.get("colors")}
-
-Rules:
-- enhanced_description: 120-200 words
-- meta_keywords: 10-15 long-tail keywords
-- DO NOT output anything outside the JSON object
-"""
-
-        # Call Groq safely and handle model errors
+    global search_index, related_index
+    snapshot = catalog_snapshot() if use_snapshot else None
+    if snapshot is not None:
+        docs = await asyncio.to_thread(list, snapshot.documents())
+    else:
+        docs = await products_primary.find({}, {**INDEX_FIELDS, "slug": 1}).to_list(length=None)
+    slug_map.rebuild(docs)
+    print(f"🔗 Slug map built for {len(slug_map)} products")
+    if SEARCH_BACKEND == "index":
+        index = ProductSearchIndex()
+        await asyncio.to_thread(index.rebuild, docs)
+        search_index = index
+        print(f"🔎 Search index built for {len(search_index)} products")
+    if RELATED_INDEX:
+        related = RelatedProductsIndex(dims=RELATED_INDEX_DIMS)
+        await asyncio.to_thread(related.rebuild, docs)
+        related_index = related
+        print(f"🧭 Related-products index built for {len(related_index)} products")
+
+
+def regex_search_query(q: str):
+    """Legacy search filter: unanchored case-insensitive regex over every text field."""
+    pattern = re.escape(q)
+    return [
+        {"name": {"$regex": pattern, "$options": "i"}},
+        {"description": {"$regex": pattern, "$options": "i"}},
+        {"category": {"$regex": pattern, "$options": "i"}},
+        {"meta_keywords": {"$elemMatch": {"$regex": pattern, "$options": "i"}}},
+    ]
+
+
+async def find_by_ids(ids, projection=None):
+    """Fetches products by string _id, preserving the order of `ids`."""
+    if not ids:
+        return []
+    found = products_primary.find({"_id": {"$in": [ObjectId(i) for i in ids]}}, projection)
+    docs = {str(d["_id"]): d async for d in found}
+    return [docs[i] for i in ids if i in docs]
+
+
+# --- Catalog read cache (GET /products, GET /products/slug/{slug})
+catalog_cache = CatalogCache(
+    maxsize=int(os.getenv("CATALOG_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("CATALOG_CACHE_TTL", "60")),
+)
+# product prices for order placement (see order_pricing.py)
+price_book = PriceBook(
+    maxsize=int(os.getenv("PRICE_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("PRICE_CACHE_TTL", "300")),
+)
+
+
+def apply_product_change(before, after):
+    """
+    Brings every in-process view of the catalog up to date after a product
+    write. `before`/`after` are None for inserts/deletes respectively.
+    """
+    if after is not None:
+        search_index.upsert(after)
+        slug_map.upsert(after)
+        if RELATED_INDEX:
+            related_index.upsert(after)
+    elif before is not None:
+        search_index.remove(before["_id"])
+        slug_map.remove(before["_id"])
+        related_index.remove(before["_id"])
+    product_counts.clear()
+    catalog_cache.invalidate(before, after)
+    price_book.invalidate(before)
+    price_book.invalidate(after)
+    catalog_changed()
+
+
+# With several uvicorn workers each one holds its own caches; set
+# CATALOG_CHANGE_STREAM=1 (replica set required) so every worker also applies
+# the writes made by the others. Without pre-images (MongoDB 6+, enabled on
+# the collection) updates and deletes flush every cached listing.
+CATALOG_CHANGE_STREAM = os.getenv("CATALOG_CHANGE_STREAM", "0") == "1"
+CATALOG_CHANGE_STREAM_PREIMAGES = os.getenv("CATALOG_CHANGE_STREAM_PREIMAGES", "0") == "1"
+
+
+async def watch_product_changes():
+    options = {"full_document": "updateLookup"}
+    if CATALOG_CHANGE_STREAM_PREIMAGES:
+        options["full_document_before_change"] = "whenAvailable"
+    while True:
         try:
-            chat = groq_client.chat.completions.create(
-                model=groq_model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.7,
-                max_tokens=700,
-            )
+            async with products_col.watch(**options) as stream:
+                print("👀 Watching products change stream")
+                async for change in stream:
+                    op = change["operationType"]
+                    before = change.get("fullDocumentBeforeChange")
+                    after = change.get("fullDocument")
+                    if op in ("insert", "update", "replace") and after is not None:
+                        apply_product_change(before, after)
+                    elif op == "delete":
+                        apply_product_change(before or {"_id": change["documentKey"]["_id"]}, None)
+                    elif op in ("drop", "rename", "invalidate"):
+                        catalog_cache.clear()
+                        price_book.clear()
+                        catalog_changed()
+                        await build_catalog_views(use_snapshot=False)
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
-            # Log server side and return friendly error to client
-            import traceback
-            traceback.print_exc()
-            raise HTTPException(status_code=400, detail=f"Groq model error: {str(e)}. Check GROQ_MODEL and GROQ_API_KEY.")
-
-        # Extract raw text
-        raw = getattr(chat.choices[0].message, "content", "") or ""
-        json_start = raw.find("{")
-        if json_start == -1:
-            raise HTTPException(status_code=500, detail=f"AI did not return JSON. Raw start: {raw[:300]}")
-
-        raw_json = raw[json_start:]
-        try:
-            parsed = json.loads(raw_json)
-        except Exception:
-            # try trimming trailing garbage
-            last = raw_json.rfind("}")
-            if last == -1:
-                raise HTTPException(status_code=500, detail="Failed to parse AI JSON output")
-            parsed = json.loads(raw_json[: last + 1])
+            print("❌ Product change stream failed, retrying in 5s:", e)
+            await asyncio.sleep(5)
 
-        if "enhanced_description" not in parsed or "meta_keywords" not in parsed:
-            raise HTTPException(status_code=500, detail=f"AI JSON missing required fields. Parsed keys: {list(parsed.keys())}")
 
-        return parsed
+@app.on_event("startup")
+async def start_change_stream():
+    if CATALOG_CHANGE_STREAM:
+        app.state.change_stream = asyncio.create_task(watch_product_changes())
+
+
+@app.get("/admin/cache/stats")
+def cache_stats():
+    return {
+        "catalog": catalog_cache.stats(),
+        "counts": product_counts.stats(),
+        "ai_enhance": enhance_cache.stats(),
+        "snapshot": snapshot_store.stats() if snapshot_store is not None else None,
+    }
+
+
+# --- AI enhancement (single product, and bulk background jobs)
+ai_job_runner = AIJobRunner(db, products_primary, on_product_update=apply_product_change)
+# repeat enhancements of unchanged products are served from here
+enhance_cache = EnhanceCache(
+    collection(db, "ai_enhance_cache"),
+    ttl=float(os.getenv("AI_CACHE_TTL", str(30 * 24 * 3600))),
+    max_entries=int(os.getenv("AI_CACHE_MAX_ENTRIES", "10000")),
+    memory_size=int(os.getenv("AI_CACHE_MEMORY_SIZE", "512")),
+)
+
+
+# Indexes are declared in indexes.py and applied on deploy with
+# `python scripts/db_indexes.py apply`. Workers only make sure the unique and
+# TTL ones exist (correctness, not speed); MONGO_ENSURE_INDEXES=0 skips that.
+MONGO_ENSURE_INDEXES = os.getenv("MONGO_ENSURE_INDEXES", "1") == "1"
+
+
+@app.on_event("startup")
+async def ensure_indexes():
+    if MONGO_ENSURE_INDEXES:
+        await apply_indexes_async(db, constraints_only=True)
+
+
+@app.on_event("startup")
+async def resume_ai_jobs():
+    resumed = await ai_job_runner.resume()
+    if resumed:
+        print(f"🤖 Resumed {resumed} AI enhancement job(s)")
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
 
 @app.post("/ai/enhance")
-def ai_enhance_debug(payload: dict = Body(...)):
-    import traceback
+async def ai_enhance(payload: dict = Body(...)):
+    """
+    Enhanced description and meta keywords for one product (admin edit form).
+    Provider from AI_PROVIDER (groq by default, GROQ_MODEL / openai/gpt-oss-20b).
+    `cached` is true when the result was reused for identical product fields.
+    """
+    if not payload.get("name"):
+        raise HTTPException(status_code=400, detail="Missing 'name' in payload")
     try:
-        if not payload.get("name"):
-            raise ValueError("Missing 'name' in payload")
-
-        groq_key = os.getenv("GROQ_API_KEY")
-        if not groq_key:
-            raise RuntimeError("GROQ_API_KEY not set in environment")
-
-        groq_model = os.getenv("GROQ_MODEL", "openai/gpt-oss-20b")
-        client = Groq(api_key=groq_key)
-
-        prompt = f"""
-You are an e-commerce SEO expert.
-Return ONLY JSON:
-{{"enhanced_description":"...","meta_keywords":["..."]}}
-Product:
-Name: {payload.get("name")}
-Category: {payload.get("category")}
-Description: {payload.get("description")}
-Price: {payload.get("price")}
-Sizes: {payload.get("sizes")}
-Colors: {payload.get("colors")}
-Rules: enhanced_description 120-200 words; meta_keywords 10-15 phrases.
-"""
+        result, cached = await enhance_cache.enhance(get_provider(), payload)
+        return {**result, "cached": cached}
+    except EnhanceError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
 
-        try:
-            resp = client.chat.completions.create(
-                model=groq_model,
-                messages=[{"role":"user","content":prompt}],
-                temperature=0.7,
-                max_tokens=700,
-            )
-        except Exception as e:
-            # print full trace to console and include any response body if available
-            traceback.print_exc()
-            extra = ""
-            try:
-                if hasattr(e, "response") and getattr(e.response, "text", None):
-                    extra = f" | response_text: {e.response.text}"
-            except Exception:
-                pass
-            raise HTTPException(status_code=500, detail=f"Groq call failed: {str(e)}{extra}")
-
-        # extract message content
-        raw = ""
-        try:
-            raw = getattr(resp.choices[0].message, "content", "") or ""
-        except Exception:
-            raw = str(resp)
 
-        # ensure JSON substring
-        i = raw.find("{")
-        if i == -1:
-            raise HTTPException(status_code=500, detail=f"AI returned no JSON. Raw start: {raw[:300]}")
+@app.post("/ai/jobs")
+async def create_ai_job(payload: dict = Body(...)):
+    """
+    Body: {"product_ids": [...]} or {"missing_meta_keywords": true}, plus
+    optional "provider" and "overwrite_description" (default: results go to
+    `enhanced_description`/`meta_keywords` and the description is kept).
+    """
+    try:
+        job = await ai_job_runner.submit(
+            product_ids=payload.get("product_ids"),
+            missing_meta_keywords=bool(payload.get("missing_meta_keywords")),
+            provider=payload.get("provider"),
+            overwrite_description=bool(payload.get("overwrite_description")),
+        )
+    except EnhanceError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    return job_summary(job)
 
-        raw_json = raw[i:]
-        try:
-            parsed = json.loads(raw_json)
-        except Exception:
-            last = raw_json.rfind("}")
-            if last == -1:
-                raise HTTPException(status_code=500, detail="Failed to parse AI JSON output")
-            parsed = json.loads(raw_json[: last + 1])
 
-        if "enhanced_description" not in parsed or "meta_keywords" not in parsed:
-            raise HTTPException(status_code=500, detail=f"AI JSON missing keys. Keys: {list(parsed.keys())}")
+@app.get("/ai/jobs")
+async def list_ai_jobs(limit: int = Query(20, ge=1, le=100)):
+    return [job_summary(j) for j in await ai_job_runner.list(limit)]
 
-        return parsed
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
+@app.get("/ai/jobs/{job_id}")
+async def get_ai_job(job_id: str):
+    job = await ai_job_runner.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_summary(job)
+
+
+@app.post("/ai/jobs/{job_id}/cancel")
+async def cancel_ai_job(job_id: str):
+    if not ObjectId.is_valid(job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    job = await ai_job_runner.cancel(job_id)
+    if not job:
+        raise HTTPException(status_code=409, detail="Job is not queued or running")
+    return job_summary(job)
 
 
 @app.get("/health")
@@ -235,77 +487,384 @@ def health():
     return {"ok": True}
 
 # --- PRODUCTS ---
+# Listing totals are cached per filter until the next product write.
+COUNT_CACHE_TTL = float(os.getenv("COUNT_CACHE_TTL", "300"))
+# In cursor mode, counting stops here and the total is flagged as approximate.
+COUNT_CAP = int(os.getenv("COUNT_CAP", "10000"))
+product_counts = TTLCache(maxsize=2048, ttl=COUNT_CACHE_TTL)
+
+
+async def count_products(query: dict, exact: bool = True):
+    """Returns (total, total_exact) for a product filter."""
+    key = (json.dumps(query, sort_keys=True, default=str), exact)
+    cached = product_counts.get(key)
+    if cached is not None:
+        return cached
+
+    if exact:
+        result = (await products_primary.count_documents(query), True)
+    elif not query:
+        # collection metadata, no scan
+        result = (await products_primary.estimated_document_count(), False)
+    else:
+        total = await products_primary.count_documents(query, limit=COUNT_CAP)
+        result = (total, total < COUNT_CAP)
+
+    product_counts.set(key, result)
+    return result
+
+
 @app.get("/products")
-def get_products(
+async def get_products(
+    request: Request,
     categories: Optional[List[str]] = Query(default=None),
     min_price: Optional[float] = None,
     max_price: Optional[float] = None,
     q: Optional[str] = None,
     page: int = 1,
     limit: int = 120,
+    sort: str = "default",
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    facets: bool = False,
 ):
-    query = {}
-    if categories:
-        query["category"] = {"$in": categories}
-    if min_price is not None or max_price is not None:
-        rng = {}
-        if min_price is not None:
-            rng["$gte"] = float(min_price)
-        if max_price is not None:
-            rng["$lte"] = float(max_price)
-        query["price"] = rng
-    if q:
-        query["$or"] = [
-            {"name": {"$regex": q, "$options": "i"}},
-            {"description": {"$regex": q, "$options": "i"}},
-            {"category": {"$regex": q, "$options": "i"}},
-            {"meta_keywords": {"$elemMatch": {"$regex": q, "$options": "i"}}},  # match keywords
-    
-        ]
+    """
+    Page mode (default) uses `page`/`limit` and returns an exact `total`.
+    Cursor mode is enabled by passing `cursor` (empty for the first page);
+    follow `next_cursor` until it is null. `total_exact` is false when the
+    total was estimated or capped at COUNT_CAP.
+    `fields` is a preset (card, detail, admin) or a comma-separated field list.
+    `facets=1` adds category/size/color/price-bucket counts (see facets.py).
+    Sends an ETag and answers If-None-Match with 304 (see http_cache.py).
+    """
+    key = (tuple(sorted(categories or ())), min_price, max_price, q, page, limit, sort, cursor, fields, facets)
+    cached = catalog_cache.get_listing(key)
+    if cached is not None:
+        body, tag = cached
+        return cached_json_response(request, body, tag)
+
+    try:
+        projection = projection_for(fields, PRODUCT_PRESETS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    generation = catalog_cache.generation
+    if facets:
+        response = await list_products_with_facets(categories, min_price, max_price, q, page, limit, sort, cursor, projection)
+    else:
+        response = await list_products(categories, min_price, max_price, q, page, limit, sort, cursor, projection)
+    # listings are cached already encoded, with their ETag
+    body = dumps(response)
+    tag = etag(body)
+    catalog_cache.set_listing(key, ListingFilter(categories, min_price, max_price), (body, tag), generation)
+    return cached_json_response(request, body, tag)
+
+
+async def list_products(categories, min_price, max_price, q, page, limit, sort, cursor, projection=None):
+    if sort not in PRODUCT_SORTS:
+        raise HTTPException(status_code=400, detail=f"Unknown sort '{sort}'")
+    limit = max(1, limit)
+
+    use_cursor = cursor is not None
+    position = {}
+    if cursor:
+        try:
+            position = decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if position.get("s") != sort:
+            raise HTTPException(status_code=400, detail="Cursor was issued for a different sort")
 
     skip = max(0, (page - 1) * limit)
-    total = products_col.count_documents(query)
-    items = [serialize(x) for x in products_col.find(query).skip(skip).limit(limit)]
-    return {"items": items, "total": total, "page": page, "limit": limit}
+
+    # search results are ranked by relevance; the cursor is an offset into that ranking
+    if q and SEARCH_BACKEND == "index":
+        offset = int(position.get("o", 0)) if use_cursor else skip
+        total, ids = search_index.search(
+            q,
+            categories=categories,
+            min_price=min_price,
+            max_price=max_price,
+            offset=offset,
+            limit=limit,
+        )
+        snapshot = catalog_snapshot()
+        items = snapshot.items(ids, projection) if snapshot is not None else await find_by_ids(ids, projection)
+        if not use_cursor:
+            return {"items": items, "total": total, "page": page, "limit": limit}
+        next_offset = offset + len(ids)
+        return {
+            "items": items,
+            "total": total,
+            "total_exact": True,
+            "limit": limit,
+            "next_cursor": encode_cursor({"s": sort, "o": next_offset}) if next_offset < total else None,
+        }
+
+    field, direction = PRODUCT_SORTS[sort]
+    snapshot = catalog_snapshot()
+    if snapshot is not None and not q:
+        return snapshot_listing(snapshot, categories, min_price, max_price, page, limit, sort, position, use_cursor, projection)
+
+    query = {**category_filter(categories), **price_filter(min_price, max_price)}
+    if q:
+        query["$or"] = regex_search_query(q)
+
+    if not use_cursor:
+        total, _ = await count_products(query)
+        found = products_primary.find(query, projection).sort(sort_spec(field, direction)).skip(skip).limit(limit)
+        items = await found.to_list(length=limit)
+        return {"items": items, "total": total, "page": page, "limit": limit}
+
+    total, total_exact = await count_products(query, exact=False)
+    if position:
+        if "id" not in position:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        after = seek_filter(field, direction, position.get("v"), position["id"])
+        query = {"$and": [query, after]} if query else after
+
+    # the sort field has to come back for the cursor
+    if projection is not None and any(projection.values()):
+        projection = {**projection, field: 1}
+    docs = await products_primary.find(query, projection).sort(sort_spec(field, direction)).limit(limit).to_list(length=limit)
+    next_cursor = cursor_for(docs[-1], field, s=sort) if len(docs) == limit else None
+    return {
+        "items": docs,
+        "total": total,
+        "total_exact": total_exact,
+        "limit": limit,
+        "next_cursor": next_cursor,
+    }
+
+
+def snapshot_listing(snapshot, categories, min_price, max_price, page, limit, sort, position, use_cursor, projection):
+    """list_products() from the catalog snapshot; same response shapes, exact totals."""
+    if not use_cursor:
+        total, items = snapshot.page(categories, min_price, max_price, sort, max(0, (page - 1) * limit), limit, projection)
+        return {"items": items, "total": total, "page": page, "limit": limit}
+    if position and "id" not in position:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    total, items, last = snapshot.seek(categories, min_price, max_price, sort, position, limit, projection)
+    field = PRODUCT_SORTS[sort][0]
+    return {
+        "items": items,
+        "total": total,
+        "total_exact": True,
+        "limit": limit,
+        "next_cursor": cursor_for(snapshot.cursor_doc(last, field), field, s=sort) if len(items) == limit else None,
+    }
+
+
+async def list_products_with_facets(categories, min_price, max_price, q, page, limit, sort, cursor, projection=None):
+    """
+    A /products page plus its facet counts. Counts come from the facet cache,
+    else the search index; without the index, a first-page request gets its
+    items, total and counts from a single $facet aggregation.
+    """
+    facet_key = (tuple(sorted(categories or ())), min_price, max_price, q)
+    counts = catalog_cache.get_facets(facet_key)
+    if counts is None:
+        generation = catalog_cache.generation
+        if SEARCH_BACKEND == "index":
+            counts = format_facets(search_index.facet_counts(q, categories, min_price, max_price, bucket=price_bucket))
+        else:
+            base = {"$or": regex_search_query(q)} if q else {}
+            page_spec = None
+            if cursor is None and sort in PRODUCT_SORTS:
+                limit = max(1, limit)
+                page_spec = (sort_spec(*PRODUCT_SORTS[sort]), max(0, (page - 1) * limit), limit, projection)
+            pipeline = facet_pipeline(base, categories, min_price, max_price, page_spec)
+            [result] = await products_primary.aggregate(pipeline).to_list(length=1)
+            counts = format_facets(counts_from_aggregation(result))
+            if page_spec is not None:
+                catalog_cache.set_facets(facet_key, counts, generation)
+                total = result["total"][0]["n"] if result["total"] else 0
+                return {"items": result["items"], "total": total, "page": page, "limit": limit, "facets": counts}
+        catalog_cache.set_facets(facet_key, counts, generation)
+
+    response = await list_products(categories, min_price, max_price, q, page, limit, sort, cursor, projection)
+    response["facets"] = counts
+    return response
 
 
 @app.get("/products/slug/{slug}")
-def get_by_slug(slug: str):
-    doc = products_col.find_one({"slug": {"$regex": f"^{slug}$", "$options": "i"}})
+async def get_by_slug(request: Request, slug: str, fields: Optional[str] = None):
+    try:
+        projection = projection_for(fields, PRODUCT_PRESETS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    snapshot = catalog_snapshot()
+    if snapshot is not None:
+        number = snapshot.by_slug(slug)
+        if number is not None:
+            return cached_json_response(request, snapshot.record(number, projection))
+        # not found may just mean newer than the snapshot; ask Mongo
+
+    cached = catalog_cache.get_product(slug)
+    if cached is not None:
+        return cached_json_response(request, dumps(apply_projection(cached, projection)), modified=last_modified(cached))
+
+    generation = catalog_cache.generation
+    product_id = slug_map.get(slug)
+    if product_id:
+        doc = await products_primary.find_one({"_id": ObjectId(product_id)})
+    else:
+        # written by another worker, or not backfilled yet (scripts/backfill_slug_key.py)
+        doc = await products_primary.find_one({"slug_key": slug_key(slug)})
+        if not doc:
+            doc = await products_primary.find_one({"slug": slug})
     if not doc:
         raise HTTPException(status_code=404, detail="Product not found")
-    return serialize(doc)
+    # the whole document is cached; presets are cut from it per request
+    catalog_cache.set_product(slug, doc, generation)
+    return cached_json_response(request, dumps(apply_projection(doc, projection)), modified=last_modified(doc))
+
+
+@app.get("/products/{product_id}/related")
+async def get_related(
+    request: Request,
+    product_id: str,
+    limit: int = Query(8, ge=1, le=RELATED_K),
+    fields: Optional[str] = "card",
+):
+    """
+    The `limit` products most similar to this one (see related_index.py),
+    best first. A product's first request scans the index (in a thread for
+    big catalogs); later ones are served from its cached neighbour list.
+    """
+    if not RELATED_INDEX:
+        raise HTTPException(status_code=503, detail="Related products are disabled")
+    key = ("related", product_id, limit, fields)
+    cached = catalog_cache.get_listing(key)
+    if cached is not None:
+        body, tag = cached
+        return cached_json_response(request, body, tag)
+
+    try:
+        projection = projection_for(fields, PRODUCT_PRESETS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    generation = catalog_cache.generation
+    ids = related_index.related(product_id, limit, compute=len(related_index) <= RELATED_INLINE_SCAN)
+    if ids is None:
+        if product_id not in related_index:
+            raise HTTPException(status_code=404, detail="Product not found")
+        ids = await asyncio.to_thread(related_index.related, product_id, limit)
+    body = dumps({"items": await find_by_ids(ids or [], projection)})
+    tag = etag(body)
+    # any product write can change a neighbour list, so this entry "contains" every product
+    catalog_cache.set_listing(key, ListingFilter(), (body, tag), generation)
+    return cached_json_response(request, body, tag)
 
 # --- REVIEWS ---
+# Rating summaries live on the products (see review_stats.py); reviews are
+# paged newest first through the (product_id, created_at, _id) index.
+REVIEWS_PAGE_LIMIT = 20
+REVIEWS_MAX_LIMIT = 100
+
+
+async def update_rating(product_id: str, rating: int, delta: int):
+    """Folds one review in/out of the product's rating summary; None if the product is gone."""
+    if not ObjectId.is_valid(product_id):
+        return None
+    doc = await products_col.find_one_and_update(
+        {"_id": ObjectId(product_id)},
+        rating_change(rating, delta),
+        return_document=ReturnDocument.AFTER,
+    )
+    if doc is not None:
+        # only the cached copies change; indexes and counts don't read `rating`
+        catalog_cache.invalidate(doc)
+        catalog_changed()
+    return doc
+
+
 @app.get("/reviews/{product_id}")
-def get_reviews(product_id: str):
-    items = [serialize(x) for x in reviews_col.find({"product_id": product_id})]
-    return {"reviews": items}
+async def get_reviews(product_id: str, limit: int = REVIEWS_PAGE_LIMIT, cursor: Optional[str] = None):
+    """Newest first; follow `next_cursor` for older reviews."""
+    limit = max(1, min(limit, REVIEWS_MAX_LIMIT))
+    query = {"product_id": product_id}
+    if cursor:
+        try:
+            position = decode_cursor(cursor)
+            query = {"$and": [query, seek_filter("created_at", -1, position.get("v"), position["id"])]}
+        except (ValueError, KeyError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    found = reviews_col.find(query).sort(sort_spec("created_at", -1)).limit(limit)
+    reviews = await found.to_list(length=limit)
+    next_cursor = cursor_for(reviews[-1], "created_at") if len(reviews) == limit else None
+    return MongoJSONResponse({"reviews": reviews, "next_cursor": next_cursor})
 
 
 @app.post("/reviews")
-def add_review(review: dict): # Changed Review to dict as model is not provided
-    # Assuming the Review model structure
-    review["created_at"] = datetime.utcnow()
-    reviews_col.insert_one(review)
-    return {"message": "Review added successfully!"}
+async def add_review(review: dict = Body(...)):
+    rating = review_rating(review.get("rating"))
+    if rating is None:
+        raise HTTPException(status_code=400, detail="rating must be a whole number from 1 to 5")
+    product_id = str(review.get("product_id") or "")
+
+    # summary first: it also checks the product exists
+    if await update_rating(product_id, rating, 1) is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    review.pop("_id", None)
+    review.update(product_id=product_id, rating=rating, created_at=datetime.utcnow())
+    try:
+        await reviews_col.insert_one(review)
+    except Exception:
+        await update_rating(product_id, rating, -1)
+        raise
+    return {"message": "Review added successfully!", "review_id": str(review["_id"])}
 
 
 @app.delete("/reviews/{review_id}")
-def delete_review(review_id: str):
-    result = reviews_col.delete_one({"_id": ObjectId(review_id)})
-    if result.deleted_count == 0:
+async def delete_review(review_id: str):
+    if not ObjectId.is_valid(review_id):
+        raise HTTPException(status_code=404, detail="Review not found")
+    review = await reviews_col.find_one_and_delete({"_id": ObjectId(review_id)})
+    if review is None:
         raise HTTPException(status_code=404, detail="Review not found")
+    rating = review_rating(review.get("rating"))
+    if rating is not None:
+        await update_rating(str(review.get("product_id")), rating, -1)
     return {"message": "Review deleted"}
+
+
+@app.post("/admin/reviews/rebuild-ratings")
+async def rebuild_ratings():
+    """Recomputes every product's rating summary from the reviews collection (repair/backfill)."""
+    groups = await primary(reviews_col).aggregate(RATING_PIPELINE, allowDiskUse=True).to_list(length=None)
+    by_product = rating_summaries(groups)
+    ops = rating_rebuild_ops(by_product)
+    modified = 0
+    for i in range(0, len(ops), RATING_REBUILD_BATCH):
+        result = await products_col.bulk_write(ops[i:i + RATING_REBUILD_BATCH], ordered=False)
+        modified += result.modified_count
+    # only products still carrying a summary are checked, and resets go out in batches
+    ops = []
+    async for product in products_primary.find(RATED_FILTER, {"_id": 1}):
+        if str(product["_id"]) not in by_product:
+            ops.append(rating_reset_op(product["_id"]))
+        if len(ops) == RATING_REBUILD_BATCH:
+            modified += (await products_col.bulk_write(ops, ordered=False)).modified_count
+            ops = []
+    if ops:
+        modified += (await products_col.bulk_write(ops, ordered=False)).modified_count
+    catalog_cache.clear()
+    catalog_changed()
+    return {
+        "message": "Rating summaries rebuilt",
+        "products_with_reviews": len(by_product),
+        "modified": modified,
+    }
     
 # ----------------------------------
 # --- CONSOLIDATED CART ENDPOINTS ---
 # ----------------------------------
 
 @app.get("/cart/{user_id}")
-def get_cart(user_id: str):
+async def get_cart(user_id: str):
     """Fetch user's cart"""
-    cart = carts_col.find_one({"user_id": user_id})
+    cart = await carts_col.find_one({"user_id": user_id})
     if not cart:
         return {"user_id": user_id, "items": []}
     # Ensure items are always an array, even if the user manually messed up data
@@ -316,42 +875,220 @@ def get_cart(user_id: str):
     return cart
 
 
+def sanitize_cart_line(item: dict) -> dict:
+    """Ensures price is a float and quantity an int before it is stored."""
+    try:
+        item['price'] = float(item['price'])
+    except (KeyError, ValueError, TypeError):
+        item['price'] = 0.0 # Default to 0 if invalid
+
+    try:
+        item['quantity'] = int(item['quantity'])
+    except (KeyError, ValueError, TypeError):
+        item['quantity'] = 1 # Default to 1 if invalid
+    return item
+
+
 @app.post("/cart/{user_id}")
-def save_cart(user_id: str, data: dict = Body(...)):
+async def save_cart(user_id: str, data: dict = Body(...)):
     """
     Save or update a user's cart (used for full cart synchronization).
-    The frontend sends the entire list of items.
+    The frontend sends the entire list of items. Pass `expected_version`
+    to reject the write if another tab changed the cart in the meantime.
     """
     items = data.get("items", [])
-    
-    # Optional: Basic server-side cleanup of data types if needed (e.g., ensure prices are float)
-    sanitized_items = []
-    for item in items:
-        # FastAPI will handle JSON decoding, but this ensures price is float in MongoDB
-        try:
-            item['price'] = float(item['price'])
-        except (ValueError, TypeError):
-            item['price'] = 0.0 # Default to 0 if invalid
-        
+    sanitized_items = [sanitize_cart_line(item) for item in items]
+    expected_version = expected_version_of(data)
+
+    try:
+        cart = await carts_col.find_one_and_update(
+            cart_filter(user_id, expected_version),
+            {
+                "$set": {"items": sanitized_items, "updated_at": datetime.utcnow()},
+                "$inc": {"version": 1},
+            },
+            projection={"version": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        cart = None
+    if cart is None:
+        await raise_cart_conflict(user_id)
+    return {"message": "Cart saved", "count": len(items), "version": cart["version"]}
+
+
+# --- Item-level cart deltas ---
+# Each call touches one line with $inc/$set/$push/$pull, bumps the cart's
+# `version`, and returns only the lines it changed. Callers may pass
+# `expected_version`; a stale version gets 409 with the current one.
+# carts.user_id has a unique index (db_setup.py) so racing upserts cannot
+# create a second cart.
+
+def expected_version_of(data: dict):
+    """The body's `expected_version` as an int (None when absent); 400 for anything else."""
+    value = data.get("expected_version")
+    if value is None:
+        return None
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise HTTPException(status_code=400, detail="expected_version must be an integer")
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="expected_version must be an integer")
+
+
+def cart_filter(user_id: str, expected_version: Optional[int] = None) -> dict:
+    query = {"user_id": user_id}
+    if expected_version is not None:
+        # carts written before versioning have no version field
+        query["version"] = {"$in": [None, 0]} if int(expected_version) == 0 else int(expected_version)
+    return query
+
+
+async def raise_cart_conflict(user_id: str):
+    cart = await carts_col.find_one({"user_id": user_id}, {"version": 1})
+    raise HTTPException(
+        status_code=409,
+        detail={"message": "Cart was modified concurrently", "version": (cart or {}).get("version", 0)},
+    )
+
+
+def line_key(item_id, size) -> dict:
+    return {"id": str(item_id), "size": str(size or "")}
+
+
+async def add_cart_line(user_id: str, line: dict, expected_version=None):
+    """Adds `line` to the cart or increments the existing (id, size) line. Returns (version, line)."""
+    key = line_key(line.get("id"), line.get("size"))
+    now = datetime.utcnow()
+
+    for _ in range(3):
+        cart = await carts_col.find_one_and_update(
+            {**cart_filter(user_id, expected_version), "items": {"$elemMatch": key}},
+            {"$inc": {"items.$.quantity": line["quantity"], "version": 1}, "$set": {"updated_at": now}},
+            projection={"version": 1, "items": {"$elemMatch": key}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if cart is not None:
+            return cart["version"], cart["items"][0]
+
         try:
-            item['quantity'] = int(item['quantity'])
-        except (ValueError, TypeError):
-            item['quantity'] = 1 # Default to 1 if invalid
-            
-        sanitized_items.append(item)
-        
-    carts_col.update_one(
-        {"user_id": user_id},
-        {"$set": {"items": sanitized_items, "updated_at": datetime.utcnow()}},
-        upsert=True,
+            cart = await carts_col.find_one_and_update(
+                {**cart_filter(user_id, expected_version), "items": {"$not": {"$elemMatch": key}}},
+                {"$push": {"items": {**line, **key}}, "$inc": {"version": 1}, "$set": {"updated_at": now}},
+                projection={"version": 1},
+                # only a first write (no cart yet) may create the cart
+                upsert=expected_version is None or int(expected_version) == 0,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            # the cart exists but the filter missed: stale version, or the
+            # line was pushed concurrently (then the $inc path wins next time)
+            if expected_version is not None:
+                break
+            continue
+        if cart is None:
+            break
+        return cart["version"], {**line, **key}
+
+    await raise_cart_conflict(user_id)
+
+
+@app.post("/cart/{user_id}/items")
+async def add_cart_item(user_id: str, data: dict = Body(...)):
+    """Add a product line (or increase its quantity)."""
+    if not data.get("id"):
+        raise HTTPException(status_code=400, detail="Item 'id' is required")
+    expected_version = expected_version_of(data)
+    data.pop("expected_version", None)
+    line = sanitize_cart_line({**data, "quantity": data.get("quantity", 1)})
+    if line["quantity"] <= 0:
+        raise HTTPException(status_code=400, detail="Quantity must be positive")
+
+    version, changed = await add_cart_line(user_id, line, expected_version)
+    return {"version": version, "changed": [changed], "removed": []}
+
+
+@app.patch("/cart/{user_id}/items/{item_id}")
+async def set_cart_item_quantity(user_id: str, item_id: str, data: dict = Body(...)):
+    """Set a line's quantity; 0 removes the line."""
+    key = line_key(item_id, data.get("size"))
+    try:
+        quantity = int(data.get("quantity"))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Quantity must be an integer")
+    expected_version = expected_version_of(data)
+    if quantity <= 0:
+        return await remove_cart_item(user_id, item_id, key["size"], expected_version)
+
+    cart = await carts_col.find_one_and_update(
+        {**cart_filter(user_id, expected_version), "items": {"$elemMatch": key}},
+        {"$set": {"items.$.quantity": quantity, "updated_at": datetime.utcnow()}, "$inc": {"version": 1}},
+        projection={"version": 1, "items": {"$elemMatch": key}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if cart is None:
+        await raise_cart_line_missing(user_id, key, expected_version)
+    return {"version": cart["version"], "changed": cart["items"], "removed": []}
+
+
+@app.delete("/cart/{user_id}/items/{item_id}")
+async def remove_cart_item(user_id: str, item_id: str, size: str = "", expected_version: Optional[int] = None):
+    """Remove one (id, size) line."""
+    key = line_key(item_id, size)
+    cart = await carts_col.find_one_and_update(
+        {**cart_filter(user_id, expected_version), "items": {"$elemMatch": key}},
+        {"$pull": {"items": key}, "$set": {"updated_at": datetime.utcnow()}, "$inc": {"version": 1}},
+        projection={"version": 1},
+        return_document=ReturnDocument.AFTER,
     )
-    return {"message": "Cart saved", "count": len(items)}
+    if cart is None:
+        await raise_cart_line_missing(user_id, key, expected_version)
+    return {"version": cart["version"], "changed": [], "removed": [key]}
+
+
+async def raise_cart_line_missing(user_id: str, key: dict, expected_version):
+    """A targeted update matched nothing: either the version is stale or the line is gone."""
+    cart = await carts_col.find_one({"user_id": user_id}, {"version": 1})
+    if cart is not None and expected_version is not None and cart.get("version", 0) != int(expected_version):
+        await raise_cart_conflict(user_id)
+    raise HTTPException(status_code=404, detail="Cart item not found")
+
+
+@app.post("/cart/{user_id}/merge")
+async def merge_cart(user_id: str, data: dict = Body(...)):
+    """
+    Merge a guest cart into the user's cart after sign-in. Send `guest_id`
+    to merge (and delete) a stored guest cart, or `items` directly.
+    """
+    guest_id = data.get("guest_id")
+    items = data.get("items")
+    if guest_id:
+        guest = await carts_col.find_one({"user_id": guest_id}, {"items": 1})
+        items = (guest or {}).get("items") or []
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Provide 'guest_id' or an 'items' list")
+
+    version, changed = None, []
+    for item in items:
+        if not isinstance(item, dict) or not item.get("id"):
+            continue
+        version, line = await add_cart_line(user_id, sanitize_cart_line(dict(item)))
+        changed.append(line)
+
+    if guest_id and guest_id != user_id:
+        await carts_col.delete_one({"user_id": guest_id})
+    if version is None:
+        cart = await carts_col.find_one({"user_id": user_id}, {"version": 1})
+        version = (cart or {}).get("version", 0)
+    return {"version": version, "changed": changed, "removed": []}
 
 
 @app.delete("/cart/{user_id}")
-def clear_cart(user_id: str):
+async def clear_cart(user_id: str):
     """Clear a user's cart"""
-    result = carts_col.delete_one({"user_id": user_id})
+    result = await carts_col.delete_one({"user_id": user_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Cart not found")
     return {"message": "Cart cleared"}
@@ -360,61 +1097,177 @@ def clear_cart(user_id: str):
 # --- ORDERS ---
 # ----------------------------------
 
+# Order insert, cart clear and customer stats commit together when the
+# deployment supports transactions (replica set / sharded cluster).
+# ORDER_TRANSACTIONS=auto|on|off
+ORDER_TRANSACTIONS = os.getenv("ORDER_TRANSACTIONS", "auto")
+
+
+@app.on_event("startup")
+async def prepare_orders():
+    if ORDER_TRANSACTIONS == "auto":
+        try:
+            hello = await mongo_client.admin.command("hello")
+        except Exception:
+            hello = {}
+        app.state.order_transactions = bool(hello.get("setName") or hello.get("msg") == "isdbgrid")
+    else:
+        app.state.order_transactions = ORDER_TRANSACTIONS == "on"
+    print(f"🧾 Order transactions {'on' if app.state.order_transactions else 'off'}")
+
+
+async def write_order(order: dict):
+    async def writes(session=None):
+        await orders_col.insert_one(order, session=session)
+        await carts_col.delete_one({"user_id": order["user_id"]}, session=session)
+        stats = order_update(order)
+        if stats is not None:
+            await customers_col.bulk_write([stats], session=session)
+
+    if app.state.order_transactions:
+        async with await mongo_client.start_session() as session:
+            await session.with_transaction(writes)
+    else:
+        await writes()
+
+
+def order_placed(order: dict) -> dict:
+    return {
+        "message": "Order placed successfully!",
+        "order_id": str(order["_id"]),
+        "status": order.get("status", "Pending"),
+        "total": order.get("total"),
+    }
+
+
 @app.post("/orders/{user_id}")
-def place_order(user_id: str, data: dict = Body(...)):
-    """Save the order in MongoDB and clear the cart."""
+async def place_order(
+    user_id: str,
+    data: dict = Body(...),
+    idempotency_key: Optional[str] = Header(default=None),
+):
+    """
+    Prices every line on the server (client prices and total are ignored),
+    saves the order and clears the cart. A retry with the same
+    Idempotency-Key header returns the original order.
+    """
+    items = data.get("items", [])
+    try:
+        prices = await price_book.resolve(products_primary, [line_ref(i) for i in items])
+        lines, total = price_lines(items, prices)
+    except PricingError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     order = {
         "user_id": user_id,
-        "items": data.get("items", []),
-        "total": data.get("total", 0),
+        "items": lines,
+        "total": total,
         "contact": data.get("contact", {}),
         "shipping": data.get("shipping", {}),
         "payment_method": data.get("payment_method", "COD"),
         "status": "Pending",
         "created_at": datetime.utcnow(),
     }
+    if idempotency_key:
+        order["idempotency_key"] = idempotency_key
+
+    try:
+        await write_order(order)
+    except DuplicateKeyError:
+        existing = await orders_col.find_one({"user_id": user_id, "idempotency_key": idempotency_key})
+        if existing is None:
+            raise
+        return order_placed(existing)
+    return order_placed(order)
+
+# Order listings are paged newest first through (filter..., created_at, _id)
+# indexes; pass `cursor` from the previous page's `next_cursor`.
+ORDERS_PAGE_LIMIT = 100
+ORDERS_MAX_LIMIT = 500
+
+
+def order_filter(status=None, user_id=None, date_from=None, date_to=None):
+    query = {}
+    if status:
+        query["status"] = status
+    if user_id:
+        query["user_id"] = user_id
+    if date_from or date_to:
+        created = {}
+        if date_from:
+            created["$gte"] = date_from
+        if date_to:
+            created["$lt"] = date_to
+        query["created_at"] = created
+    return query
+
+
+def order_projection(fields):
+    try:
+        projection = projection_for(fields, ORDER_PRESETS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if projection is not None and any(projection.values()):
+        projection = {**projection, "created_at": 1}  # needed for the cursor
+    return projection
+
+
+async def page_orders(query: dict, limit: int, cursor: Optional[str], projection=None):
+    """Returns (orders, next_cursor) for one page of a filtered order listing."""
+    limit = max(1, min(limit, ORDERS_MAX_LIMIT))
+    if cursor:
+        try:
+            position = decode_cursor(cursor)
+            after = seek_filter("created_at", -1, position.get("v"), position["id"])
+        except (ValueError, KeyError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = {"$and": [query, after]} if query else after
+
+    found = orders_col.find(query, projection).sort(sort_spec("created_at", -1)).limit(limit)
+    orders = await found.to_list(length=limit)
+    next_cursor = cursor_for(orders[-1], "created_at") if len(orders) == limit else None
+    return orders, next_cursor
 
-    result = db["orders"].insert_one(order)
-    db["carts"].delete_one({"user_id": user_id}) # Clear cart after order
 
-    return {
-        "message": "Order placed successfully!",
-        "order_id": str(result.inserted_id),
-        "status": "Pending"
-    }
-    
 @app.get("/orders/{user_id}")
-def get_orders(user_id: str):
-    orders = list(db["orders"].find({"user_id": user_id}))
-    for o in orders:
-        o["_id"] = str(o["_id"])
-    return {"orders": orders}
+async def get_orders(
+    user_id: str,
+    status: Optional[str] = None,
+    limit: int = ORDERS_PAGE_LIMIT,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+):
+    orders, next_cursor = await page_orders(order_filter(status, user_id), limit, cursor, order_projection(fields))
+    return MongoJSONResponse({"orders": orders, "next_cursor": next_cursor})
 
 # --- ADMIN ENDPOINTS (Product, Order, Customer, Category CRUD) ---
+async def update_category_counts(before, after):
+    """Moves a product between the materialized category counts (creating categories as needed)."""
+    ops = count_changes(before, after)
+    if ops:
+        await categories_col.bulk_write(ops, ordered=False)
+
+
 @app.post("/products")
-def add_product(product: dict = Body(...)):
-    if products_col.find_one({"slug": product["slug"]}):
+async def add_product(product: dict = Body(...)):
+    product["slug_key"] = slug_key(product["slug"])
+    if await products_primary.find_one({"slug_key": product["slug_key"]}):
         raise HTTPException(status_code=400, detail="Slug already exists")
 
     product["price"] = float(product.get("price", 0))
     product["meta_keywords"] = product.get("meta_keywords", [])
+    product["rating"] = empty_rating()
     product["createdAt"] = datetime.utcnow()
     product["updatedAt"] = datetime.utcnow()
-    result = products_col.insert_one(product)
+    result = await products_col.insert_one(product)
     product["_id"] = str(result.inserted_id)
-
-    if product.get("category"):
-        if not db["categories"].find_one({"name": product["category"]}):
-            db["categories"].insert_one({
-                "name": product["category"],
-                "status": "Active",
-                "createdAt": datetime.utcnow()
-            })
+    apply_product_change(None, product)
+    await update_category_counts(None, product)
 
     return {"success": True, "message": "✅ Product added successfully!", "product": product}
 
 @app.put("/products/{product_id}")
-def update_product(product_id: str, product: dict = Body(...)):
+async def update_product(product_id: str, product: dict = Body(...)):
     try:
         # 1) Safety: never allow _id to be changed from the client
         if "_id" in product:
@@ -424,6 +1277,8 @@ def update_product(product_id: str, product: dict = Body(...)):
         for date_field in ("createdAt", "updatedAt", "created_at", "updated_at"):
             if date_field in product:
                 product.pop(date_field, None)
+        # the rating summary is maintained by the review endpoints
+        product.pop("rating", None)
 
         # 3) Normalize meta_keywords: accept comma string or array
         if "meta_keywords" in product and not isinstance(product["meta_keywords"], list):
@@ -443,18 +1298,27 @@ def update_product(product_id: str, product: dict = Body(...)):
         # 5) Set updatedAt on server as a proper datetime (BSON date)
         product["updatedAt"] = datetime.utcnow()
 
-        # 6) Slug uniqueness check (if slug provided)
+        # 6) Slug uniqueness check (if slug provided); slug_key is always derived here
+        product.pop("slug_key", None)
         if "slug" in product:
-            existing = products_col.find_one(
-                {"slug": product["slug"], "_id": {"$ne": ObjectId(product_id)}}
+            product["slug_key"] = slug_key(product["slug"])
+            existing = await products_primary.find_one(
+                {"slug_key": product["slug_key"], "_id": {"$ne": ObjectId(product_id)}}
             )
             if existing:
                 raise HTTPException(status_code=400, detail="Slug already exists")
 
-        # 7) Apply update
-        result = products_col.update_one({"_id": ObjectId(product_id)}, {"$set": product})
-        if result.matched_count == 0:
+        # 7) Apply update (the pre-image tells caches where the product used to be)
+        before = await products_col.find_one_and_update(
+            {"_id": ObjectId(product_id)},
+            {"$set": product},
+            return_document=ReturnDocument.BEFORE,
+        )
+        if before is None:
             raise HTTPException(status_code=404, detail="Product not found")
+        after = {**before, **product}
+        apply_product_change(before, after)
+        await update_category_counts(before, after)
 
         return {"success": True, "message": "Product updated successfully"}
 
@@ -464,40 +1328,130 @@ def update_product(product_id: str, product: dict = Body(...)):
 
 
 @app.delete("/products/{product_id}")
-def delete_product(product_id: str):
-    result = products_col.delete_one({"_id": ObjectId(product_id)})
-    if result.deleted_count == 0:
+async def delete_product(product_id: str):
+    before = await products_col.find_one_and_delete({"_id": ObjectId(product_id)})
+    if before is None:
         raise HTTPException(status_code=404, detail="Product not found")
+    apply_product_change(before, None)
+    await update_category_counts(before, None)
     return {"message": "Product deleted successfully"}
 
+# --- Bulk product import/export (see product_io.py, scripts/products_io.py)
+# request bodies beyond this are spooled to a temp file while they upload
+IMPORT_SPOOL_BYTES = 8 * 1024 * 1024
+
+
+@app.post("/admin/products/import")
+async def import_products(request: Request, format: str = "ndjson"):
+    """
+    Upserts products by slug from an NDJSON or CSV request body, e.g.
+    curl --data-binary @catalog.ndjson '.../admin/products/import?format=ndjson'
+    """
+    if format not in PRODUCT_IO_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {sorted(PRODUCT_IO_FORMATS)}")
+
+    with tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_BYTES) as spool:
+        async for chunk in request.stream():
+            spool.write(chunk)
+        spool.seek(0)
+        batches = import_batches(io.TextIOWrapper(spool, encoding="utf-8", newline=""), format)
+
+        async def parsed_batches():
+            # parsing/validation is CPU work; keep it off the event loop
+            while (batch := await asyncio.to_thread(next, batches, None)) is not None:
+                yield batch
+
+        report = await run_import_async(products_col, parsed_batches())
+
+    if report.inserted or report.updated:
+        await rebuild_category_counts()
+        catalog_cache.clear()
+        product_counts.clear()
+        price_book.clear()
+        catalog_changed()
+        await build_catalog_views(use_snapshot=False)
+    return report.as_dict()
+
+
+@app.get("/admin/products/export")
+async def export_products(format: str = "ndjson", category: Optional[str] = None):
+    """Streams the catalog as NDJSON or CSV in the import format."""
+    if format not in PRODUCT_IO_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {sorted(PRODUCT_IO_FORMATS)}")
+    query = {"category": category} if category else {}
+    found = products_col.find(query, EXPORT_PROJECTION).sort("_id", 1).batch_size(1000)
+    return StreamingResponse(
+        stream_products(found, format),
+        media_type=PRODUCT_IO_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="products.{format}"'},
+    )
+
+
 @app.get("/admin/orders")
-def get_all_orders():
-    orders = list(db["orders"].find())
-    for o in orders:
-        o["_id"] = str(o["_id"])
-    return {"orders": orders}
+async def get_all_orders(
+    status: Optional[str] = None,
+    user_id: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    limit: int = ORDERS_PAGE_LIMIT,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+):
+    query = order_filter(status, user_id, date_from, date_to)
+    orders, next_cursor = await page_orders(query, limit, cursor, order_projection(fields))
+    return MongoJSONResponse({"orders": orders, "next_cursor": next_cursor})
+
+
+@app.get("/admin/orders/export")
+async def export_orders(
+    format: str = "ndjson",
+    status: Optional[str] = None,
+    user_id: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+):
+    """Streams every matching order as NDJSON or CSV without buffering the result."""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {sorted(EXPORT_FORMATS)}")
+
+    query = order_filter(status, user_id, date_from, date_to)
+    found = orders_col.find(query).sort(sort_spec("created_at", -1)).batch_size(500)
+    return StreamingResponse(
+        stream_orders(found, format),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="orders.{format}"'},
+    )
 
 @app.put("/admin/orders/{order_id}")
-def update_order_status(order_id: str, data: dict = Body(...)):
-    result = db["orders"].update_one({"_id": ObjectId(order_id)}, {"$set": {"status": data.get("status")}})
+async def update_order_status(order_id: str, data: dict = Body(...)):
+    result = await orders_col.update_one({"_id": ObjectId(order_id)}, {"$set": {"status": data.get("status")}})
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Order not found")
     return {"message": "Order status updated successfully"}
 
 @app.delete("/admin/orders/{order_id}")
-def delete_order(order_id: str):
-    result = db["orders"].delete_one({"_id": ObjectId(order_id)})
-    if result.deleted_count == 0:
+async def delete_order(order_id: str):
+    order = await orders_col.find_one_and_delete({"_id": ObjectId(order_id)})
+    if order is None:
         raise HTTPException(status_code=404, detail="Order not found")
+    await update_customer_stats(order_removal(order))
     return {"message": "Order deleted successfully"}
 
 @app.get("/orders")
-def get_all_orders_summary():
+async def get_all_orders_summary(
+    status: Optional[str] = None,
+    user_id: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    limit: int = ORDERS_PAGE_LIMIT,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+):
     try:
-        orders = list(orders_col.find())
+        query = order_filter(status, user_id, date_from, date_to)
+        orders, next_cursor = await page_orders(query, limit, cursor, order_projection(fields))
 
         for o in orders:
-            o["_id"] = str(o["_id"])
             o["user_id"] = o.get("user_id", "Unknown")
             o["status"] = o.get("status", "Pending")
             o["total"] = float(o.get("total", 0))
@@ -507,170 +1461,270 @@ def get_all_orders_summary():
                 else str(o.get("created_at", ""))
             )
 
-        total_revenue = sum(o.get("total", 0) for o in orders)
-        total_orders = len(orders)
-
-        return {
-            "orders": orders,
-            "summary": {
-                "total_revenue": total_revenue,
-                "total_orders": total_orders
-            },
-        }
+        # totals cover every matching order, not just this page; they are
+        # computed for the first page only, so following next_cursor stays
+        # an index walk instead of a $group over every order per page
+        summary = None
+        if cursor is None:
+            totals = await orders_col.aggregate([
+                {"$match": query},
+                {"$group": {
+                    "_id": None,
+                    "total_revenue": {"$sum": {"$convert": {
+                        "input": "$total", "to": "double", "onError": 0, "onNull": 0,
+                    }}},
+                    "total_orders": {"$sum": 1},
+                }},
+            ]).to_list(length=1)
+            totals = totals[0] if totals else {"total_revenue": 0, "total_orders": 0}
+            summary = {"total_revenue": totals["total_revenue"], "total_orders": totals["total_orders"]}
+
+        return MongoJSONResponse({"orders": orders, "summary": summary, "next_cursor": next_cursor})
 
+    except HTTPException:
+        raise
     except Exception as e:
         print("❌ Error fetching orders:", e)
         raise HTTPException(status_code=500, detail=f"Server Error: {str(e)}")
 
 # --- CATEGORY CRUD ---
 @app.get("/categories")
-def get_categories():
-    cats = list(categories_col.find())
-
-    clean_categories = []
-    for c in cats:
-        clean_category = {
-            "_id": str(c.get("_id")),
-            "name": c.get("name") or c.get("Name") or "Unnamed Category",
-            "status": c.get("status", "Active"),
-            "createdAt": c.get("createdAt"),
-        }
-        clean_category["productCount"] = db["products"].count_documents({
-            "category": clean_category["name"]
-        })
-
-        clean_categories.append(clean_category)
-
-    return {"categories": clean_categories}
+async def get_categories(request: Request):
+    snapshot = catalog_snapshot()
+    if snapshot is not None:
+        return cached_json_response(request, snapshot.categories_body())
+    # productCount is materialized by the product write endpoints (see category_counts.py)
+    cats = await categories_col.find({}, CATEGORY_PROJECTION).to_list(length=None)
+    return cached_json_response(request, categories_body(cats))
 
 @app.post("/categories")
-def add_category(data: dict = Body(...)):
+async def add_category(data: dict = Body(...)):
     if not data.get("name"):
         raise HTTPException(status_code=400, detail="Category name is required")
 
-    if categories_col.find_one({"name": {"$regex": f"^{data['name']}$", "$options": "i"}}):
+    data["name_key"] = category_key(data["name"])
+    if await primary(categories_col).find_one({"name_key": data["name_key"]}):
         raise HTTPException(status_code=400, detail="Category already exists")
 
     data["status"] = data.get("status", "Active")
     data["createdAt"] = datetime.utcnow()
-    result = categories_col.insert_one(data)
+    data["productCount"] = await products_primary.count_documents({"category": data["name"]})
+    result = await categories_col.insert_one(data)
     data["_id"] = str(result.inserted_id)
+    catalog_changed()
     return {"message": "✅ Category added successfully!", "category": data}
 
 
 @app.put("/categories/{category_id}")
-def update_category(category_id: str, data: dict = Body(...)):
-    result = categories_col.update_one({"_id": ObjectId(category_id)}, {"$set": data})
+async def update_category(category_id: str, data: dict = Body(...)):
+    # counts are server-maintained
+    data.pop("productCount", None)
+    data.pop("name_key", None)
+    if data.get("name"):
+        data["name_key"] = category_key(data["name"])
+    result = await categories_col.update_one({"_id": ObjectId(category_id)}, {"$set": data})
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Category not found")
+    catalog_changed()
     return {"message": "Category updated successfully"}
 
 
+@app.post("/admin/categories/rebuild-counts")
+async def rebuild_category_counts():
+    """Recomputes every productCount with one $group over products (repair/backfill)."""
+    groups = await products_primary.aggregate(COUNT_PIPELINE).to_list(length=None)
+    run_id = ObjectId()
+    upserted = modified = 0
+    ops = rebuild_ops(groups, run_id)
+    if ops:
+        result = await categories_col.bulk_write(ops, ordered=False)
+        upserted, modified = result.upserted_count, result.modified_count
+    # after every stamp has landed, so no live category is zeroed
+    result = await categories_col.bulk_write([count_reset_op(run_id)])
+    catalog_changed()
+    return {
+        "message": "Category counts rebuilt",
+        "categories": len(groups),
+        "upserted": upserted,
+        "modified": modified + result.modified_count,
+    }
+
+
 @app.delete("/categories/{category_id}")
-def delete_category(category_id: str):
-    result = categories_col.delete_one({"_id": ObjectId(category_id)})
+async def delete_category(category_id: str):
+    result = await categories_col.delete_one({"_id": ObjectId(category_id)})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Category not found")
+    catalog_changed()
     return {"message": "Category deleted successfully"}
 
 # --- CUSTOMERS CRUD ---
 
-@app.get("/customers")
-def get_customers():
-    try:
-        customers = list(customers_col.find())
-
-        if not customers:
-            pipeline = [
-                {
-                    "$group": {
-                        "_id": "$contact.email", # Assuming email is inside contact object for new orders
-                        "full_name": {"$first": "$shipping.name"}, # Assuming name is inside shipping
-                        "created_at": {"$min": "$created_at"},
-                        "total_orders": {"$sum": 1},
-                    }
-                },
-                {"$sort": {"created_at": -1}},
-            ]
-            derived = list(orders_col.aggregate(pipeline))
-
-            for c in derived:
-                email = c.get("_id")
-                if not email:
-                    continue # Skip orders without an email
-
-                new_customer = {
-                    "full_name": c.get("full_name", "Unknown"),
-                    "email": email,
-                    "created_at": c.get("created_at") or datetime.utcnow(),
-                    "total_orders": c.get("total_orders", 0),
-                }
-                customers_col.insert_one(new_customer)
-
-            customers = list(customers_col.find())
-
-        for c in customers:
-            c["_id"] = str(c.get("_id", ""))
-            c["email"] = c.get("email", "N/A")
-            c["full_name"] = c.get("full_name", "Unknown")
-
-            created_at = c.get("created_at")
-            if isinstance(created_at, datetime):
-                c["created_at"] = created_at.isoformat()
-            else:
-                try:
-                    c["created_at"] = datetime.fromisoformat(str(created_at)).isoformat()
-                except Exception:
-                    c["created_at"] = datetime.utcnow().isoformat()
+# --- CUSTOMERS ---
+# Stats (total_orders, lifetime_value, first/last order) are maintained by
+# place_order; see customer_stats.py.
+CUSTOMER_SORTS = {
+    "newest": ("created_at", -1),
+    "last_order": ("last_order_at", -1),
+    "value": ("lifetime_value", -1),
+    "orders": ("total_orders", -1),
+}
+CUSTOMERS_PAGE_LIMIT = 100
+CUSTOMERS_MAX_LIMIT = 500
 
-            c["total_orders"] = int(c.get("total_orders", 0))
 
-        return {"customers": customers}
+async def update_customer_stats(op):
+    if op is not None:
+        await customers_col.bulk_write([op])
+
+
+@app.get("/customers")
+async def get_customers(
+    sort: str = "newest",
+    q: Optional[str] = None,
+    limit: int = CUSTOMERS_PAGE_LIMIT,
+    cursor: Optional[str] = None,
+):
+    """Newest customers first by default; `q` is an email prefix; follow `next_cursor`."""
+    if sort not in CUSTOMER_SORTS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {sorted(CUSTOMER_SORTS)}")
+    field, direction = CUSTOMER_SORTS[sort]
+    limit = max(1, min(limit, CUSTOMERS_MAX_LIMIT))
+
+    query = {}
+    if q:
+        query["email_key"] = {"$regex": "^" + re.escape(customer_key(q))}
+    if cursor:
+        try:
+            position = decode_cursor(cursor)
+            after = seek_filter(field, direction, position.get("v"), position["id"])
+        except (ValueError, KeyError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = {"$and": [query, after]} if query else after
+
+    found = customers_col.find(query).sort(sort_spec(field, direction)).limit(limit)
+    customers = await found.to_list(length=limit)
+    next_cursor = cursor_for(customers[-1], field) if len(customers) == limit else None
+    # the count is for the first page only (follow-up pages skip it)
+    total = None
+    if cursor is None:
+        total = await customers_col.count_documents(query) if query else await customers_col.estimated_document_count()
+    return MongoJSONResponse({"customers": customers, "next_cursor": next_cursor, "total": total})
+
+
+@app.post("/admin/customers/rebuild-stats")
+async def rebuild_customer_stats():
+    """Recomputes every customer's stats with one $group over orders (repair/backfill)."""
+    await customers_col.bulk_write([KEY_BACKFILL])
+    run_id = ObjectId()
+    ops, customers, upserted, modified = [], 0, 0, 0
+    async for group in orders_col.aggregate(STATS_PIPELINE, allowDiskUse=True):
+        customers += 1
+        ops.append(rebuild_op(group, run_id))
+        if len(ops) == REBUILD_BATCH:
+            result = await customers_col.bulk_write(ops, ordered=False)
+            upserted, modified = upserted + result.upserted_count, modified + result.modified_count
+            ops = []
+    if ops:
+        result = await customers_col.bulk_write(ops, ordered=False)
+        upserted, modified = upserted + result.upserted_count, modified + result.modified_count
+    # after every upsert has landed, so a customer is never zeroed before its stats are set
+    result = await customers_col.bulk_write([reset_op(run_id)])
+    return {
+        "message": "Customer stats rebuilt",
+        "customers": customers,
+        "upserted": upserted + result.upserted_count,
+        "modified": modified + result.modified_count,
+    }
 
-    except Exception as e:
-        print("❌ Error fetching customers:", e)
-        raise HTTPException(status_code=500, detail=f"Server Error: {str(e)}")
 
 @app.get("/dashboard/products")
-def get_products_summary():
-    total = products_col.count_documents({})
+async def get_products_summary():
+    total = await products_col.count_documents({})
     return {"total_products": total}
 
+# --- Stripe checkout (see payments.py). STRIPE_API_BASE can point at
+# scripts/stripe_standin.py for local runs and benchmarks.
+STORE_CURRENCY = os.getenv("STORE_CURRENCY", "PKR")
+STRIPE_CURRENCY = os.getenv("STRIPE_CURRENCY", "usd")
+stripe_client = StripeClient(
+    api_key=os.getenv("STRIPE_SECRET_KEY"),
+    base_url=os.getenv("STRIPE_API_BASE", "https://api.stripe.com"),
+    timeout=float(os.getenv("STRIPE_TIMEOUT", "10")),
+    max_retries=int(os.getenv("STRIPE_MAX_RETRIES", "2")),
+    max_connections=int(os.getenv("STRIPE_MAX_CONNECTIONS", "50")),
+)
+stripe_prices = StripePriceCache(collection(db, "stripe_prices"), stripe_client)
+fx_rates = FxRates(
+    collection(db, "fx_rates"),
+    ttl=float(os.getenv("FX_CACHE_TTL", "300")),
+    defaults={STORE_CURRENCY: float(os.getenv("FX_DEFAULT_PER_USD", "280"))},
+)
+
+
 @app.post("/payments/stripe/create-session")
-def create_stripe_session(data: dict = Body(...)):
+async def create_stripe_session(data: dict = Body(...)):
+    """
+    Prices the cart on the server, converts to the Stripe currency and opens a
+    Checkout Session. Known (product, amount) pairs reuse a cached Stripe Price,
+    so a warm checkout is a single Stripe call.
+    """
+    items = data.get("items", [])
+    user_id = data.get("user_id", "guest_user")
+
+    if not items:
+        raise HTTPException(status_code=400, detail="Cart is empty")
+    if not stripe_client.configured:
+        raise HTTPException(status_code=500, detail="STRIPE_SECRET_KEY is missing")
     try:
-        items = data.get("items", [])
-        user_id = data.get("user_id", "guest_user")
-
-        if not items:
-            raise HTTPException(status_code=400, detail="Cart is empty")
-        USD_RATE = 280 
-        line_items = []
-        for item in items:
-            line_items.append({
-                "price_data": {
-                    "currency": "usd",
-                    "product_data": {
-                        "name": item["name"],
-                    },
-                    "unit_amount": int((item["price"] / USD_RATE) * 100),  # Stripe uses cents
-                },
-                "quantity": item["quantity"],
-            })
-
-        session = stripe.checkout.Session.create(
-            payment_method_types=["card"],
-            mode="payment",
-            line_items=line_items,
-            success_url=f"{FRONTEND_URL}/payment-success?session_id={{CHECKOUT_SESSION_ID}}",
-            cancel_url=f"{FRONTEND_URL}/checkout",
-            metadata={
-                "user_id": user_id,
-            }
-        )
+        prices = await price_book.resolve(products_primary, [line_ref(i) for i in items])
+        lines, total = price_lines(items, prices)
+    except PricingError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        return {"url": session.url}
+    try:
+        store_per_usd = await fx_rates.per_usd(STORE_CURRENCY)
+        stripe_per_usd = await fx_rates.per_usd(STRIPE_CURRENCY)
+    except StripeError as e:
+        # a missing rate is a configuration problem, not a Stripe failure
+        raise HTTPException(status_code=e.status_code, detail=str(e))
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    try:
+        price_ids = await asyncio.gather(*(
+            stripe_prices.price_id(
+                line["id"], line["name"],
+                to_minor_units(line["price"], store_per_usd, STRIPE_CURRENCY, stripe_per_usd), STRIPE_CURRENCY,
+            )
+            for line in lines
+        ))
+        session = await stripe_client.create_checkout_session({
+            "payment_method_types": ["card"],
+            "mode": "payment",
+            "line_items": [
+                {"price": price_id, "quantity": line["quantity"]}
+                for price_id, line in zip(price_ids, lines)
+            ],
+            "success_url": f"{FRONTEND_URL}/payment-success?session_id={{CHECKOUT_SESSION_ID}}",
+            "cancel_url": f"{FRONTEND_URL}/checkout",
+            "metadata": {"user_id": user_id, "total": total, "currency": STORE_CURRENCY},
+        })
+    except StripeError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+
+    return {"url": session["url"]}
+
+
+@app.get("/admin/fx-rates")
+async def get_fx_rates():
+    """Units of each currency per 1 USD, as used for Stripe checkout."""
+    return {"rates": await fx_rates.rates(), "stripe_prices": stripe_prices.stats()}
+
+
+@app.put("/admin/fx-rates")
+async def set_fx_rates(data: dict = Body(...)):
+    """Body: {"PKR": 281.5, ...}. Workers pick the change up within FX_CACHE_TTL."""
+    try:
+        return {"rates": await fx_rates.update(data)}
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
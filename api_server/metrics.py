@@ -0,0 +1,407 @@
+# api_server/metrics.py
+"""
+Prometheus metrics: per-route request latency, in-flight requests and
+errors (MetricsMiddleware), per-collection Mongo command timings (a pymongo
+CommandListener) and outbound Groq/Stripe call latencies.
+
+Connection pool gauges come from db.PoolStats at scrape time
+(register_pool_stats); with PROMETHEUS_MULTIPROC_DIR set they are mirrored
+into multiprocess gauges instead, so every worker's pool is counted.
+
+Commands slower than the threshold also go to SlowQueryLog with their
+filter shape (values replaced by "?") and, optionally, a summary of the
+explain() plan. Each shape is explained at most once per interval.
+"""
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from datetime import datetime
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from pymongo import monitoring
+from starlette.responses import Response
+
+from cache import TTLCache
+
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+OUTBOUND_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0)
+
+HTTP_DURATION = Histogram(
+    "http_request_duration_seconds", "Request latency by route template", ["method", "route"], buckets=HTTP_BUCKETS,
+)
+HTTP_REQUESTS = Counter("http_requests_total", "Requests by route template and status", ["method", "route", "status"])
+HTTP_ERRORS = Counter("http_request_errors_total", "5xx responses and unhandled exceptions", ["method", "route"])
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "Requests being served", ["method"])
+
+MONGO_DURATION = Histogram(
+    "mongo_command_duration_seconds", "Mongo command latency (server round trip)", ["command", "collection"],
+    buckets=MONGO_BUCKETS,
+)
+MONGO_FAILURES = Counter("mongo_command_failures_total", "Mongo commands that returned an error", ["command", "collection"])
+MONGO_SLOW = Counter("mongo_slow_commands_total", "Mongo commands over the slow threshold", ["command", "collection"])
+
+OUTBOUND_DURATION = Histogram(
+    "outbound_request_duration_seconds", "Latency of calls to external APIs", ["service", "operation", "outcome"],
+    buckets=OUTBOUND_BUCKETS,
+)
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+# --- HTTP
+
+class MetricsMiddleware:
+    """
+    Plain ASGI middleware (no BaseHTTPMiddleware task per request). Routes
+    are labelled by their template, e.g. /products/{product_id}, so label
+    cardinality stays bounded; unknown paths share UNMATCHED_ROUTE.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_flight = HTTP_IN_FLIGHT.labels(method)
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        except Exception:
+            status = 500
+            raise
+        finally:
+            in_flight.dec()
+            # the router stores the matched route on the (shared) scope
+            route = getattr(scope.get("route"), "path", UNMATCHED_ROUTE)
+            HTTP_DURATION.labels(method, route).observe(time.perf_counter() - started)
+            HTTP_REQUESTS.labels(method, route, str(status)).inc()
+            if status >= 500:
+                HTTP_ERRORS.labels(method, route).inc()
+
+
+def metrics_response() -> Response:
+    """Text exposition of every metric; aggregates worker processes when PROMETHEUS_MULTIPROC_DIR is set."""
+    registry = REGISTRY
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+
+# --- Outbound APIs
+
+def observe_outbound(service: str, operation: str, outcome: str, seconds: float):
+    """`operation` must be a fixed name or path (no ids); `outcome` a status code or error class."""
+    OUTBOUND_DURATION.labels(service, operation, outcome).observe(seconds)
+
+
+# --- Mongo
+
+# handshakes, heartbeats and session bookkeeping are not application queries
+IGNORED_COMMANDS = {
+    "hello", "ismaster", "isMaster", "ping", "buildinfo", "buildInfo", "endSessions", "saslStart",
+    "saslContinue", "authenticate", "getnonce", "killCursors", "explain",
+}
+EXPLAINABLE = {"find", "aggregate", "count", "distinct", "findAndModify", "update", "delete"}
+# driver/session fields that explain() must not be sent
+EXPLAIN_STRIP = {
+    "lsid", "$db", "$clusterTime", "txnNumber", "startTransaction", "autocommit", "$readPreference",
+    "readConcern", "writeConcern",
+}
+
+
+def query_shape(value):
+    """A filter with its values replaced by "?"; operator and field names are kept."""
+    if isinstance(value, dict):
+        return {k: query_shape(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        # $and/$or branches keep their shapes; $in/$all value lists collapse
+        return [query_shape(v) for v in value] if any(isinstance(v, dict) for v in value) else "?"
+    return "?"
+
+
+def _stage_shape(stage: dict) -> dict:
+    op, spec = next(iter(stage.items()))
+    if op == "$match":
+        return {op: query_shape(spec)}
+    if op in ("$sort", "$limit", "$skip"):
+        return {op: spec}
+    return {op: "…"}
+
+
+def command_shape(name: str, command: dict) -> dict:
+    if name == "find":
+        shape = {"filter": query_shape(command.get("filter", {}))}
+        if command.get("sort"):
+            shape["sort"] = dict(command["sort"])
+        return shape
+    if name == "aggregate":
+        return {"pipeline": [_stage_shape(s) for s in command.get("pipeline", [])]}
+    if name in ("count", "distinct"):
+        shape = {"query": query_shape(command.get("query", {}))}
+        if name == "distinct":
+            shape["key"] = command.get("key")
+        return shape
+    if name == "findAndModify":
+        shape = {"query": query_shape(command.get("query", {}))}
+        if command.get("sort"):
+            shape["sort"] = dict(command["sort"])
+        return shape
+    if name in ("update", "delete"):
+        statements = command.get("updates" if name == "update" else "deletes") or [{}]
+        return {"q": query_shape(statements[0].get("q", {})), "statements": len(statements)}
+    return {}
+
+
+def explain_command(name: str, command: dict) -> dict:
+    cmd = {k: v for k, v in command.items() if k not in EXPLAIN_STRIP}
+    # explain accepts a single write statement
+    if name == "update":
+        cmd["updates"] = list(cmd.get("updates", []))[:1]
+    elif name == "delete":
+        cmd["deletes"] = list(cmd.get("deletes", []))[:1]
+    return cmd
+
+
+def _find_key(doc, key):
+    """First value stored under `key` anywhere in an explain document (aggregate nests it under $cursor)."""
+    if isinstance(doc, dict):
+        if key in doc:
+            return doc[key]
+        children = doc.values()
+    elif isinstance(doc, list):
+        children = doc
+    else:
+        return None
+    for child in children:
+        found = _find_key(child, key)
+        if found is not None:
+            return found
+    return None
+
+
+def plan_summary(explain: dict) -> dict:
+    """Winning plan as a stage chain, e.g. "LIMIT > FETCH > IXSCAN", plus indexes and examined counts."""
+    planner = _find_key(explain, "queryPlanner") or {}
+    plan = planner.get("winningPlan") or {}
+    plan = plan.get("queryPlan", plan)  # slot-based engine wraps the classic tree
+    stages, indexes = [], []
+    node = plan
+    while node:
+        stages.append(node.get("stage", "?"))
+        if node.get("indexName"):
+            indexes.append(node["indexName"])
+        inputs = node.get("inputStages")
+        if inputs:
+            for child in inputs:
+                if child.get("indexName"):
+                    indexes.append(child["indexName"])
+            stages.append(f"[{len(inputs)} inputs]")
+            break
+        node = node.get("inputStage")
+    summary = {
+        "plan": " > ".join(stages) or None,
+        "indexes": indexes,
+        "collscan": "COLLSCAN" in stages,
+        "rejected_plans": len(planner.get("rejectedPlans", [])),
+    }
+    stats = _find_key(explain, "executionStats")
+    if stats:
+        summary.update({
+            "returned": stats.get("nReturned"),
+            "keys_examined": stats.get("totalKeysExamined"),
+            "docs_examined": stats.get("totalDocsExamined"),
+        })
+    return summary
+
+
+class SlowQueryLog:
+    """
+    Recent slow commands, newest last. `verbosity` is the explain verbosity
+    ("queryPlanner" only plans; "executionStats" re-runs the query) or None
+    to skip explains. Explains run on the app's loop via attach().
+    """
+
+    PENDING = {"plan": "pending"}
+
+    def __init__(self, threshold_ms: float, size: int = 200, verbosity: str = "queryPlanner", explain_interval: float = 600.0):
+        self.threshold_ms = threshold_ms
+        self.verbosity = verbosity
+        self.entries = deque(maxlen=size)
+        self._plans = TTLCache(maxsize=1024, ttl=explain_interval)
+        self._client = None
+        self._loop = None
+        self._tasks = set()
+
+    def attach(self, client, loop):
+        self._client = client
+        self._loop = loop
+
+    def record(self, name: str, collection: str, database: str, command: dict, seconds: float):
+        """Called from the driver's thread when a command crosses the threshold."""
+        MONGO_SLOW.labels(name, collection).inc()
+        shape = command_shape(name, command or {})
+        key = json.dumps([database, collection, name, shape], sort_keys=True, default=str)
+        entry = {
+            "at": datetime.utcnow(),
+            "command": name,
+            "collection": collection,
+            "ms": round(seconds * 1000, 1),
+            "shape": shape,
+            "plan": self._plans.get(key),
+        }
+        self.entries.append(entry)
+        print(f"🐢 Slow {name} on {collection}: {entry['ms']} ms {json.dumps(shape, default=str)}")
+
+        if entry["plan"] is None and self.verbosity and command and name in EXPLAINABLE and self._loop is not None:
+            self._plans.set(key, self.PENDING)
+            cmd = explain_command(name, command)
+            self._loop.call_soon_threadsafe(self._start_explain, key, database, cmd, entry)
+
+    def _start_explain(self, key, database, cmd, entry):
+        task = self._loop.create_task(self._explain(key, database, cmd, entry))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _explain(self, key, database, cmd, entry):
+        try:
+            result = await self._client[database].command({"explain": cmd, "verbosity": self.verbosity})
+            summary = plan_summary(result)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            summary = {"plan": None, "error": f"{type(e).__name__}: {e}"}
+        self._plans.set(key, summary)
+        entry["plan"] = summary
+        if summary.get("collscan"):
+            print(f"🐢 {entry['command']} on {entry['collection']} is a collection scan: {summary['plan']}")
+
+    def recent(self, limit: int = 50) -> list:
+        return list(self.entries)[-limit:][::-1]
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """
+    Times every application command per (command, collection). Pass it to
+    the client as event_listeners=[...]; callbacks run on the driver's
+    threads, so they only do dict and counter updates.
+    """
+
+    def __init__(self, slow_log: SlowQueryLog = None):
+        self.slow_log = slow_log
+        self._pending = {}
+
+    def started(self, event):
+        name = event.command_name
+        if name in IGNORED_COMMANDS:
+            return
+        target = event.command.get("collection") if name == "getMore" else event.command.get(name)
+        collection = target if isinstance(target, str) else "<db>"
+        # the command document is only kept when a slow one may need explaining
+        command = event.command if self.slow_log is not None else None
+        self._pending[(event.connection_id, event.request_id)] = (name, collection, event.database_name, command)
+
+    def succeeded(self, event):
+        entry = self._pending.pop((event.connection_id, event.request_id), None)
+        if entry is None:
+            return
+        name, collection, database, command = entry
+        seconds = event.duration_micros / 1_000_000
+        MONGO_DURATION.labels(name, collection).observe(seconds)
+        if self.slow_log is not None and seconds * 1000 >= self.slow_log.threshold_ms:
+            self.slow_log.record(name, collection, database, command, seconds)
+
+    def failed(self, event):
+        entry = self._pending.pop((event.connection_id, event.request_id), None)
+        if entry is None:
+            return
+        name, collection = entry[0], entry[1]
+        MONGO_DURATION.labels(name, collection).observe(event.duration_micros / 1_000_000)
+        MONGO_FAILURES.labels(name, collection).inc()
+
+
+class PoolCollector:
+    """Exports a db.PoolStats snapshot on every scrape (single-process mode)."""
+
+    GAUGES = {"open": "Open connections", "in_use": "Checked-out connections", "waiting": "Requests waiting for a connection"}
+    COUNTERS = {"checkouts": "Connection check-outs", "checkout_failures": "Failed check-outs (timeouts, errors)"}
+
+    def __init__(self, stats, max_pool_size: int):
+        self.stats = stats
+        self.max_pool_size = max_pool_size
+
+    def collect(self):
+        servers = self.stats.snapshot()
+        limit = GaugeMetricFamily("mongo_pool_max_connections", "maxPoolSize per server")
+        limit.add_metric([], self.max_pool_size)
+        yield limit
+        for key, help_text in self.GAUGES.items():
+            family = GaugeMetricFamily(f"mongo_pool_{key}_connections", help_text, labels=["server"])
+            for server, counts in servers.items():
+                family.add_metric([server], counts[key])
+            yield family
+        for key, help_text in self.COUNTERS.items():
+            family = CounterMetricFamily(f"mongo_pool_{key}", help_text, labels=["server"])
+            for server, counts in servers.items():
+                family.add_metric([server], counts[key])
+            yield family
+
+
+class PoolMultiprocessMetrics:
+    """
+    PoolCollector for PROMETHEUS_MULTIPROC_DIR: a scrape reaches one worker,
+    so each pool event is written to "livesum" gauges and counters that the
+    exposition sums over live workers (the server's worker-exit hook should
+    call prometheus_client.multiprocess.mark_process_dead). The limit is the
+    summed maxPoolSize, to compare with the summed open/in-use counts.
+    """
+
+    def __init__(self, stats, max_pool_size: int):
+        # registry=None: the values live in the multiprocess files, collected in metrics_response
+        limit = Gauge(
+            "mongo_pool_max_connections", "maxPoolSize per server, summed over workers",
+            multiprocess_mode="livesum", registry=None,
+        )
+        limit.set(max_pool_size)
+        self.metrics = {
+            key: Gauge(f"mongo_pool_{key}_connections", help_text, ["server"], multiprocess_mode="livesum", registry=None)
+            for key, help_text in PoolCollector.GAUGES.items()
+        }
+        self.metrics.update({
+            key: Counter(f"mongo_pool_{key}", help_text, ["server"], registry=None)
+            for key, help_text in PoolCollector.COUNTERS.items()
+        })
+        for server, counts in stats.snapshot().items():
+            self(server, counts)
+        stats.subscribe(self)
+
+    def __call__(self, server, deltas):
+        for key, delta in deltas.items():
+            metric = self.metrics.get(key)
+            if metric is not None and delta:
+                metric.labels(server).inc(delta)
+
+
+def register_pool_stats(stats, max_pool_size: int):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        PoolMultiprocessMetrics(stats, max_pool_size)
+    else:
+        REGISTRY.register(PoolCollector(stats, max_pool_size))
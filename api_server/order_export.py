@@ -0,0 +1,79 @@
+# api_server/order_export.py
+"""
+Streaming order export (NDJSON or CSV).
+
+Orders are encoded one at a time as the Mongo cursor yields them, and
+flushed in small chunks, so memory stays flat no matter how many orders
+match.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+
+from bson import ObjectId
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+CSV_COLUMNS = [
+    "_id", "user_id", "status", "total", "payment_method",
+    "created_at", "email", "name", "item_count",
+]
+
+# lines per chunk written to the response
+CHUNK_LINES = 200
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    return str(value)
+
+
+def ndjson_line(order: dict) -> str:
+    return json.dumps(order, default=_default, ensure_ascii=False) + "\n"
+
+
+def _csv_line(values) -> str:
+    buf = io.StringIO()
+    csv.writer(buf).writerow(values)
+    return buf.getvalue()
+
+
+def csv_header() -> str:
+    return _csv_line(CSV_COLUMNS)
+
+
+def csv_line(order: dict) -> str:
+    contact = order.get("contact") or {}
+    shipping = order.get("shipping") or {}
+    created_at = order.get("created_at")
+    return _csv_line([
+        str(order.get("_id", "")),
+        order.get("user_id", ""),
+        order.get("status", "Pending"),
+        order.get("total", 0),
+        order.get("payment_method", ""),
+        created_at.isoformat() if isinstance(created_at, datetime) else created_at or "",
+        contact.get("email", "") if isinstance(contact, dict) else "",
+        shipping.get("name", "") if isinstance(shipping, dict) else "",
+        sum(int(i.get("quantity", 1) or 0) for i in order.get("items") or [] if isinstance(i, dict)),
+    ])
+
+
+async def stream_orders(cursor, fmt: str):
+    """Async generator of response chunks for an (async) Motor cursor."""
+    encode = csv_line if fmt == "csv" else ndjson_line
+    lines = [csv_header()] if fmt == "csv" else []
+    async for order in cursor:
+        lines.append(encode(order))
+        if len(lines) >= CHUNK_LINES:
+            yield "".join(lines)
+            lines = []
+    if lines:
+        yield "".join(lines)
@@ -0,0 +1,109 @@
+# api_server/order_pricing.py
+"""
+Server-side pricing for order placement.
+
+Cart lines reference products by `_id` (or by slug for older carts). All
+prices an order needs are resolved in one `$in` query, with a per-worker
+price cache in front that the product write hook keeps current; the client's
+prices and total are ignored.
+"""
+from bson import ObjectId
+
+from cache import TTLCache
+from slugs import slug_key
+
+PRICE_FIELDS = {"price": 1, "name": 1, "slug": 1, "image": 1}
+MAX_LINE_QUANTITY = 100
+
+
+class PricingError(ValueError):
+    pass
+
+
+def cache_key(ref: str) -> str:
+    """ObjectId strings as-is, slugs by slug_key, so every spelling of a slug shares one entry."""
+    return ref if ObjectId.is_valid(ref) else slug_key(ref)
+
+
+class PriceBook:
+    def __init__(self, maxsize: int, ttl: float):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def resolve(self, products_col, refs) -> dict:
+        """Maps each product reference (_id string or slug) to its price entry."""
+        found, missing = {}, []
+        for ref in dict.fromkeys(refs):
+            entry = self.cache.get(cache_key(ref))
+            if entry is not None:
+                found[ref] = entry
+            else:
+                missing.append(ref)
+        if not missing:
+            return found
+
+        ids = [ObjectId(r) for r in missing if ObjectId.is_valid(r)]
+        keys = [slug_key(r) for r in missing]
+        query = {"$or": [{"_id": {"$in": ids}}, {"slug_key": {"$in": keys}}]}
+        by_id, by_key = {}, {}
+        async for doc in products_col.find(query, PRICE_FIELDS):
+            entry = {
+                "product_id": str(doc["_id"]),
+                "price": float(doc.get("price") or 0),
+                "name": doc.get("name"),
+                "image": doc.get("image"),
+            }
+            by_id[entry["product_id"]] = entry
+            by_key[slug_key(doc.get("slug"))] = entry
+
+        for ref in missing:
+            entry = by_id.get(ref) or by_key.get(slug_key(ref))
+            if entry is not None:
+                self.cache.set(cache_key(ref), entry)
+                found[ref] = entry
+        return found
+
+    def invalidate(self, doc):
+        if doc is None:
+            return
+        self.cache.pop(str(doc.get("_id")))
+        if doc.get("slug"):
+            self.cache.pop(slug_key(doc["slug"]))
+
+    def clear(self):
+        self.cache.clear()
+
+
+def line_ref(item) -> str:
+    return str(item.get("id") or item.get("product_id") or "") if isinstance(item, dict) else ""
+
+
+def price_lines(items, prices: dict):
+    """
+    Rebuilds the order lines with server prices; returns (lines, total).
+    Raises PricingError for unknown products or bad quantities.
+    """
+    if not items:
+        raise PricingError("Order has no items")
+    unknown = [line_ref(i) for i in items if line_ref(i) not in prices]
+    if unknown:
+        raise PricingError(f"Unknown products: {unknown}")
+
+    lines, total = [], 0.0
+    for item in items:
+        entry = prices[line_ref(item)]
+        try:
+            quantity = int(item.get("quantity", 1))
+        except (TypeError, ValueError):
+            raise PricingError(f"Invalid quantity for {line_ref(item)}")
+        if not 1 <= quantity <= MAX_LINE_QUANTITY:
+            raise PricingError(f"Quantity for {line_ref(item)} must be between 1 and {MAX_LINE_QUANTITY}")
+        lines.append({
+            **item,
+            "id": entry["product_id"],
+            "name": entry["name"] or item.get("name"),
+            "image": entry["image"] or item.get("image"),
+            "price": entry["price"],
+            "quantity": quantity,
+        })
+        total += entry["price"] * quantity
+    return lines, round(total, 2)
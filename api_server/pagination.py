@@ -0,0 +1,92 @@
+# api_server/pagination.py
+"""
+Keyset (cursor) pagination helpers.
+
+A cursor is an opaque url-safe token holding the sort key value and `_id`
+of the last item served. The next page seeks past that position through a
+compound (sort field, _id) index instead of skipping over earlier rows, so
+page 500 costs the same as page 1.
+"""
+import base64
+import json
+from datetime import datetime
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+# name -> (field, direction); `_id` is always the tie-breaker
+PRODUCT_SORTS = {
+    "default": ("_id", 1),
+    "newest": ("createdAt", -1),
+    "price_asc": ("price", 1),
+    "price_desc": ("price", -1),
+}
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    if isinstance(value, ObjectId):
+        return {"$oid": str(value)}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if "$date" in value:
+            return datetime.fromisoformat(value["$date"])
+        if "$oid" in value:
+            return ObjectId(value["$oid"])
+    return value
+
+
+def encode_cursor(payload: dict) -> str:
+    raw = json.dumps({k: _encode_value(v) for k, v in payload.items()}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> dict:
+    """Raises ValueError for tokens that were not produced by encode_cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload = json.loads(raw)
+        if not isinstance(payload, dict):
+            raise ValueError("cursor payload must be an object")
+        return {k: _decode_value(v) for k, v in payload.items()}
+    except (ValueError, InvalidId, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {e}") from None
+
+
+def sort_spec(field: str, direction: int):
+    """Mongo sort for (field, _id), both in the same direction."""
+    if field == "_id":
+        return [("_id", direction)]
+    return [(field, direction), ("_id", direction)]
+
+
+def seek_filter(field: str, direction: int, last_value, last_id: ObjectId) -> dict:
+    """Filter matching the rows strictly after (last_value, last_id) in sort order."""
+    op = "$gt" if direction > 0 else "$lt"
+    if field == "_id":
+        return {"_id": {op: last_id}}
+
+    # Mongo sorts missing/null values lowest, but $gt/$lt never match across
+    # types, so the null block has to be reached explicitly.
+    same_value = {field: last_value, "_id": {op: last_id}}
+    if last_value is None:
+        if direction > 0:
+            return {"$or": [{field: {"$ne": None}}, same_value]}
+        return same_value
+
+    branches = [{field: {op: last_value}}, same_value]
+    if direction < 0:
+        branches.append({field: None})
+    return {"$or": branches}
+
+
+def cursor_for(doc: dict, field: str, **extra) -> str:
+    """Builds the token that resumes after `doc`."""
+    payload = {"id": ObjectId(str(doc["_id"])), **extra}
+    if field != "_id":
+        payload["v"] = doc.get(field)
+    return encode_cursor(payload)
@@ -0,0 +1,244 @@
+# api_server/payments.py
+"""
+Async Stripe checkout support.
+
+StripeClient talks to the Stripe REST API over one pooled httpx.AsyncClient
+with timeouts and retries (exponential backoff with jitter; POSTs carry an
+Idempotency-Key so a retried create never creates twice). STRIPE_API_BASE
+points it at scripts/stripe_standin.py for local runs and benchmarks.
+
+StripePriceCache maps (product, name, amount, currency) to a Stripe Price ID so
+repeat SKUs are sent as `price` instead of inline `price_data`; FxRates is
+the store-currency -> USD conversion table (`fx_rates` collection, cached
+per worker, refreshable through the admin API).
+"""
+import asyncio
+import hashlib
+import random
+import time
+import uuid
+from datetime import datetime
+from urllib.parse import urlencode
+
+from metrics import observe_outbound
+
+# retried unless Stripe says otherwise through the Stripe-Should-Retry header
+RETRY_STATUSES = {409, 429, 500, 502, 503, 504}
+
+
+class StripeError(Exception):
+    def __init__(self, message, status_code=502):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _flatten(value, key, pairs):
+    if isinstance(value, dict):
+        for k, v in value.items():
+            _flatten(v, f"{key}[{k}]", pairs)
+    elif isinstance(value, (list, tuple)):
+        for i, v in enumerate(value):
+            _flatten(v, f"{key}[{i}]", pairs)
+    elif isinstance(value, bool):
+        pairs.append((key, "true" if value else "false"))
+    elif value is not None:
+        pairs.append((key, str(value)))
+
+
+def encode_form(params: dict) -> str:
+    """Stripe's form encoding: {"a": {"b": [1]}} -> "a[b][0]=1"."""
+    pairs = []
+    for key, value in (params or {}).items():
+        _flatten(value, key, pairs)
+    return urlencode(pairs)
+
+
+class StripeClient:
+    def __init__(self, api_key, base_url="https://api.stripe.com", timeout=10.0,
+                 max_retries=2, backoff=0.25, max_connections=50):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_connections = max_connections
+        self._client = None
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key)
+
+    def _http(self) -> "httpx.AsyncClient":
+        if self._client is None:
+            import httpx  # imported on first use; it is a large part of worker start-up
+
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(self.timeout, connect=min(self.timeout, 5.0)),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                headers={"Authorization": f"Bearer {self.api_key}"},
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _delay(self, attempt: int) -> float:
+        return min(self.backoff * 2 ** attempt, 4.0) * random.uniform(0.5, 1.0)
+
+    async def request(self, method: str, path: str, params: dict = None, idempotency_key: str = None) -> dict:
+        import httpx
+
+        headers = {"Content-Type": "application/x-www-form-urlencoded"}
+        if method == "POST":
+            headers["Idempotency-Key"] = idempotency_key or str(uuid.uuid4())
+        body = encode_form(params)
+
+        error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                await asyncio.sleep(self._delay(attempt - 1))
+            started = time.perf_counter()
+            try:
+                response = await self._http().request(method, path, content=body, headers=headers)
+            except httpx.TransportError as e:
+                observe_outbound("stripe", path, type(e).__name__, time.perf_counter() - started)
+                error = StripeError(f"Stripe request failed: {type(e).__name__}: {e}")
+                continue
+            observe_outbound("stripe", path, str(response.status_code), time.perf_counter() - started)
+
+            if response.status_code < 400:
+                return response.json()
+            try:
+                message = response.json()["error"]["message"]
+            except Exception:
+                message = response.text[:300]
+            error = StripeError(f"Stripe error {response.status_code}: {message}", status_code=response.status_code)
+            should_retry = response.headers.get("Stripe-Should-Retry")
+            if should_retry == "false" or (should_retry != "true" and response.status_code not in RETRY_STATUSES):
+                break
+        raise error
+
+    async def create_price(self, name: str, unit_amount: int, currency: str, metadata=None, idempotency_key=None):
+        return await self.request("POST", "/v1/prices", {
+            "currency": currency,
+            "unit_amount": unit_amount,
+            "product_data": {"name": name},
+            "metadata": metadata or {},
+        }, idempotency_key=idempotency_key)
+
+    async def create_checkout_session(self, params: dict, idempotency_key=None):
+        return await self.request("POST", "/v1/checkout/sessions", params, idempotency_key=idempotency_key)
+
+
+class StripePriceCache:
+    """
+    (product id, name, unit amount, currency) -> Stripe Price ID, in memory and in Mongo.
+
+    The name is part of the key because it is baked into the Price's product
+    data: a renamed product gets a new Price (and idempotency key) instead of
+    showing the old name or replaying a key with different params.
+    """
+
+    def __init__(self, collection, client: StripeClient):
+        self.col = collection
+        self.client = client
+        self._ids = {}
+        self._pending = {}
+        self.created = 0
+
+    async def price_id(self, product_id: str, name: str, unit_amount: int, currency: str) -> str:
+        name_hash = hashlib.sha1(name.encode()).hexdigest()[:12]
+        key = f"{product_id}:{name_hash}:{currency}:{unit_amount}"
+        price_id = self._ids.get(key)
+        if price_id:
+            return price_id
+        # concurrent first checkouts of a SKU wait on one lookup/create
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, product_id, name, unit_amount, currency))
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _load(self, key, product_id, name, unit_amount, currency) -> str:
+        doc = await self.col.find_one({"_id": key})
+        if doc is None:
+            # the idempotency key also dedupes creates across workers
+            price = await self.client.create_price(
+                name, unit_amount, currency,
+                metadata={"product_id": product_id},
+                idempotency_key=f"price-{key}",
+            )
+            doc = {"_id": key, "price_id": price["id"], "created_at": datetime.utcnow()}
+            await self.col.update_one({"_id": key}, {"$set": doc}, upsert=True)
+            self.created += 1
+        self._ids[key] = doc["price_id"]
+        return doc["price_id"]
+
+    def stats(self) -> dict:
+        return {"cached": len(self._ids), "created": self.created}
+
+
+class FxRates:
+    """Units of each currency per 1 USD; `defaults` apply until a rate is stored."""
+
+    def __init__(self, collection, ttl: float, defaults: dict):
+        self.col = collection
+        self.ttl = ttl
+        self.defaults = dict(defaults)
+        self._rates = dict(defaults)
+        self._loaded_at = None
+
+    async def rates(self) -> dict:
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl:
+            stored = {d["_id"]: float(d["per_usd"]) async for d in self.col.find({}, {"per_usd": 1})}
+            self._rates = {**self.defaults, **stored}
+            self._loaded_at = time.monotonic()
+        return self._rates
+
+    async def per_usd(self, currency: str) -> float:
+        if currency.upper() == "USD":
+            return 1.0
+        rate = (await self.rates()).get(currency.upper())
+        if not rate:
+            raise StripeError(f"No exchange rate for {currency}", status_code=500)
+        return rate
+
+    async def update(self, rates: dict) -> dict:
+        now = datetime.utcnow()
+        for currency, per_usd in rates.items():
+            per_usd = float(per_usd)
+            if per_usd <= 0:
+                raise ValueError(f"Rate for {currency} must be positive")
+            await self.col.update_one(
+                {"_id": currency.upper()},
+                {"$set": {"per_usd": per_usd, "updated_at": now}},
+                upsert=True,
+            )
+        self._loaded_at = None
+        return await self.rates()
+
+
+# Stripe amounts are in the currency's smallest unit; most have two decimals
+ZERO_DECIMAL_CURRENCIES = {
+    "bif", "clp", "djf", "gnf", "jpy", "kmf", "krw", "mga", "pyg", "rwf", "ugx", "vnd", "vuv", "xaf", "xof", "xpf",
+}
+THREE_DECIMAL_CURRENCIES = {"bhd", "jod", "kwd", "omr", "tnd"}
+
+
+def to_minor_units(amount: float, from_per_usd: float, currency: str, to_per_usd: float = 1.0) -> int:
+    """Store-currency amount -> minor units of `currency` (rates are units per 1 USD)."""
+    value = amount / from_per_usd * to_per_usd
+    code = currency.lower()
+    if code in ZERO_DECIMAL_CURRENCIES:
+        return int(round(value))
+    if code in THREE_DECIMAL_CURRENCIES:
+        # Stripe wants these rounded to a multiple of 10
+        return int(round(value * 100)) * 10
+    return int(round(value * 100))
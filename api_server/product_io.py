@@ -0,0 +1,328 @@
+# api_server/product_io.py
+"""
+Streaming bulk product import/export (NDJSON or CSV).
+
+Import reads the input a line at a time, validates each row against the
+`products` schema and upserts by `slug_key` in unordered bulk_writes of
+BATCH_SIZE, so memory stays flat whatever the catalog size. Bad rows are
+reported with their line number and never reach Mongo; rows rejected by
+Mongo itself (e.g. a slug clash with a product missing `slug_key`) are
+mapped back to their line from the BulkWriteError.
+
+Export is the inverse: one line per product, without server-managed fields,
+so an export can be edited and imported again.
+
+CSV list columns (sizes, colors, meta_keywords) are `|`-separated.
+"""
+import asyncio
+import csv
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from product_schema import validate_product
+from review_stats import empty_rating
+from slugs import slug_key
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+CSV_COLUMNS = [
+    "name", "slug", "category", "price", "image", "description",
+    "sizes", "colors", "meta_keywords", "frontendId",
+]
+LIST_FIELDS = ("sizes", "colors", "meta_keywords")
+LIST_SEPARATOR = "|"
+
+# never taken from input, never exported
+SERVER_FIELDS = ("_id", "slug_key", "rating", "createdAt", "updatedAt")
+
+BATCH_SIZE = 1000
+# per-row errors kept in the report; the count covers all of them
+MAX_REPORTED_ERRORS = 1000
+# lines per chunk written to an export response
+CHUNK_LINES = 500
+
+EXPORT_PROJECTION = {field: 0 for field in SERVER_FIELDS}
+
+
+# --- Parsing
+
+def _loads(line: str):
+    return orjson.loads(line) if orjson is not None else json.loads(line)
+
+
+def _csv_records(lines):
+    """Joins physical lines into CSV records (quoted fields may span lines)."""
+    record, start, quotes = [], None, 0
+    for line_no, line in enumerate(lines, 1):
+        if not record:
+            start = line_no
+        record.append(line)
+        quotes += line.count('"')
+        if quotes % 2 == 0:
+            yield start, "".join(record)
+            record, quotes = [], 0
+    if record:
+        yield start, "".join(record)
+
+
+def _csv_value(column, value):
+    value = value.strip()
+    if column in LIST_FIELDS:
+        return [v.strip() for v in value.split(LIST_SEPARATOR) if v.strip()]
+    if column == "price":
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return value  # reported by validation
+    return value or None
+
+
+def read_rows(lines, fmt: str):
+    """Yields (line_no, row) where row is a dict, or a str error for unparseable lines."""
+    if fmt == "ndjson":
+        for line_no, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                row = _loads(line)
+            except ValueError as e:
+                yield line_no, f"invalid JSON: {e}"
+                continue
+            yield line_no, row if isinstance(row, dict) else "expected a JSON object"
+        return
+
+    records = _csv_records(lines)
+    first = next(records, None)
+    if first is None:
+        return
+    header = [h.strip() for h in next(csv.reader(io.StringIO(first[1])))]
+    unknown = [h for h in header if h not in CSV_COLUMNS]
+    if unknown:
+        yield first[0], f"unknown CSV columns: {unknown}"
+        return
+    for line_no, record in records:
+        if not record.strip():
+            continue
+        values = next(csv.reader(io.StringIO(record)))
+        if len(values) != len(header):
+            yield line_no, f"expected {len(header)} columns, got {len(values)}"
+            continue
+        yield line_no, {
+            column: parsed
+            for column, parsed in ((c, _csv_value(c, v)) for c, v in zip(header, values))
+            if parsed is not None
+        }
+
+
+def normalize_row(row: dict) -> dict:
+    doc = {k: v for k, v in row.items() if k not in SERVER_FIELDS}
+    for field in ("name", "slug", "category", "image", "description"):
+        if isinstance(doc.get(field), str):
+            doc[field] = doc[field].strip()
+    if isinstance(doc.get("price"), int) and not isinstance(doc["price"], bool):
+        doc["price"] = float(doc["price"])
+    return doc
+
+
+def upsert_op(doc: dict, now: datetime) -> UpdateOne:
+    """Upsert by slug_key: updates the fields present in the row, keeps the rest."""
+    fields = {**doc, "slug_key": slug_key(doc["slug"]), "updatedAt": now}
+    on_insert = {"createdAt": now, "rating": empty_rating()}
+    if "meta_keywords" not in fields:
+        on_insert["meta_keywords"] = []
+    return UpdateOne({"slug_key": fields["slug_key"]}, {"$set": fields, "$setOnInsert": on_insert}, upsert=True)
+
+
+class ImportBatch:
+    def __init__(self):
+        self.ops = []
+        self.lines = []   # input line of each op
+        self.errors = []  # (line, message) for rows rejected before Mongo
+
+
+def import_batches(lines, fmt: str, batch_size: int = BATCH_SIZE):
+    """Yields ImportBatch objects; parsing and validation happen lazily, batch by batch."""
+    now = datetime.utcnow()
+    batch = ImportBatch()
+    for line_no, row in read_rows(lines, fmt):
+        if isinstance(row, str):
+            batch.errors.append((line_no, row))
+            continue
+        doc = normalize_row(row)
+        problems = validate_product(doc)
+        if problems:
+            batch.errors.append((line_no, "; ".join(problems)))
+            continue
+        batch.ops.append(upsert_op(doc, now))
+        batch.lines.append(line_no)
+        if len(batch.ops) >= batch_size:
+            yield batch
+            batch = ImportBatch()
+    if batch.ops or batch.errors:
+        yield batch
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.error_count = 0
+        self.errors = []
+
+    def _error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+    def add_batch(self, batch: ImportBatch, result=None, error: BulkWriteError = None):
+        """Records one batch and the outcome of its bulk_write (result or BulkWriteError)."""
+        self.rows += len(batch.ops) + len(batch.errors)
+        for line, message in batch.errors:
+            self._error(line, message)
+        if error is not None:
+            details = error.details
+            for write_error in details.get("writeErrors", []):
+                self._error(batch.lines[write_error["index"]], write_error.get("errmsg", "write error"))
+            upserted, matched, modified = details["nUpserted"], details["nMatched"], details["nModified"]
+        elif result is not None:
+            upserted, matched, modified = result.upserted_count, result.matched_count, result.modified_count
+        else:
+            return
+        self.inserted += upserted
+        self.updated += modified
+        self.unchanged += matched - modified
+
+    def as_dict(self) -> dict:
+        self.errors.sort(key=lambda e: e["line"])
+        return {
+            "rows": self.rows,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "unchanged": self.unchanged,
+            "error_count": self.error_count,
+            "errors": self.errors,
+        }
+
+
+def _record(report: ImportReport, batch: ImportBatch, write):
+    """Waits for a batch's bulk_write (a callable) and records the outcome."""
+    try:
+        report.add_batch(batch, result=write())
+    except BulkWriteError as e:
+        report.add_batch(batch, error=e)
+
+
+def run_import(collection, lines, fmt: str, batch_size: int = BATCH_SIZE) -> ImportReport:
+    """
+    Synchronous import through a pymongo collection (CLI). One bulk_write is
+    kept in flight on a worker thread while the next batch is parsed.
+    """
+    report = ImportReport()
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        pending = None
+        for batch in import_batches(lines, fmt, batch_size):
+            if not batch.ops:
+                report.add_batch(batch)
+                continue
+            if pending is not None:
+                _record(report, *pending)
+            future = pool.submit(collection.bulk_write, batch.ops, ordered=False)
+            pending = (batch, future.result)
+        if pending is not None:
+            _record(report, *pending)
+    return report
+
+
+async def run_import_async(collection, batches) -> ImportReport:
+    """
+    Async import through a Motor collection. `batches` is an async iterator
+    of ImportBatch (the API parses in a worker thread, see main.py); one
+    bulk_write runs while the next batch is parsed.
+    """
+    report = ImportReport()
+    pending = None
+    async for batch in batches:
+        if not batch.ops:
+            report.add_batch(batch)
+            continue
+        if pending is not None:
+            await _record_async(report, *pending)
+        pending = (batch, asyncio.ensure_future(collection.bulk_write(batch.ops, ordered=False)))
+    if pending is not None:
+        await _record_async(report, *pending)
+    return report
+
+
+async def _record_async(report: ImportReport, batch: ImportBatch, task):
+    try:
+        report.add_batch(batch, result=await task)
+    except BulkWriteError as e:
+        report.add_batch(batch, error=e)
+
+
+# --- Export
+
+def _csv_line(values) -> str:
+    buf = io.StringIO()
+    csv.writer(buf).writerow(values)
+    return buf.getvalue()
+
+
+def csv_header() -> str:
+    return _csv_line(CSV_COLUMNS)
+
+
+def csv_line(doc: dict) -> str:
+    values = []
+    for column in CSV_COLUMNS:
+        value = doc.get(column)
+        if column in LIST_FIELDS:
+            value = LIST_SEPARATOR.join(str(v) for v in value or [])
+        values.append("" if value is None else value)
+    return _csv_line(values)
+
+
+def ndjson_line(doc: dict) -> str:
+    doc = {k: v for k, v in doc.items() if k not in SERVER_FIELDS}
+    if orjson is not None:
+        return orjson.dumps(doc, default=str).decode() + "\n"
+    return json.dumps(doc, default=str, ensure_ascii=False) + "\n"
+
+
+def export_lines(docs, fmt: str):
+    """Lines for an (sync) iterable of product documents."""
+    encode = csv_line if fmt == "csv" else ndjson_line
+    if fmt == "csv":
+        yield csv_header()
+    for doc in docs:
+        yield encode(doc)
+
+
+async def stream_products(cursor, fmt: str):
+    """Async generator of response chunks for a Motor cursor."""
+    encode = csv_line if fmt == "csv" else ndjson_line
+    lines = [csv_header()] if fmt == "csv" else []
+    async for doc in cursor:
+        lines.append(encode(doc))
+        if len(lines) >= CHUNK_LINES:
+            yield "".join(lines)
+            lines = []
+    if lines:
+        yield "".join(lines)
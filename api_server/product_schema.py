@@ -0,0 +1,83 @@
+# api_server/product_schema.py
+"""
+The `products` collection validator, shared by db_setup.py (collection
+creation) and the bulk importer (per-row checks before anything is sent to
+Mongo, so a bad row is reported instead of failing its whole batch).
+"""
+from datetime import datetime
+
+product_schema = {
+    "$jsonSchema": {
+        "bsonType": "object",
+        "required": ["name", "slug", "category", "price", "image"],
+        "properties": {
+            "name": {"bsonType": "string"},
+            "slug": {"bsonType": "string"},
+            "slug_key": {"bsonType": "string"},
+            "category": {"bsonType": "string"},
+            "price": {"bsonType": "number", "minimum": 0},
+            "image": {"bsonType": "string"},
+            "description": {"bsonType": "string"},
+            "sizes": {"bsonType": "array", "items": {"bsonType": "string"}},
+            "colors": {"bsonType": "array", "items": {"bsonType": "string"}},
+            "meta_keywords": {"bsonType": "array", "items": {"bsonType": "string"}},
+            "rating": {"bsonType": "object"},
+            "frontendId": {"bsonType": "string"},
+            "createdAt": {"bsonType": "date"},
+            "updatedAt": {"bsonType": "date"}
+        }
+    }
+}
+
+_TYPES = {
+    "string": (str,),
+    "number": (int, float),
+    "array": (list,),
+    "object": (dict,),
+    "date": (datetime,),
+}
+
+
+def _compile(rule: dict, path: str):
+    """Turns one property rule into a check(value, errors) closure."""
+    types = _TYPES.get(rule.get("bsonType"), (object,))
+    minimum = rule.get("minimum")
+    items = rule.get("items")
+    item_check = _compile(items, path + "[]") if items else None
+    item_types = _TYPES.get(items.get("bsonType"), (object,)) if items else None
+
+    def check(value, errors):
+        if not isinstance(value, types) or isinstance(value, bool):
+            errors.append(f"{path}: expected {rule['bsonType']}")
+            return
+        if minimum is not None and value < minimum:
+            errors.append(f"{path}: must be >= {minimum}")
+        # fast path: every item already has the right type
+        if item_check is not None and not all(isinstance(v, item_types) for v in value):
+            for v in value:
+                item_check(v, errors)
+
+    return check
+
+
+def compile_validator(schema=product_schema):
+    """
+    Validator for the (subset of) $jsonSchema we use, compiled once; returns
+    a function mapping a document to a list of error messages (empty if valid).
+    """
+    spec = schema["$jsonSchema"]
+    required = tuple(spec.get("required", ()))
+    checks = [(field, _compile(rule, field)) for field, rule in spec.get("properties", {}).items()]
+
+    def validate(doc: dict) -> list:
+        errors = [f"{field}: required" for field in required if doc.get(field) in (None, "")]
+        for field, check in checks:
+            value = doc.get(field)
+            if value is not None:
+                check(value, errors)
+        return errors
+
+    return validate
+
+
+validate_product = compile_validator()
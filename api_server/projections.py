@@ -0,0 +1,54 @@
+# api_server/projections.py
+"""
+`fields=` presets for product and order responses.
+
+A preset name (or a comma-separated list of top-level fields) becomes a
+Mongo projection, so listing pages only pull what a card renders instead of
+full descriptions and keyword lists. No `fields` keeps the whole document.
+"""
+import re
+
+PRODUCT_PRESETS = {
+    # shop grid / ProductCard
+    "card": {"name": 1, "slug": 1, "price": 1, "image": 1, "category": 1, "rating": 1},
+    # product page: everything except server-side bookkeeping
+    "detail": {"slug_key": 0, "enhanced_description": 0},
+    # admin editor
+    "admin": None,
+}
+
+ORDER_PRESETS = {
+    # admin order table
+    "summary": {
+        "user_id": 1, "status": 1, "total": 1, "created_at": 1,
+        "payment_method": 1, "contact": 1, "shipping": 1,
+    },
+    "full": None,
+}
+
+FIELD_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def projection_for(fields, presets: dict):
+    """
+    Mongo projection for a preset name or "a,b,c" field list (None = whole
+    document). Raises ValueError for unknown presets or invalid field names.
+    """
+    if not fields:
+        return None
+    if fields in presets:
+        return presets[fields]
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    bad = [f for f in names if not FIELD_RE.match(f)]
+    if bad or not names:
+        raise ValueError(f"fields must be one of {sorted(presets)} or a comma-separated field list")
+    return {name: 1 for name in names}
+
+
+def apply_projection(doc: dict, projection):
+    """Applies a projection from projection_for() to a document already in memory."""
+    if projection is None:
+        return doc
+    if any(projection.values()):
+        return {k: v for k, v in doc.items() if k == "_id" or k in projection}
+    return {k: v for k, v in doc.items() if k not in projection}
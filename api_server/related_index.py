@@ -0,0 +1,315 @@
+# api_server/related_index.py
+"""
+In-memory nearest-neighbour index behind GET /products/{id}/related.
+
+Every product becomes one float32 row: idf-weighted tokens from name,
+description and meta_keywords, plus category and color features, hashed
+into `dims` buckets and L2-normalised. A product's neighbours are one
+matrix-vector product over the whole catalog (cosine similarity), blended
+with price proximity, then an argpartition for the top K.
+
+Neighbour lists are kept once computed. A write does not throw them away:
+the changed product is scored against the cached lists, which gain it when
+it beats their last entry; only the lists it was already in are dropped
+(its score there changed) and recomputed on their next read.
+"""
+import math
+import threading
+import zlib
+from collections import OrderedDict
+from itertools import chain
+
+import numpy as np
+
+from search_index import _field_text, _to_price, _values, tokenize
+
+DIMS = 256
+
+# neighbours kept per product (the most a request can ask for)
+K = 24
+
+# text fields, by how much a shared token says about two products
+FIELD_WEIGHTS = {"name": 2.0, "meta_keywords": 1.5, "description": 1.0}
+
+# norm of the category / colors part next to the unit-norm text part
+CATEGORY_WEIGHT = 0.6
+COLOR_WEIGHT = 0.4
+
+# share of the score that comes from price proximity, and the log-price
+# distance (0.5 is a ~1.65x price ratio) at which it falls to 1/e
+PRICE_WEIGHT = 0.15
+PRICE_SCALE = 0.5
+
+# cached neighbour lists (one per product viewed), least recently read dropped first
+NEIGHBOUR_CACHE_SIZE = 20000
+
+# rows built per bincount during a rebuild (bounds its float64 scratch space)
+REBUILD_BATCH = 8192
+
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+
+
+def _log_price(doc):
+    return math.log(max(_to_price(doc.get("price")), 1.0))
+
+
+def _price_proximity(log_prices, log_price):
+    return np.exp(-np.abs(log_prices - log_price) / PRICE_SCALE)
+
+
+class RelatedProductsIndex:
+    """Thread-safe; keyed by the product's string _id like ProductSearchIndex."""
+
+    def __init__(self, dims: int = DIMS, k: int = K, cache_size: int = NEIGHBOUR_CACHE_SIZE):
+        self.dims = dims
+        self.k = k
+        self.cache_size = cache_size
+        self._lock = threading.RLock()
+        # feature -> term id, and per term its bucket and sign; crc32 rather
+        # than hash() so every worker hashes a feature the same way
+        self._terms = {}
+        self._term_buckets = np.zeros(0, dtype=np.int64)
+        self._term_signs = np.zeros(0, dtype=np.float64)
+        self._clear(capacity=0)
+
+    def _clear(self, capacity):
+        self._rows = {}         # doc_id -> row
+        self._ids = []          # row -> doc_id (None when free)
+        self._free = []         # rows of removed products, reused first
+        self._vectors = np.zeros((capacity, self.dims), dtype=np.float32)
+        self._log_prices = np.zeros(capacity, dtype=np.float32)
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._doc_terms = {}    # doc_id -> (term ids, weighted tfs), to keep _df right on updates
+        self._df = np.zeros(len(self._term_buckets), dtype=np.int64)  # term id -> products containing it
+        self._neighbours = OrderedDict()  # row -> (rows, scores), best first
+        self._cutoffs = np.zeros(capacity, dtype=np.float32)  # row -> score a newcomer must beat to enter its list
+        self._listed_in = {}    # row -> rows whose cached list contains it
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, doc_id):
+        return str(doc_id) in self._rows
+
+    # --- features ---
+
+    def _term(self, feature):
+        term = self._terms.get(feature)
+        if term is None:
+            term = self._terms[feature] = len(self._terms)
+            if term == len(self._term_buckets):
+                size = max(1024, term * 2)
+                self._term_buckets = np.resize(self._term_buckets, size)
+                self._term_signs = np.resize(self._term_signs, size)
+                self._df = np.concatenate([self._df, np.zeros(size - len(self._df), dtype=np.int64)])
+            h = zlib.crc32(feature.encode())
+            self._term_buckets[term] = h % self.dims
+            # the sign bit keeps colliding features from always adding up
+            self._term_signs[term] = 1.0 if h & 0x80000000 else -1.0
+        return term
+
+    def _doc_text(self, doc):
+        weights = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(_field_text(doc, field)):
+                weights[token] = weights.get(token, 0.0) + weight
+        return tuple(map(self._term, weights)), tuple(weights.values())
+
+    def _matrix(self, docs, doc_terms):
+        """float32 rows for `docs` (with their `_doc_text`), idf taken from the current _df."""
+        counts = [len(terms) for terms, _ in doc_terms]
+        terms = np.fromiter(chain.from_iterable(t for t, _ in doc_terms), dtype=np.int64, count=sum(counts))
+        tfs = np.fromiter(chain.from_iterable(w for _, w in doc_terms), dtype=np.float64, count=sum(counts))
+        rows = np.repeat(np.arange(len(docs)), counts)
+        idf = np.log1p(max(len(self._rows), 1) / (1.0 + self._df[terms]))
+        # log-scaled tf, so a word repeated in the description cannot dominate
+        values = self._term_signs[terms] * (1.0 + np.log(tfs)) * idf
+
+        shape = (len(docs), self.dims)
+        size = shape[0] * shape[1]
+        matrix = np.bincount(rows * self.dims + self._term_buckets[terms], values, minlength=size).reshape(shape)
+        _normalize(matrix)
+
+        other_rows, other_terms, other_values = [], [], []
+        for i, doc in enumerate(docs):
+            category = doc.get("category")
+            if category:
+                other_rows.append(i)
+                other_terms.append(self._term(f"category:{category}"))
+                other_values.append(CATEGORY_WEIGHT)
+            colors = _values(doc.get("colors"))
+            for color in colors:
+                other_rows.append(i)
+                other_terms.append(self._term(f"color:{str(color).lower()}"))
+                other_values.append(COLOR_WEIGHT / math.sqrt(len(colors)))
+        other_terms = np.asarray(other_terms, dtype=np.int64)
+        cells = np.asarray(other_rows, dtype=np.int64) * self.dims + self._term_buckets[other_terms]
+        matrix += np.bincount(cells, self._term_signs[other_terms] * other_values, minlength=size).reshape(shape)
+        _normalize(matrix)
+        return matrix.astype(np.float32)
+
+    # --- maintenance ---
+
+    def rebuild(self, docs):
+        """Replaces the index contents with the given product documents."""
+        docs = list(docs)
+        with self._lock:
+            self._clear(capacity=max(len(docs), 16))
+            doc_terms = [self._doc_text(doc) for doc in docs]
+            for doc, terms in zip(docs, doc_terms):
+                doc_id = str(doc["_id"])
+                self._rows[doc_id] = len(self._ids)
+                self._ids.append(doc_id)
+                self._doc_terms[doc_id] = terms
+            all_terms = np.fromiter(chain.from_iterable(t for t, _ in doc_terms), dtype=np.int64)
+            self._df[:] = np.bincount(all_terms, minlength=len(self._df))
+            # idf needs the whole catalog's document frequencies, hence the second pass
+            for start in range(0, len(docs), REBUILD_BATCH):
+                end = start + REBUILD_BATCH
+                self._vectors[start:end] = self._matrix(docs[start:end], doc_terms[start:end])
+            self._log_prices[:len(docs)] = [_log_price(doc) for doc in docs]
+            self._alive[:len(docs)] = True
+
+    def upsert(self, doc):
+        """Indexes a new product or re-indexes a changed one, patching the cached neighbour lists."""
+        doc_id = str(doc["_id"])
+        with self._lock:
+            row = self._rows.get(doc_id)
+            if row is None:
+                row = self._allocate(doc_id)
+            else:
+                self._df[list(self._doc_terms[doc_id][0])] -= 1
+                self._forget(row)
+            terms = self._doc_terms[doc_id] = self._doc_text(doc)
+            self._df[list(terms[0])] += 1
+            self._vectors[row] = self._matrix([doc], [terms])[0]
+            self._log_prices[row] = _log_price(doc)
+            self._alive[row] = True
+            self._offer(row)
+
+    def remove(self, doc_id):
+        with self._lock:
+            row = self._rows.pop(str(doc_id), None)
+            if row is None:
+                return
+            self._df[list(self._doc_terms.pop(str(doc_id))[0])] -= 1
+            self._forget(row)
+            self._alive[row] = False
+            self._vectors[row] = 0.0
+            self._ids[row] = None
+            self._free.append(row)
+
+    def _allocate(self, doc_id):
+        if self._free:
+            row = self._free.pop()
+            self._ids[row] = doc_id
+        else:
+            row = len(self._ids)
+            if row == len(self._vectors):
+                self._grow(max(16, row * 2))
+            self._ids.append(doc_id)
+        self._rows[doc_id] = row
+        return row
+
+    def _grow(self, capacity):
+        vectors = np.zeros((capacity, self.dims), dtype=np.float32)
+        vectors[:len(self._vectors)] = self._vectors
+        log_prices = np.zeros(capacity, dtype=np.float32)
+        log_prices[:len(self._log_prices)] = self._log_prices
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:len(self._alive)] = self._alive
+        cutoffs = np.zeros(capacity, dtype=np.float32)
+        cutoffs[:len(self._cutoffs)] = self._cutoffs
+        self._vectors, self._log_prices, self._alive, self._cutoffs = vectors, log_prices, alive, cutoffs
+
+    def _store(self, owner, members, scores):
+        self._neighbours[owner] = (members, scores)
+        self._cutoffs[owner] = scores[-1] if len(members) == self.k else -np.inf
+
+    def _drop_list(self, row):
+        entry = self._neighbours.pop(row, None)
+        if entry is not None:
+            for member in entry[0].tolist():
+                owners = self._listed_in.get(member)
+                if owners is not None:
+                    owners.discard(row)
+
+    def _forget(self, row):
+        """Drops the row's own list and every list it appears in (their scores for it are stale)."""
+        self._drop_list(row)
+        for owner in self._listed_in.pop(row, set()):
+            self._drop_list(owner)
+
+    def _offer(self, row):
+        """Adds a new or changed row to the cached lists it now belongs in."""
+        if not self._neighbours:
+            return
+        owners = np.fromiter(self._neighbours.keys(), dtype=np.int64, count=len(self._neighbours))
+        scores = (
+            (1.0 - PRICE_WEIGHT) * (self._vectors[owners] @ self._vectors[row])
+            + PRICE_WEIGHT * _price_proximity(self._log_prices[owners], self._log_prices[row])
+        )
+        better = scores > self._cutoffs[owners]
+        for owner, score in zip(owners[better].tolist(), scores[better].tolist()):
+            members, member_scores = self._neighbours[owner]
+            at = int(np.searchsorted(-member_scores, -score))
+            members = np.insert(members, at, row)
+            member_scores = np.insert(member_scores, at, score)
+            if len(members) > self.k:
+                self._listed_in.get(int(members[-1]), set()).discard(owner)
+                members, member_scores = members[:self.k], member_scores[:self.k]
+            self._store(owner, members, member_scores)
+            self._listed_in.setdefault(row, set()).add(owner)
+
+    # --- querying ---
+
+    def _compute(self, row):
+        n = len(self._ids)
+        scores = (
+            (1.0 - PRICE_WEIGHT) * (self._vectors[:n] @ self._vectors[row])
+            + PRICE_WEIGHT * _price_proximity(self._log_prices[:n], self._log_prices[row])
+        )
+        scores[~self._alive[:n]] = -np.inf
+        scores[row] = -np.inf
+        k = min(self.k, len(self._rows) - 1)
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return top, scores[top]
+
+    def related(self, doc_id, limit: int = 8, compute: bool = True):
+        """
+        Ids of the `limit` (at most K) products most similar to `doc_id`, best
+        first. None for an unknown product, or when the list is not cached
+        and `compute` is false (callers move the full scan off the event loop).
+        """
+        with self._lock:
+            row = self._rows.get(str(doc_id))
+            if row is None:
+                return None
+            entry = self._neighbours.get(row)
+            if entry is not None:
+                self._neighbours.move_to_end(row)
+            elif not compute:
+                return None
+            else:
+                entry = self._compute(row)
+                self._store(row, *entry)
+                for member in entry[0].tolist():
+                    self._listed_in.setdefault(member, set()).add(row)
+                if len(self._neighbours) > self.cache_size:
+                    self._drop_list(next(iter(self._neighbours)))
+            return [self._ids[r] for r in entry[0][:limit].tolist()]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "products": len(self._rows),
+                "dims": self.dims,
+                "cached_lists": len(self._neighbours),
+                "matrix_mb": round(self._vectors.nbytes / 2**20, 1),
+            }
@@ -0,0 +1,50 @@
+# api_server/responses.py
+"""
+Fast JSON responses for Mongo documents.
+
+Returning a Response from a handler skips FastAPI's jsonable_encoder walk;
+orjson then encodes datetimes natively and ObjectIds through `_default`, so
+documents can be returned as they come out of Motor without serialize().
+Falls back to the standard json module when orjson is not installed.
+"""
+import json
+from datetime import date, datetime
+
+from bson import ObjectId
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class MongoJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def json_fragment(raw: bytes):
+    """Embeds already encoded JSON (e.g. a snapshot record) in content passed to dumps()."""
+    if orjson is not None:
+        return orjson.Fragment(raw)
+    return json.loads(raw)
+
+
+def raw_json_response(body: bytes) -> Response:
+    """Wraps an already encoded body (e.g. from a cache) without re-encoding."""
+    return Response(content=body, media_type="application/json")
@@ -0,0 +1,86 @@
+# api_server/review_stats.py
+"""
+Rating summaries, materialized on the product documents.
+
+Every product carries `rating: {count, total, mean, histogram}` (histogram
+keyed "1".."5"), so listing pages show stars without touching `reviews`.
+add_review/delete_review apply `rating_change` (one atomic pipeline update,
+which also recomputes the mean); `rating_rebuild_ops` recomputes every summary
+from the reviews collection for backfill or repair.
+"""
+from bson import ObjectId
+from pymongo import UpdateOne
+
+RATING_VALUES = (1, 2, 3, 4, 5)
+
+# upserts per bulk_write during a rebuild
+RATING_REBUILD_BATCH = 1000
+
+
+def empty_rating() -> dict:
+    return {"count": 0, "total": 0, "mean": None, "histogram": {str(r): 0 for r in RATING_VALUES}}
+
+
+def review_rating(value):
+    """The 1-5 star value of a review (None if it is not one)."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value not in RATING_VALUES:
+        return None
+    return int(value)
+
+
+def rating_change(rating: int, delta: int) -> list:
+    """Update pipeline adding (delta=1) or removing (delta=-1) one review of `rating` stars."""
+    def plus(path, amount):
+        return {"$add": [{"$ifNull": [f"${path}", 0]}, amount]}
+
+    return [
+        {"$set": {
+            "rating.count": plus("rating.count", delta),
+            "rating.total": plus("rating.total", delta * rating),
+            f"rating.histogram.{rating}": plus(f"rating.histogram.{rating}", delta),
+        }},
+        {"$set": {"rating.mean": {"$cond": [
+            {"$gt": ["$rating.count", 0]},
+            {"$divide": ["$rating.total", "$rating.count"]},
+            None,
+        ]}}},
+    ]
+
+
+# one row per (product, star value); folded by rating_summaries()
+RATING_PIPELINE = [
+    {"$match": {"rating": {"$in": list(RATING_VALUES)}}},
+    {"$group": {"_id": {"product_id": "$product_id", "rating": "$rating"}, "n": {"$sum": 1}}},
+]
+
+
+def rating_summaries(groups) -> dict:
+    """product_id -> rating summary, from RATING_PIPELINE rows."""
+    out = {}
+    for group in groups:
+        rating, n = int(group["_id"]["rating"]), group["n"]
+        summary = out.setdefault(str(group["_id"]["product_id"]), empty_rating())
+        summary["count"] += n
+        summary["total"] += rating * n
+        summary["histogram"][str(rating)] += n
+    for summary in out.values():
+        summary["mean"] = summary["total"] / summary["count"]
+    return out
+
+
+def rating_rebuild_ops(by_product: dict) -> list:
+    """Sets each product's summary; reviews for unknown/invalid product ids are skipped."""
+    return [
+        UpdateOne({"_id": ObjectId(pid)}, {"$set": {"rating": summary}})
+        for pid, summary in by_product.items()
+        if ObjectId.is_valid(pid)
+    ]
+
+
+# products whose summary is not empty; rating_reset_op applies to those without reviews left
+RATED_FILTER = {"rating.count": {"$ne": 0}}
+
+
+def rating_reset_op(product_id) -> UpdateOne:
+    """Empties one product's summary (run after the rebuild ops, for rated products with no reviews left)."""
+    return UpdateOne({"_id": product_id, **RATED_FILTER}, {"$set": {"rating": empty_rating()}})
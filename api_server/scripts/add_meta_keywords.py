@@ -1,11 +1,12 @@
-from pymongo import MongoClient
+import sys
 from datetime import datetime
-import os
+from pathlib import Path
 
-MONGO_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
-DB_NAME = os.getenv("MONGODB_DB", "TEE-TRIBE")
-client = MongoClient(MONGO_URI)
-db = client[DB_NAME]
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from db import get_db  # noqa: E402
+
+db = get_db()
 
 # set meta_keywords = [] for docs missing the field
 result = db.products.update_many(
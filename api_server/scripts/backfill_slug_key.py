@@ -0,0 +1,61 @@
+"""
+Backfill `slug_key` (normalized slug) on existing products and build its
+unique index, so GET /products/slug/{slug} resolves through an index.
+
+    python scripts/backfill_slug_key.py [--dry-run]
+
+Slugs that only differ by case would collide on the unique index; they are
+reported and left untouched so they can be renamed first.
+"""
+import argparse
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+from pymongo import UpdateOne
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from db import get_db  # noqa: E402
+from indexes import apply_indexes  # noqa: E402
+from slugs import slug_key  # noqa: E402
+
+BATCH_SIZE = 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    db = get_db()
+
+    by_key = defaultdict(list)
+    for doc in db.products.find({}, {"slug": 1}):
+        by_key[slug_key(doc.get("slug"))].append(doc["_id"])
+
+    collisions = {k: ids for k, ids in by_key.items() if len(ids) > 1 or not k}
+    for key, ids in collisions.items():
+        print(f"⚠️ slug_key {key!r} shared by {len(ids)} products: {[str(i) for i in ids]}")
+
+    ops, modified = [], 0
+    for key, ids in by_key.items():
+        if key in collisions:
+            continue
+        ops.append(UpdateOne({"_id": ids[0], "slug_key": {"$ne": key}}, {"$set": {"slug_key": key}}))
+        if len(ops) == BATCH_SIZE:
+            if not args.dry_run:
+                modified += db.products.bulk_write(ops, ordered=False).modified_count
+            ops = []
+    if ops and not args.dry_run:
+        modified += db.products.bulk_write(ops, ordered=False).modified_count
+
+    print("Products:", sum(len(ids) for ids in by_key.values()), "Modified:", modified)
+
+    if not args.dry_run:
+        apply_indexes(db, ["products"])
+        print("✅ slug_key index ready")
+
+
+if __name__ == "__main__":
+    main()
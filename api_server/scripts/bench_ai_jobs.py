@@ -0,0 +1,221 @@
+"""
+Throughput of the AI enhancement job runner against the local fake provider.
+
+    python scripts/bench_ai_jobs.py --products 2000 --workers 4 8 16 --latency-ms 50
+    python scripts/bench_ai_jobs.py --check
+
+Seeds a scratch database (MONGODB_URI, database `<MONGODB_DB>_ai_bench`, dropped
+afterwards), submits one "missing meta_keywords" job per worker count and
+reports products/min. With the fake provider the ceiling is
+workers / latency; a real provider is further capped by its rate limit.
+
+--check runs the runner's failure paths against the same fake provider
+instead and exits non-zero if one misbehaves: a job whose owner died is left
+alone until its lease expires and is then finished by another runner; failed
+items are retried up to AI_JOB_MAX_ATTEMPTS; a failed write-back fails the
+job without leaving items "running".
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import db as mongo  # noqa: E402
+from indexes import apply_indexes_async  # noqa: E402
+
+DB_NAME = mongo.DB_NAME + "_ai_bench"
+
+
+async def seed(db, names):
+    await db.products.drop()
+    await db.ai_jobs.drop()
+    await db.ai_job_items.drop()
+    await db.products.insert_many([
+        {"name": name, "category": "Graphic", "price": 1500,
+         "description": "Plain tee.", "sizes": ["M"], "colors": ["Black"]}
+        for name in names
+    ])
+
+
+async def item_statuses(db, job_id) -> Counter:
+    return Counter([i["status"] async for i in db.ai_job_items.find({"job_id": job_id}, {"status": 1})])
+
+
+async def run(args):
+    os.environ["AI_FAKE_LATENCY_MS"] = str(args.latency_ms)
+    os.environ["AI_FAKE_MAX_CONCURRENCY"] = str(max(args.workers))
+    from ai_jobs import AIJobRunner, job_summary  # the fake provider reads the env above
+
+    client = mongo.get_async_client()
+    await client.drop_database(DB_NAME)
+    db = client[DB_NAME]
+    try:
+        for workers in args.workers:
+            await seed(db, [f"Bench Tee {i}" for i in range(args.products)])
+            runner = AIJobRunner(db, db.products, workers=workers, batch_size=args.batch_size)
+            await apply_indexes_async(db, ["ai_jobs", "ai_job_items"])
+
+            start = time.perf_counter()
+            job = await runner.submit(missing_meta_keywords=True, provider="fake")
+            await runner.wait(job["_id"])
+            elapsed = time.perf_counter() - start
+
+            summary = job_summary(await runner.get(job["_id"]))
+            print(
+                f"workers={workers:<3} status={summary['status']} done={summary['done']}/{summary['total']} "
+                f"wall={elapsed:.2f}s products/min={summary['done'] * 60 / elapsed:,.0f}"
+            )
+    finally:
+        await client.drop_database(DB_NAME)
+        client.close()
+
+
+# --- --check
+
+async def check_lost_lease(db, check):
+    from ai_jobs import AIJobRunner
+
+    await seed(db, [f"Lease Tee {i}" for i in range(200)])
+    lost = AIJobRunner(db, db.products, workers=4, batch_size=10)
+    lost.owner = "lost-worker:1"
+    job = await lost.submit(missing_meta_keywords=True, provider="fake")
+    await asyncio.sleep(0.2)
+    await lost.shutdown()  # the owner dies mid-job, still holding the lease
+    before = await db.ai_jobs.find_one({"_id": job["_id"]})
+
+    runner = AIJobRunner(db, db.products, workers=4, batch_size=10)
+    await runner.resume()
+    await runner.wait(job["_id"])
+    held = await db.ai_jobs.find_one({"_id": job["_id"]})
+    check("a live lease is not taken over",
+          held["status"] == "running" and held["lease_owner"] == "lost-worker:1" and held["done"] == before["done"],
+          f"status={held['status']} owner={held.get('lease_owner')}")
+
+    await db.ai_jobs.update_one({"_id": job["_id"]}, {"$set": {"lease_until": datetime.utcnow() - timedelta(seconds=1)}})
+    await runner.resume()
+    await runner.wait(job["_id"])
+    finished = await db.ai_jobs.find_one({"_id": job["_id"]})
+    statuses = await item_statuses(db, job["_id"])
+    missing = await db.products.count_documents({"meta_keywords": {"$exists": False}})
+    check("an expired lease is resumed to completion",
+          finished["status"] == "done" and finished["done"] == job["total"] and statuses == {"done": job["total"]}
+          and missing == 0,
+          f"status={finished['status']} done={finished['done']}/{job['total']} items={dict(statuses)} "
+          f"(resumed after {before['done']} done)")
+
+
+async def check_retries(db, check):
+    import ai_enhance
+    from ai_enhance import EnhanceError, FakeProvider
+    from ai_jobs import JOB_MAX_ATTEMPTS, AIJobRunner
+
+    class FlakyProvider(FakeProvider):
+        """"Flaky" products fail on their first call, "Broken" ones on every call."""
+
+        name = "flaky"
+
+        def __init__(self):
+            super().__init__()
+            self.seen = Counter()
+
+        async def complete(self, prompt):
+            name = prompt.split("Name: ", 1)[1].split("\n", 1)[0]
+            self.seen[name] += 1
+            if name.startswith("Broken") or (name.startswith("Flaky") and self.seen[name] == 1):
+                raise EnhanceError("provider unavailable")
+            return await super().complete(prompt)
+
+    ai_enhance.PROVIDERS["flaky"] = FlakyProvider
+    await seed(db, [f"Good Tee {i}" for i in range(20)] + [f"Flaky Tee {i}" for i in range(5)]
+               + [f"Broken Tee {i}" for i in range(3)])
+    runner = AIJobRunner(db, db.products, workers=4, batch_size=5)
+    job = await runner.submit(missing_meta_keywords=True, provider="flaky")
+    await runner.wait(job["_id"])
+    finished = await db.ai_jobs.find_one({"_id": job["_id"]})
+    provider = ai_enhance.get_provider("flaky")
+
+    check("failed items are retried, then given up",
+          finished["status"] == "done" and finished["done"] == 25 and finished["failed"] == 3,
+          f"status={finished['status']} done={finished['done']} failed={finished['failed']}")
+    broken = [i async for i in db.ai_job_items.find({"job_id": job["_id"], "status": "failed"})]
+    calls = [provider.seen[f"Broken Tee {i}"] for i in range(3)]
+    check(f"a failing item is tried JOB_MAX_ATTEMPTS={JOB_MAX_ATTEMPTS} times",
+          len(broken) == 3 and all(i["attempts"] == JOB_MAX_ATTEMPTS for i in broken)
+          and calls == [JOB_MAX_ATTEMPTS] * 3,
+          f"attempts={[i['attempts'] for i in broken]} provider calls={calls}")
+    flaky = [provider.seen[f"Flaky Tee {i}"] for i in range(5)]
+    check("a transient failure succeeds on the retry", flaky == [2] * 5, f"provider calls={flaky}")
+
+
+async def check_write_back_failure(db, check):
+    from ai_jobs import AIJobRunner
+
+    await seed(db, [f"Write Tee {i}" for i in range(60)])
+    runner = AIJobRunner(db, db.products, workers=4, batch_size=10)
+    products = runner.products
+    bulk_write, calls = products.bulk_write, []
+
+    async def failing_bulk_write(ops, **kwargs):
+        calls.append(len(ops))
+        if len(calls) == 2:
+            raise RuntimeError("write-back failed")
+        return await bulk_write(ops, **kwargs)
+
+    products.bulk_write = failing_bulk_write
+    job = await runner.submit(missing_meta_keywords=True, provider="fake")
+    try:
+        await asyncio.wait_for(runner.wait(job["_id"]), timeout=30)
+    except asyncio.TimeoutError:
+        check("a failed write-back fails the job", False, "the job hung")
+        await runner.shutdown()
+        return
+    finished = await db.ai_jobs.find_one({"_id": job["_id"]})
+    statuses = await item_statuses(db, job["_id"])
+    check("a failed write-back fails the job without items left running",
+          finished["status"] == "failed" and "running" not in statuses and statuses["pending"] > 0,
+          f"status={finished['status']} items={dict(statuses)}")
+
+
+async def run_checks(args):
+    os.environ["AI_FAKE_LATENCY_MS"] = str(args.latency_ms)
+    failures = []
+
+    def check(label, ok, detail=""):
+        print(f"{'✅' if ok else '❌'} {label}" + (f" ({detail})" if detail else ""))
+        if not ok:
+            failures.append(label)
+
+    client = mongo.get_async_client()
+    await client.drop_database(DB_NAME)
+    db = client[DB_NAME]
+    try:
+        for scenario in (check_lost_lease, check_retries, check_write_back_failure):
+            await scenario(db, check)
+    finally:
+        await client.drop_database(DB_NAME)
+        client.close()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--check", action="store_true", help="run the failure-path checks instead of the benchmark")
+    args = parser.parse_args()
+    if args.check:
+        failures = asyncio.run(run_checks(args))
+        sys.exit(1 if failures else 0)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
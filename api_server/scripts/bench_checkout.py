@@ -0,0 +1,215 @@
+"""
+Checkout latency under concurrency: POST /payments/stripe/create-session
+with small random carts against a running API backed by the Stripe stand-in.
+
+    python scripts/stripe_standin.py --latency-ms 120 &
+    STRIPE_API_BASE=http://localhost:12111 STRIPE_SECRET_KEY=sk_test_local uvicorn main:app --port 8000
+    python scripts/bench_checkout.py --concurrency 100 --duration 20
+
+The old handler called the sync Stripe SDK inside the event loop, so
+concurrent checkouts queued behind each other's Stripe round trips; compare
+req/s and p99 between builds with the same stand-in latency. The first pass
+over each SKU also creates its Stripe Price, later ones reuse the cached ID.
+
+    python scripts/bench_checkout.py --check
+
+--check needs no running API: it serves the stand-in in-process and checks
+the Price ID cache (miss, hit, hit from another worker through Mongo, rename,
+concurrent first checkouts; scratch database `<MONGODB_DB>_checkout_check`)
+and the client's retries (5xx retried, 4xx not, idempotent replays), exiting
+non-zero if one fails.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+from loadtest import discover, percentile
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import db as mongo  # noqa: E402
+from payments import StripeClient, StripeError, StripePriceCache  # noqa: E402
+
+CHECK_DB_NAME = mongo.DB_NAME + "_checkout_check"
+
+
+async def worker(client, products, deadline, latencies, errors):
+    while time.perf_counter() < deadline:
+        cart = [
+            {"id": p["_id"], "name": p["name"], "price": p["price"], "quantity": random.randint(1, 3)}
+            for p in random.sample(products, k=min(len(products), random.randint(1, 3)))
+        ]
+        t0 = time.perf_counter()
+        try:
+            r = await client.post("/payments/stripe/create-session", json={"items": cart, "user_id": "bench"})
+            if r.status_code >= 400:
+                errors.append(r.status_code)
+        except httpx.HTTPError:
+            errors.append("network")
+        latencies.append((time.perf_counter() - t0) * 1000)
+
+
+async def run(args):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        products = await discover(client)
+        latencies, errors = [], []
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*(
+            worker(client, products, deadline, latencies, errors) for _ in range(args.concurrency)
+        ))
+        elapsed = time.perf_counter() - started
+
+    summary = {
+        "label": args.label,
+        "concurrency": args.concurrency,
+        "duration_s": round(elapsed, 2),
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+    }
+    print(f"{args.label}: {summary['requests']} checkouts in {summary['duration_s']}s "
+          f"-> {summary['rps']} req/s, p50 {summary['p50_ms']} ms, p95 {summary['p95_ms']} ms, "
+          f"p99 {summary['p99_ms']} ms, {summary['errors']} errors")
+    if args.json:
+        with open(args.json, "a", encoding="utf-8") as f:
+            f.write(json.dumps(summary) + "\n")
+
+
+# --- --check
+
+async def check_price_cache(stripe, standin, col, check):
+    standin.stats.clear()
+    cache = StripePriceCache(col, stripe)
+    first = await cache.price_id("p1", "Check Tee", 1500, "usd")
+    again = await cache.price_id("p1", "Check Tee", 1500, "usd")
+    check("price cache: a miss creates the Price, a hit reuses it",
+          standin.stats["prices"] == 1 and again == first, f"creates={standin.stats['prices']}")
+
+    other_worker = await StripePriceCache(col, stripe).price_id("p1", "Check Tee", 1500, "usd")
+    check("price cache: another worker reuses the stored Price",
+          other_worker == first and standin.stats["prices"] == 1, f"creates={standin.stats['prices']}")
+
+    repriced = await cache.price_id("p1", "Check Tee", 1800, "usd")
+    renamed = await cache.price_id("p1", "Check Tee v2", 1500, "usd")
+    check("price cache: a new amount or name is a miss",
+          len({first, repriced, renamed}) == 3 and standin.stats["prices"] == 3, f"creates={standin.stats['prices']}")
+
+    rush = await asyncio.gather(*(cache.price_id("p2", "Rush Tee", 900, "usd") for _ in range(20)))
+    check("price cache: concurrent first checkouts create one Price",
+          len(set(rush)) == 1 and standin.stats["prices"] == 4, f"creates={standin.stats['prices'] - 3}")
+    return first
+
+
+async def check_retries(stripe, standin, base_url, price_id, check):
+    params = {
+        "mode": "payment",
+        "line_items": [{"price": price_id, "quantity": 1}],
+        "success_url": "http://localhost/success",
+        "cancel_url": "http://localhost/cancel",
+    }
+    standin.stats.clear()
+    standin.config["fail_next"] = stripe.max_retries
+    try:
+        session = await stripe.create_checkout_session(params)
+        ok = session["id"].startswith("cs_")
+    except StripeError:
+        ok = False
+    check(f"retries: {stripe.max_retries} 5xx answers are retried",
+          ok and standin.stats["sessions"] == stripe.max_retries + 1, f"calls={standin.stats['sessions']}")
+
+    standin.stats.clear()
+    standin.config["fail_next"] = stripe.max_retries + 1
+    try:
+        await stripe.create_checkout_session(params)
+        status = None
+    except StripeError as e:
+        status = e.status_code
+    check("retries: the error surfaces once retries run out",
+          status == 500 and standin.stats["sessions"] == stripe.max_retries + 1,
+          f"status={status} calls={standin.stats['sessions']}")
+    standin.config["fail_next"] = 0  # left over if the client stopped retrying early
+
+    standin.stats.clear()
+    bad_key = StripeClient("rk_invalid", base_url=base_url, max_retries=stripe.max_retries, backoff=0.01)
+    try:
+        await bad_key.create_checkout_session(params)
+        status = None
+    except StripeError as e:
+        status = e.status_code
+    finally:
+        await bad_key.close()
+    check("retries: a 4xx is not retried", status == 401 and standin.stats["sessions"] == 1,
+          f"status={status} calls={standin.stats['sessions']}")
+
+    standin.stats.clear()
+    first = await stripe.create_checkout_session(params, idempotency_key="check-replay")
+    again = await stripe.create_checkout_session(params, idempotency_key="check-replay")
+    check("retries: a replayed idempotency key returns the first session",
+          first["id"] == again["id"] and standin.stats["sessions_replayed"] == 1)
+
+
+async def run_checks(args):
+    import uvicorn
+
+    import stripe_standin as standin
+
+    failures = []
+
+    def check(label, ok, detail=""):
+        print(f"{'✅' if ok else '❌'} {label}" + (f" ({detail})" if detail else ""))
+        if not ok:
+            failures.append(label)
+
+    server = uvicorn.Server(uvicorn.Config(standin.app, host="127.0.0.1", port=args.standin_port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        if serving.done():
+            raise SystemExit(f"Could not start the Stripe stand-in on port {args.standin_port}")
+        await asyncio.sleep(0.01)
+
+    base_url = f"http://127.0.0.1:{args.standin_port}"
+    stripe = StripeClient("sk_test_local", base_url=base_url, max_retries=2, backoff=0.01)
+    client = mongo.get_async_client()
+    await client.drop_database(CHECK_DB_NAME)
+    try:
+        price_id = await check_price_cache(stripe, standin, client[CHECK_DB_NAME].stripe_prices, check)
+        await check_retries(stripe, standin, base_url, price_id, check)
+    finally:
+        await stripe.close()
+        await client.drop_database(CHECK_DB_NAME)
+        client.close()
+        server.should_exit = True
+        await serving
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--label", default="checkout")
+    parser.add_argument("--json", default=None, help="append the summary as a JSON line to this file")
+    parser.add_argument("--check", action="store_true", help="run the price cache and retry checks instead")
+    parser.add_argument("--standin-port", type=int, default=12112, help="port for the in-process stand-in (--check)")
+    args = parser.parse_args()
+    if args.check:
+        failures = asyncio.run(run_checks(args))
+        sys.exit(1 if failures else 0)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark: related-products index build, neighbour queries and writes.
+
+    python scripts/bench_related.py --sizes 1000 10000 100000
+
+cold = neighbour list computed (full scan of the matrix), warm = served from
+the cached list, upsert = re-indexing one product while --cached lists are
+held (each one is checked against the changed product).
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench_search import synthetic_products  # noqa: E402
+from related_index import DIMS, RelatedProductsIndex  # noqa: E402
+
+COLORS = ["black", "white", "grey", "navy", "maroon", "olive", "sand"]
+
+
+def catalog(n, seed=42):
+    rng = random.Random(seed)
+    docs = list(synthetic_products(n, seed=seed))
+    for doc in docs:
+        doc["colors"] = rng.sample(COLORS, rng.randint(1, 3))
+    return docs
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--dims", type=int, default=DIMS)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--cached", type=int, default=5_000, help="neighbour lists held while timing upserts")
+    args = parser.parse_args()
+
+    print(
+        f"{'products':>10} {'build ms':>10} {'matrix MB':>10} {'cold p50':>10} {'cold p95':>10}"
+        f" {'warm p50':>10} {'upsert p50':>11} {'upsert p95':>11} {'same cat':>9}"
+    )
+    for n in args.sizes:
+        docs = catalog(n)
+        rng = random.Random(7)
+        index = RelatedProductsIndex(dims=args.dims)
+        t0 = time.perf_counter()
+        index.rebuild(docs)
+        build_ms = (time.perf_counter() - t0) * 1000
+
+        by_id = {str(d["_id"]): d for d in docs}
+        sample = rng.sample(docs, min(args.queries, n))
+        cold, warm, same = [], [], []
+        for doc in sample:
+            t0 = time.perf_counter()
+            ids = index.related(doc["_id"], 8)
+            cold.append((time.perf_counter() - t0) * 1000)
+            t0 = time.perf_counter()
+            index.related(doc["_id"], 8)
+            warm.append((time.perf_counter() - t0) * 1000)
+            same.append(sum(by_id[i]["category"] == doc["category"] for i in ids) / max(len(ids), 1))
+
+        for doc in rng.sample(docs, min(args.cached, n)):
+            index.related(doc["_id"], 8)
+        upserts = []
+        for doc in rng.sample(docs, min(args.queries, n)):
+            changed = {**doc, "price": doc["price"] + 100, "meta_keywords": doc["meta_keywords"][:-1]}
+            t0 = time.perf_counter()
+            index.upsert(changed)
+            upserts.append((time.perf_counter() - t0) * 1000)
+
+        cold_p50, cold_p95 = percentiles(cold)
+        up_p50, up_p95 = percentiles(upserts)
+        print(
+            f"{n:>10} {build_ms:10.0f} {index.stats()['matrix_mb']:10.1f} {cold_p50:10.2f} {cold_p95:10.2f}"
+            f" {statistics.median(warm):10.3f} {up_p50:11.2f} {up_p95:11.2f} {statistics.mean(same):9.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Benchmark: inverted-index search vs the legacy regex scan.
+
+    python scripts/bench_search.py --sizes 1000 10000 100000 300000
+
+The regex path is measured the way Mongo executes it without a usable index:
+every document's name, description, category and meta_keywords are tested
+against an unanchored case-insensitive pattern. Pass --mongo-uri to also time
+the real `$regex` query against a scratch collection.
+"""
+import argparse
+import random
+import re
+import statistics
+import sys
+import time
+from itertools import accumulate
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bson import ObjectId  # noqa: E402
+from search_index import ProductSearchIndex  # noqa: E402
+
+SYLLABLES = "ne on ge o tri bal fla me ur ban ty po gra phy ab st wa ve di gi ta ri ko sa lu mi zen".split()
+CATEGORIES = ["Graphic", "Tribal", "Typography", "Abstract", "Minimal", "Vintage", "Anime", "Street"]
+
+
+def vocabulary(size=4000, seed=7):
+    """Pseudo-words; list position doubles as frequency rank."""
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))))
+    words = sorted(words)
+    rng.shuffle(words)
+    return words
+
+
+WORDS = vocabulary()
+# Zipf-like: the word at rank r appears with probability ~ 1/r
+CUM_WEIGHTS = list(accumulate(1 / (rank + 1) for rank in range(len(WORDS))))
+
+# head, torso and tail terms, a two-term query and a prefix
+QUERIES = [WORDS[3], WORDS[150], WORDS[2500], f"{WORDS[10]} {WORDS[40]}", WORDS[20][:3]]
+
+
+def synthetic_products(n, seed=42):
+    rng = random.Random(seed)
+
+    def words(k):
+        return " ".join(rng.choices(WORDS, cum_weights=CUM_WEIGHTS, k=k))
+
+    for i in range(n):
+        name = words(2).title()
+        yield {
+            "_id": ObjectId(),
+            "name": name,
+            "slug": f"{name.lower().replace(' ', '-')}-{i}",
+            "description": words(14).capitalize() + ".",
+            "category": rng.choice(CATEGORIES),
+            "meta_keywords": [words(3) for _ in range(rng.randint(0, 6))],
+            "price": float(rng.randrange(1500, 6000, 100)),
+        }
+
+
+def regex_scan(docs, q, categories=None, min_price=None, max_price=None):
+    pattern = re.compile(re.escape(q), re.IGNORECASE)
+    hits = []
+    for d in docs:
+        if categories and d["category"] not in categories:
+            continue
+        if min_price is not None and d["price"] < min_price:
+            continue
+        if max_price is not None and d["price"] > max_price:
+            continue
+        if (
+            pattern.search(d["name"])
+            or pattern.search(d["description"])
+            or pattern.search(d["category"])
+            or any(pattern.search(k) for k in d["meta_keywords"])
+        ):
+            hits.append(d["_id"])
+    return hits
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def bench_mongo(uri, docs, repeat):
+    from pymongo import MongoClient
+
+    from db import client_options
+
+    col = MongoClient(uri, **client_options())["TEE-TRIBE-bench"]["products"]
+    col.drop()
+    col.insert_many(docs)
+    results = {}
+    for q in QUERIES:
+        pattern = re.escape(q)
+        query = {"$or": [
+            {"name": {"$regex": pattern, "$options": "i"}},
+            {"description": {"$regex": pattern, "$options": "i"}},
+            {"category": {"$regex": pattern, "$options": "i"}},
+            {"meta_keywords": {"$elemMatch": {"$regex": pattern, "$options": "i"}}},
+        ]}
+        results[q] = timed(lambda: (col.count_documents(query), list(col.find(query).limit(120))), repeat)
+    col.drop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--mongo-uri", default=None, help="also time the $regex query on a real mongod")
+    args = parser.parse_args()
+
+    print(
+        f"{'products':>10} {'query':>14} {'cold ms':>10} {'warm ms':>10}"
+        f" {'regex ms':>10} {'mongo ms':>10} {'hits':>8}"
+    )
+    for n in args.sizes:
+        docs = list(synthetic_products(n))
+        index = ProductSearchIndex()
+        t0 = time.perf_counter()
+        index.rebuild(docs)
+        build_ms = (time.perf_counter() - t0) * 1000
+
+        mongo = bench_mongo(args.mongo_uri, docs, args.repeat) if args.mongo_uri else {}
+        for q in QUERIES:
+            # cold: ranking recomputed; warm: ranked list reused, filters re-applied
+            cold_ms = timed(lambda: (index._ranked.clear(), index.search(q, limit=120)), args.repeat)
+            warm_ms = timed(lambda: index.search(q, categories=CATEGORIES[:3], limit=120), args.repeat)
+            rx_ms = timed(lambda: regex_scan(docs, q), max(1, args.repeat // 2))
+            total, _ = index.search(q, limit=0)
+            mongo_ms = f"{mongo[q]:10.2f}" if q in mongo else f"{'-':>10}"
+            print(f"{n:>10} {q:>14} {cold_ms:10.2f} {warm_ms:10.2f} {rx_ms:10.2f} {mongo_ms} {total:>8}")
+        print(f"{n:>10} {'(build)':>14} {build_ms:10.0f}")
+
+
+if __name__ == "__main__":
+    main()
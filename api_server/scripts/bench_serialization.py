@@ -0,0 +1,94 @@
+"""
+Serialization cost of one product listing page, before and after `fields=`
+projections and the orjson response path.
+
+    python scripts/bench_serialization.py [--items 120] [--rounds 2000]
+
+before:  serialize() + jsonable_encoder + json.dumps (FastAPI's default path)
+after:   responses.dumps on the raw Motor documents, full and per preset
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bson import ObjectId  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+from projections import PRODUCT_PRESETS, apply_projection  # noqa: E402
+from responses import dumps, orjson  # noqa: E402
+
+WORDS = "neon tribal graphic cotton oversized vintage street abstract bold soft premium classic".split()
+
+
+def synthetic_page(n, seed=1):
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    for i in range(n):
+        name = " ".join(rng.choices(WORDS, k=3)).title()
+        yield {
+            "_id": ObjectId(),
+            "frontendId": f"p{i}",
+            "name": name,
+            "slug": name.lower().replace(" ", "-") + f"-{i}",
+            "slug_key": name.lower().replace(" ", "-") + f"-{i}",
+            "price": float(rng.randint(1500, 6000)),
+            "image": f"/assets/product-{i % 12 + 1}.jpg",
+            "category": rng.choice(["Graphic", "Tribal", "Typography", "Abstract"]),
+            "description": " ".join(rng.choices(WORDS, k=160)),
+            "enhanced_description": " ".join(rng.choices(WORDS, k=160)),
+            "sizes": ["S", "M", "L", "XL"],
+            "colors": ["Black", "White", "Navy"],
+            "meta_keywords": [" ".join(rng.choices(WORDS, k=3)) for _ in range(12)],
+            "createdAt": now - timedelta(days=i),
+            "updatedAt": now,
+        }
+
+
+def fastapi_default(items):
+    page = {"items": [dict(d, _id=str(d["_id"])) for d in items], "total": 5000, "page": 1, "limit": len(items)}
+    return json.dumps(
+        jsonable_encoder(page), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def fast(items):
+    return dumps({"items": items, "total": 5000, "page": 1, "limit": len(items)})
+
+
+def timed(fn, items, rounds):
+    fn(items)  # warm-up
+    start = time.perf_counter()
+    for _ in range(rounds):
+        body = fn(items)
+    return (time.perf_counter() - start) / rounds * 1e6, len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=120)
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    docs = list(synthetic_page(args.items))
+    print(f"encoder: {'orjson' if orjson else 'json (orjson not installed)'}, {args.items} items/page")
+    print(f"{'variant':<28}{'µs/page':>10}{'bytes':>10}")
+
+    base_us, size = timed(fastapi_default, docs, args.rounds)
+    print(f"{'before (jsonable_encoder)':<28}{base_us:>10.0f}{size:>10}")
+    for preset, projection in [("after, full doc", None)] + [
+        (f"after, fields={name}", PRODUCT_PRESETS[name]) for name in ("detail", "card")
+    ]:
+        # the projection runs in Mongo in the real handler; it is applied up front here
+        items = [apply_projection(d, projection) for d in docs]
+        us, size = timed(fast, items, args.rounds)
+        print(f"{preset:<28}{us:>10.0f}{size:>10}   {base_us / us:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
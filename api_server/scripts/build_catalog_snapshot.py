@@ -0,0 +1,62 @@
+"""
+Write the read-only catalog snapshot that API workers serve from when
+CATALOG_SNAPSHOT points at it (see catalog_snapshot.py).
+
+    python scripts/build_catalog_snapshot.py --out /var/lib/teetribe/catalog.snap
+    python scripts/build_catalog_snapshot.py --every 30   # keep rebuilding
+
+The file is replaced atomically; workers pick up the new one within
+CATALOG_SNAPSHOT_POLL seconds. With this running, set
+CATALOG_SNAPSHOT_REBUILD=0 on the workers.
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from catalog_snapshot import SnapshotWriter, categories_body  # noqa: E402
+from db import get_db  # noqa: E402
+
+
+def build(db, path: str):
+    started = time.perf_counter()
+    writer = SnapshotWriter(path)
+    try:
+        for doc in db.products.find({}).sort("_id", 1).batch_size(1000):
+            writer.add(doc)
+        body = categories_body(db.categories.find({}))
+    except BaseException:
+        writer.abort()
+        raise
+    installed = writer.finish(body)
+    state = "written" if installed else "discarded (a newer snapshot is in place)"
+    size = os.path.getsize(path) / 1e6 if installed else 0
+    print(f"🗂️ {len(writer)} products {state} in {time.perf_counter() - started:.2f}s ({size:.1f} MB)")
+    if writer.skipped:
+        print(f"⚠️ {writer.skipped} products without an ObjectId _id were skipped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default=os.getenv("CATALOG_SNAPSHOT", "catalog.snap"))
+    parser.add_argument("--every", type=float, help="rebuild every N seconds until interrupted")
+    args = parser.parse_args()
+
+    db = get_db()
+    while True:
+        try:
+            build(db, args.out)
+        except Exception as e:
+            if not args.every:
+                raise
+            print("❌ Snapshot build failed:", e)
+        if not args.every:
+            break
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    main()
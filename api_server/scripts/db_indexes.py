@@ -0,0 +1,83 @@
+"""
+Apply, check and audit the index registry (indexes.py).
+
+    python scripts/db_indexes.py apply [--collection products ...] [--constraints-only]
+    python scripts/db_indexes.py drift     # exit 1 when indexes differ from the registry
+    python scripts/db_indexes.py audit     # exit 1 when an endpoint query scans a collection
+
+Run `apply` on deploy and `drift` + `audit` in CI against a seeded database
+(e.g. `python -m bench seed` then MONGODB_DB=TEE-TRIBE-bench); plans on
+empty or tiny collections are not representative.
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from db import DB_NAME, get_db  # noqa: E402
+from indexes import INDEXES, apply_indexes, audit_queries, index_drift  # noqa: E402
+
+
+def drift_command(db, args):
+    drift = index_drift(db, args.collection)
+    for name, diff in drift.items():
+        for model in diff["missing"]:
+            print(f"❌ {name}.{model.document['name']} is missing")
+        for c in diff["changed"]:
+            print(f"❌ {name}.{c['name']} differs: {c['actual']} (declared {c['declared']})")
+        for e in diff["extra"]:
+            hint = f", redundant with {e['redundant_with']}" if e["redundant_with"] else ""
+            print(f"⚠️ {name}.{e['name']} is not in the registry{hint}")
+    # extra indexes cost writes but break nothing
+    failed = any(diff["missing"] or diff["changed"] for diff in drift.values())
+    print("❌ Index drift" if failed else "✅ Indexes match the registry")
+    return 1 if failed else 0
+
+
+def audit_command(db, args):
+    results = audit_queries(db)
+    marks = {"ok": "✅", "allowed": "ℹ️", "scan": "❌", "error": "❌", "skipped": "⚠️"}
+    for r in results:
+        if not args.verbose and r["status"] == "ok" and not r.get("blocking_sort"):
+            continue
+        detail = r.get("error") or r.get("reason") or " > ".join(r.get("stages", []))
+        sort = " (in-memory SORT)" if r.get("blocking_sort") else ""
+        print(f"{marks[r['status']]} {r['endpoint']:<48} {r['collection']:<16} {detail}{sort}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, default=str)
+    failed = [r for r in results if r["status"] in ("scan", "error")]
+    print(f"❌ {len(failed)} of {len(results)} query shapes scan or failed to explain" if failed
+          else f"✅ {len(results)} query shapes use an index")
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name in ("apply", "drift"):
+        p = sub.add_parser(name)
+        p.add_argument("--collection", action="append", choices=sorted(INDEXES),
+                       help="limit to these collections (repeatable)")
+        if name == "apply":
+            p.add_argument("--constraints-only", action="store_true", help="only unique and TTL indexes")
+    audit_p = sub.add_parser("audit")
+    audit_p.add_argument("--verbose", action="store_true", help="also list the shapes that pass")
+    audit_p.add_argument("--json", help="write every result to this file")
+    args = parser.parse_args()
+
+    db = get_db()
+    print(f"🗄️ {DB_NAME}")
+    if args.command == "apply":
+        apply_indexes(db, args.collection, args.constraints_only)
+        print("✅ Indexes applied")
+        return 0
+    if args.command == "drift":
+        return drift_command(db, args)
+    return audit_command(db, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""
+HTTP load test for the storefront read/write mix.
+
+    uvicorn main:app --port 8000 --workers 1
+    python scripts/loadtest.py --url http://localhost:8000 --concurrency 500 --duration 30
+
+Run it once against the old sync build and once against the async build
+(same worker count, same mongod) and compare the requests/sec and p99 lines.
+Use --json to append the summary to a results file.
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from collections import defaultdict
+
+import httpx
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    k = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[k]
+
+
+async def discover(client):
+    """Picks real slugs/ids from the running server so requests hit data."""
+    r = await client.get("/products", params={"limit": 50})
+    r.raise_for_status()
+    items = r.json().get("items", [])
+    if not items:
+        raise SystemExit("No products returned by /products; seed the database first (python db_setup.py)")
+    return items
+
+
+def scenario(products):
+    """Weighted request mix; mostly catalog reads, like real traffic."""
+    p = random.choice(products)
+    user = f"load-user-{random.randint(1, 200)}"
+    return random.choices(
+        [
+            ("products", "GET", "/products", {"limit": 24}, None),
+            ("search", "GET", "/products", {"q": p["name"].split()[0], "limit": 24}, None),
+            ("slug", "GET", f"/products/slug/{p['slug']}", None, None),
+            ("reviews", "GET", f"/reviews/{p['_id']}", None, None),
+            ("cart_get", "GET", f"/cart/{user}", None, None),
+            ("cart_save", "POST", f"/cart/{user}", None, {"items": [
+                {"id": p["_id"], "name": p["name"], "price": p["price"], "size": "M", "quantity": 1, "image": p.get("image", "")}
+            ]}),
+            ("orders", "GET", f"/orders/{user}", None, None),
+        ],
+        weights=[35, 15, 25, 10, 6, 5, 4],
+    )[0]
+
+
+async def worker(client, products, deadline, latencies, errors):
+    while time.perf_counter() < deadline:
+        name, method, path, params, body = scenario(products)
+        t0 = time.perf_counter()
+        try:
+            r = await client.request(method, path, params=params, json=body)
+            if r.status_code >= 500:
+                errors[name] += 1
+        except httpx.HTTPError:
+            errors[name] += 1
+        latencies[name].append((time.perf_counter() - t0) * 1000)
+
+
+async def run(args):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        products = await discover(client)
+        latencies = defaultdict(list)
+        errors = defaultdict(int)
+
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*(
+            worker(client, products, deadline, latencies, errors) for _ in range(args.concurrency)
+        ))
+        elapsed = time.perf_counter() - started
+
+    all_samples = [x for samples in latencies.values() for x in samples]
+    summary = {
+        "label": args.label,
+        "url": args.url,
+        "concurrency": args.concurrency,
+        "duration_s": round(elapsed, 2),
+        "requests": len(all_samples),
+        "errors": sum(errors.values()),
+        "rps": round(len(all_samples) / elapsed, 1),
+        "p50_ms": round(percentile(all_samples, 50), 2),
+        "p99_ms": round(percentile(all_samples, 99), 2),
+        "endpoints": {
+            name: {
+                "requests": len(samples),
+                "errors": errors[name],
+                "mean_ms": round(statistics.fmean(samples), 2),
+                "p50_ms": round(percentile(samples, 50), 2),
+                "p99_ms": round(percentile(samples, 99), 2),
+            }
+            for name, samples in sorted(latencies.items())
+        },
+    }
+
+    print(f"{args.label}: {summary['requests']} requests in {summary['duration_s']}s "
+          f"-> {summary['rps']} req/s, p50 {summary['p50_ms']} ms, p99 {summary['p99_ms']} ms, "
+          f"{summary['errors']} errors")
+    for name, stats in summary["endpoints"].items():
+        print(f"  {name:<10} {stats['requests']:>7} req  p50 {stats['p50_ms']:>8} ms  p99 {stats['p99_ms']:>8} ms")
+
+    if args.json:
+        with open(args.json, "a", encoding="utf-8") as f:
+            f.write(json.dumps(summary) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--label", default="run")
+    parser.add_argument("--json", default=None, help="append the summary as a JSON line to this file")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Bulk product import/export (NDJSON or CSV), streamed in constant memory.
+
+    python scripts/products_io.py import catalog.ndjson [--format ndjson|csv] [--batch-size 1000]
+    python scripts/products_io.py export catalog.csv [--format csv] [--category Graphic]
+
+The format defaults to the file extension. Import upserts by slug (rows
+only touch the fields they carry), reports rejected rows by line number and
+recomputes category counts afterwards. Running API workers rebuild their
+search index and slug map on restart, or right away with
+CATALOG_CHANGE_STREAM=1; POST /admin/products/import does both itself.
+Use `-` for stdin/stdout.
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from category_counts import COUNT_PIPELINE, rebuild_counts  # noqa: E402
+from db import get_db  # noqa: E402
+from product_io import BATCH_SIZE, EXPORT_PROJECTION, FORMATS, export_lines, run_import  # noqa: E402
+
+
+def detect_format(path: str, fmt: str) -> str:
+    fmt = fmt or Path(path).suffix.lstrip(".").lower().replace("jsonl", "ndjson")
+    if fmt not in FORMATS:
+        sys.exit(f"❌ Unknown format '{fmt}', pass --format {'|'.join(FORMATS)}")
+    return fmt
+
+
+def import_file(db, args):
+    fmt = detect_format(args.path, args.format)
+    start = time.perf_counter()
+    f = sys.stdin if args.path == "-" else open(args.path, encoding="utf-8", newline="")
+    with f:
+        report = run_import(db.products, f, fmt, args.batch_size).as_dict()
+    elapsed = time.perf_counter() - start
+
+    for error in report["errors"]:
+        print(f"⚠️ line {error['line']}: {error['error']}", file=sys.stderr)
+    rebuild_counts(db.categories, db.products.aggregate(COUNT_PIPELINE))
+    print(json.dumps({k: v for k, v in report.items() if k != "errors"}))
+    print(f"✅ {report['rows']} rows in {elapsed:.1f}s ({report['rows'] / max(elapsed, 1e-9):,.0f} rows/s)")
+
+
+def export_file(db, args):
+    fmt = detect_format(args.path, args.format)
+    query = {"category": args.category} if args.category else {}
+    docs = db.products.find(query, EXPORT_PROJECTION).sort("_id", 1).batch_size(1000)
+    f = sys.stdout if args.path == "-" else open(args.path, "w", encoding="utf-8", newline="")
+    count = 0
+    with f:
+        for line in export_lines(docs, fmt):
+            f.write(line)
+            count += 1
+    print(f"✅ Exported {count - (fmt == 'csv')} products", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import")
+    imp.add_argument("path")
+    imp.add_argument("--format", choices=sorted(FORMATS))
+    imp.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    exp = sub.add_parser("export")
+    exp.add_argument("path")
+    exp.add_argument("--format", choices=sorted(FORMATS))
+    exp.add_argument("--category")
+    args = parser.parse_args()
+
+    db = get_db()
+    if args.command == "import":
+        import_file(db, args)
+    else:
+        export_file(db, args)
+
+
+if __name__ == "__main__":
+    main()
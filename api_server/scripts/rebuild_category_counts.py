@@ -0,0 +1,20 @@
+"""
+Recompute the materialized `productCount` on every category from the
+products collection (one $group), creating categories that only exist on
+products and zeroing empty ones.
+
+    python scripts/rebuild_category_counts.py
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from category_counts import COUNT_PIPELINE, rebuild_counts  # noqa: E402
+from db import get_db  # noqa: E402
+
+db = get_db()
+
+groups = list(db.products.aggregate(COUNT_PIPELINE))
+upserted, modified = rebuild_counts(db.categories, groups)
+print("Categories with products:", len(groups), "Upserted:", upserted, "Modified:", modified)
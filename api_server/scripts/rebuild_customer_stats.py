@@ -0,0 +1,45 @@
+"""
+Recompute the materialized order stats on every customer (total_orders,
+lifetime_value, first/last order) from the orders collection, creating
+customers that only exist on orders and zeroing those with no orders left.
+
+    python scripts/rebuild_customer_stats.py
+
+Customers sharing an email (case-insensitively) would collide on the
+unique `email_key` index; they are reported so they can be merged first.
+"""
+import sys
+from pathlib import Path
+
+from bson import ObjectId
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from db import get_db  # noqa: E402
+from customer_stats import KEY_BACKFILL, REBUILD_BATCH, STATS_PIPELINE, rebuild_op, reset_op  # noqa: E402
+
+db = get_db()
+
+db.customers.bulk_write([KEY_BACKFILL])
+duplicates = list(db.customers.aggregate([
+    {"$group": {"_id": "$email_key", "ids": {"$push": "$_id"}, "n": {"$sum": 1}}},
+    {"$match": {"n": {"$gt": 1}}},
+]))
+for dup in duplicates:
+    print(f"⚠️ email_key {dup['_id']!r} shared by {dup['n']} customers: {[str(i) for i in dup['ids']]}")
+
+run_id = ObjectId()
+ops, customers, upserted, modified = [], 0, 0, 0
+for group in db.orders.aggregate(STATS_PIPELINE, allowDiskUse=True):
+    customers += 1
+    ops.append(rebuild_op(group, run_id))
+    if len(ops) == REBUILD_BATCH:
+        result = db.customers.bulk_write(ops, ordered=False)
+        upserted, modified = upserted + result.upserted_count, modified + result.modified_count
+        ops = []
+if ops:
+    result = db.customers.bulk_write(ops, ordered=False)
+    upserted, modified = upserted + result.upserted_count, modified + result.modified_count
+# customers the run did not stamp have no orders left
+modified += db.customers.bulk_write([reset_op(run_id)]).modified_count
+print("Customers with orders:", customers, "Upserted:", upserted, "Modified:", modified)
@@ -0,0 +1,37 @@
+"""
+Recompute the rating summary (count, mean, 1-5 histogram) on every product
+from the reviews collection, emptying it on products with no reviews left.
+
+    python scripts/rebuild_ratings.py
+
+Running API workers serve cached product pages for up to CATALOG_CACHE_TTL
+afterwards; POST /admin/reviews/rebuild-ratings also clears the cache.
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from db import get_db  # noqa: E402
+from review_stats import (  # noqa: E402
+    RATED_FILTER, RATING_PIPELINE, RATING_REBUILD_BATCH, rating_rebuild_ops, rating_reset_op, rating_summaries,
+)
+
+db = get_db()
+
+by_product = rating_summaries(db.reviews.aggregate(RATING_PIPELINE, allowDiskUse=True))
+ops = rating_rebuild_ops(by_product)
+orphaned = len(by_product) - len(ops)
+if orphaned:
+    print(f"⚠️ {orphaned} review product_ids are not valid ObjectIds and were skipped")
+
+modified = 0
+for i in range(0, len(ops), RATING_REBUILD_BATCH):
+    modified += db.products.bulk_write(ops[i:i + RATING_REBUILD_BATCH], ordered=False).modified_count
+stale = [
+    rating_reset_op(p["_id"]) for p in db.products.find(RATED_FILTER, {"_id": 1})
+    if str(p["_id"]) not in by_product
+]
+for i in range(0, len(stale), RATING_REBUILD_BATCH):
+    modified += db.products.bulk_write(stale[i:i + RATING_REBUILD_BATCH], ordered=False).modified_count
+print("Products with reviews:", len(by_product), "Modified:", modified)
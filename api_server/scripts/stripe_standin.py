@@ -0,0 +1,97 @@
+"""
+Local stand-in for the parts of the Stripe API checkout uses
+(POST /v1/prices, POST /v1/checkout/sessions), with injectable latency and
+failures, for benchmarking and exercising retries without the network.
+
+    python scripts/stripe_standin.py --port 12111 --latency-ms 120 --fail-rate 0.05
+    STRIPE_API_BASE=http://localhost:12111 STRIPE_SECRET_KEY=sk_test_local uvicorn main:app
+
+Idempotency-Key replays return the first response, like Stripe.
+GET /stats shows request, failure and replay counts. config["fail_next"]
+answers the next N calls with a 500 (scripts/bench_checkout.py --check).
+"""
+import argparse
+import asyncio
+import random
+import uuid
+from collections import Counter
+from urllib.parse import parse_qsl
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+app = FastAPI()
+config = {"latency_ms": 0.0, "jitter_ms": 0.0, "fail_rate": 0.0, "fail_next": 0}
+stats = Counter()
+replays = {}
+
+
+async def handle(request: Request, kind: str, build):
+    stats[kind] += 1
+    auth = request.headers.get("authorization", "")
+    if not auth.startswith("Bearer sk_"):
+        return JSONResponse({"error": {"message": "Invalid API Key provided"}}, status_code=401)
+
+    await asyncio.sleep((config["latency_ms"] + random.uniform(0, config["jitter_ms"])) / 1000)
+    fail_next = config["fail_next"] > 0
+    config["fail_next"] -= fail_next
+    if fail_next or random.random() < config["fail_rate"]:
+        stats[f"{kind}_failed"] += 1
+        return JSONResponse({"error": {"message": "Injected failure"}}, status_code=500)
+
+    key = request.headers.get("idempotency-key")
+    if key and key in replays:
+        stats[f"{kind}_replayed"] += 1
+        return replays[key]
+    form = dict(parse_qsl((await request.body()).decode()))
+    response = JSONResponse(build(form))
+    if key:
+        replays[key] = response
+    return response
+
+
+@app.post("/v1/prices")
+async def create_price(request: Request):
+    return await handle(request, "prices", lambda form: {
+        "id": f"price_{uuid.uuid4().hex[:24]}",
+        "object": "price",
+        "currency": form.get("currency"),
+        "unit_amount": int(form.get("unit_amount", 0)),
+        "product": f"prod_{uuid.uuid4().hex[:14]}",
+    })
+
+
+@app.post("/v1/checkout/sessions")
+async def create_session(request: Request):
+    def build(form):
+        session_id = f"cs_test_{uuid.uuid4().hex}"
+        lines = sum(1 for k in form if k.startswith("line_items[") and k.endswith("[price]"))
+        return {
+            "id": session_id,
+            "object": "checkout.session",
+            "url": f"https://checkout.stripe.test/c/pay/{session_id}",
+            "line_items_count": lines,
+        }
+
+    return await handle(request, "sessions", build)
+
+
+@app.get("/stats")
+async def get_stats():
+    return dict(stats)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=12111)
+    parser.add_argument("--latency-ms", type=float, default=100.0, help="added to every call")
+    parser.add_argument("--jitter-ms", type=float, default=50.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of calls answered with a 500")
+    args = parser.parse_args()
+    config.update(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, fail_rate=args.fail_rate)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
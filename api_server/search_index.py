@@ -0,0 +1,314 @@
+# api_server/search_index.py
+"""
+In-memory inverted index used by GET /products?q= (and its facet counts).
+
+Products are tokenized over name, description, category and meta_keywords,
+ranked with BM25 (field-weighted term frequencies), and the category and
+price filters are applied by intersecting posting sets, so a search only
+touches the documents that actually match instead of scanning the catalog.
+"""
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+from itertools import islice
+from bisect import bisect_left, bisect_right, insort
+
+TOKEN_RE = re.compile(r"[^\W_]+")
+
+# name matches matter most, description the least
+FIELD_WEIGHTS = {
+    "name": 3.0,
+    "category": 2.0,
+    "meta_keywords": 2.0,
+    "description": 1.0,
+}
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# a short prefix like "t" could expand to most of the vocabulary; cap it
+MAX_PREFIX_EXPANSION = 64
+
+# ranked result lists kept for repeated queries; cleared on every write
+RANKED_CACHE_SIZE = 256
+
+# projection needed to index a product
+INDEX_FIELDS = {"name": 1, "description": 1, "category": 1, "meta_keywords": 1, "price": 1, "sizes": 1, "colors": 1}
+
+
+def tokenize(text):
+    """Lower-cases and splits text into alphanumeric tokens."""
+    if not text:
+        return []
+    return TOKEN_RE.findall(str(text).lower())
+
+
+def _field_text(doc, field):
+    value = doc.get(field)
+    if isinstance(value, (list, tuple)):
+        return " ".join(str(v) for v in value if v)
+    return value
+
+
+def _to_price(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _values(value):
+    return tuple(dict.fromkeys(v for v in value if v)) if isinstance(value, (list, tuple)) else ()
+
+
+class ProductSearchIndex:
+    """Thread-safe inverted index keyed by the product's string _id."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._clear()
+
+    def _clear(self):
+        self._postings = {}      # term -> {doc_id: weighted tf}
+        self._doc_terms = {}     # doc_id -> {term: weighted tf}
+        self._doc_len = {}       # doc_id -> weighted document length
+        self._total_len = 0.0
+        self._vocab = []         # sorted terms, for prefix expansion
+        self._by_category = {}   # category -> {doc_id}
+        self._doc_category = {}  # doc_id -> category
+        self._doc_price = {}     # doc_id -> price
+        self._prices = []        # sorted [(price, doc_id)]
+        self._doc_options = {}   # doc_id -> (sizes, colors), for facet counts
+        self._ranked = OrderedDict()  # query tokens -> (ranked ids, id set)
+
+    def __len__(self):
+        return len(self._doc_len)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._doc_len
+
+    # --- maintenance ---
+
+    def rebuild(self, docs):
+        """Replaces the index contents with the given product documents."""
+        with self._lock:
+            self._clear()
+            for doc in docs:
+                self._add(doc, bulk=True)
+            self._vocab = sorted(self._postings)
+            self._prices.sort()
+
+    def upsert(self, doc):
+        """Indexes a new product or re-indexes a changed one."""
+        with self._lock:
+            self._remove(str(doc["_id"]))
+            self._add(doc)
+            self._ranked.clear()
+
+    def remove(self, doc_id):
+        with self._lock:
+            self._remove(str(doc_id))
+            self._ranked.clear()
+
+    def _add(self, doc, bulk=False):
+        doc_id = str(doc["_id"])
+
+        terms = {}
+        length = 0.0
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(_field_text(doc, field)):
+                terms[token] = terms.get(token, 0.0) + weight
+                length += weight
+
+        for term, tf in terms.items():
+            posting = self._postings.get(term)
+            if posting is None:
+                posting = self._postings[term] = {}
+                if not bulk:
+                    insort(self._vocab, term)
+            posting[doc_id] = tf
+
+        self._doc_terms[doc_id] = terms
+        self._doc_len[doc_id] = length
+        self._total_len += length
+
+        category = doc.get("category")
+        self._doc_category[doc_id] = category
+        self._by_category.setdefault(category, set()).add(doc_id)
+
+        self._doc_options[doc_id] = (_values(doc.get("sizes")), _values(doc.get("colors")))
+
+        price = _to_price(doc.get("price"))
+        self._doc_price[doc_id] = price
+        if bulk:
+            self._prices.append((price, doc_id))
+        else:
+            insort(self._prices, (price, doc_id))
+
+    def _remove(self, doc_id):
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+
+        for term in terms:
+            posting = self._postings[term]
+            posting.pop(doc_id, None)
+            if not posting:
+                del self._postings[term]
+                del self._vocab[bisect_left(self._vocab, term)]
+
+        self._total_len -= self._doc_len.pop(doc_id)
+
+        category = self._doc_category.pop(doc_id)
+        members = self._by_category.get(category)
+        if members is not None:
+            members.discard(doc_id)
+            if not members:
+                del self._by_category[category]
+
+        self._doc_options.pop(doc_id, None)
+        price = self._doc_price.pop(doc_id)
+        del self._prices[bisect_left(self._prices, (price, doc_id))]
+
+    # --- querying ---
+
+    def _expand(self, token):
+        """Returns the indexed terms the query token matches (exact or prefix)."""
+        start = bisect_left(self._vocab, token)
+        matches = []
+        for term in self._vocab[start:start + MAX_PREFIX_EXPANSION]:
+            if not term.startswith(token):
+                break
+            matches.append(term)
+        return matches
+
+    def _price_range(self, min_price, max_price):
+        lo = 0 if min_price is None else bisect_left(self._prices, (float(min_price), ""))
+        hi = len(self._prices) if max_price is None else bisect_right(self._prices, (float(max_price), "\uffff"))
+        return lo, hi
+
+    def filter_ids(self, candidates, categories=None, min_price=None, max_price=None):
+        """Intersects a candidate id set with the category and price filters."""
+        if categories:
+            allowed = set()
+            for name in categories:
+                allowed |= candidates & self._by_category.get(name, set())
+            candidates = allowed
+
+        if min_price is not None or max_price is not None:
+            lo, hi = self._price_range(min_price, max_price)
+            if hi - lo < len(candidates):
+                in_range = {doc_id for _, doc_id in self._prices[lo:hi]}
+                candidates = candidates & in_range
+            else:
+                low = float("-inf") if min_price is None else float(min_price)
+                high = float("inf") if max_price is None else float(max_price)
+                candidates = {d for d in candidates if low <= self._doc_price[d] <= high}
+
+        return candidates
+
+    def _rank(self, tokens):
+        """
+        Returns the ids matching every token, best BM25 score first. Ranking
+        does not depend on the filters, so it is cached per token tuple until
+        the next write.
+        """
+        key = tuple(tokens)
+        ranked = self._ranked.get(key)
+        if ranked is not None:
+            self._ranked.move_to_end(key)
+            return ranked
+
+        n_docs = len(self._doc_len)
+        avg_len = self._total_len / n_docs or 1.0
+
+        # one {doc_id: (tf, idf)} map per query token; when a token
+        # expands to several terms a document keeps its best one
+        token_postings = []
+        for token in tokens:
+            merged = {}
+            for term in self._expand(token):
+                posting = self._postings[term]
+                idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+                for doc_id, tf in posting.items():
+                    best = merged.get(doc_id)
+                    if best is None or best[0] * best[1] < tf * idf:
+                        merged[doc_id] = (tf, idf)
+            token_postings.append(merged)
+
+        # AND semantics: start from the rarest token and intersect
+        token_postings.sort(key=len)
+        candidates = set(token_postings[0])
+        for posting in token_postings[1:]:
+            candidates &= posting.keys()
+
+        def score(doc_id):
+            norm = K1 * (1 - B + B * self._doc_len[doc_id] / avg_len)
+            s = 0.0
+            for posting in token_postings:
+                tf, idf = posting[doc_id]
+                s += idf * tf * (K1 + 1) / (tf + norm)
+            return -s
+
+        order = sorted(candidates)
+        order.sort(key=score)
+        ranked = (order, frozenset(order))
+
+        self._ranked[key] = ranked
+        if len(self._ranked) > RANKED_CACHE_SIZE:
+            self._ranked.popitem(last=False)
+        return ranked
+
+    def search(self, q, categories=None, min_price=None, max_price=None, offset=0, limit=20):
+        """
+        Returns (total, ids) for the products matching every token in `q`,
+        best BM25 score first. Each token also matches terms it prefixes.
+        """
+        tokens = list(dict.fromkeys(tokenize(q)))
+        with self._lock:
+            if not tokens or not self._doc_len:
+                return 0, []
+
+            order, matched = self._rank(tokens)
+            if not (categories or min_price is not None or max_price is not None):
+                return len(order), order[offset:offset + max(limit, 0)]
+
+            allowed = self.filter_ids(matched, categories, min_price, max_price)
+            if not allowed or limit <= 0:
+                return len(allowed), []
+            page = islice((d for d in order if d in allowed), offset, offset + limit)
+            return len(allowed), list(page)
+
+    def facet_counts(self, q=None, categories=None, min_price=None, max_price=None, bucket=None):
+        """
+        {category, sizes, colors, price} Counters over the products matching
+        `q` (all products without one). Each facet skips its own filter (see
+        facets.py); `bucket` maps a price to its bucket key.
+        """
+        tokens = list(dict.fromkeys(tokenize(q))) if q else None
+        with self._lock:
+            if tokens is None:
+                base = self._doc_len.keys()
+            elif tokens and self._doc_len:
+                base = self._rank(tokens)[1]
+            else:
+                base = frozenset()
+            base = set(base)
+
+            in_price = self.filter_ids(base, min_price=min_price, max_price=max_price)
+            in_category = self.filter_ids(base, categories=categories)
+            both = in_price & in_category
+
+            sizes, colors = Counter(), Counter()
+            for doc_id in both:
+                doc_sizes, doc_colors = self._doc_options[doc_id]
+                sizes.update(doc_sizes)
+                colors.update(doc_colors)
+            return {
+                "category": Counter(self._doc_category[d] for d in in_price),
+                "sizes": sizes,
+                "colors": colors,
+                "price": Counter(bucket(self._doc_price[d]) if bucket else self._doc_price[d] for d in in_category),
+            }
@@ -0,0 +1,56 @@
+# api_server/slugs.py
+"""
+Case-insensitive slug resolution.
+
+Products store `slug_key`, the normalized form of `slug`, under a unique
+index, and each worker keeps a slug_key -> _id map so product detail pages
+resolve without touching Mongo at all.
+"""
+import threading
+
+
+def slug_key(slug) -> str:
+    """Normalized slug used for lookups and uniqueness (`Neon-Geometry ` -> `neon-geometry`)."""
+    return str(slug or "").strip().lower()
+
+
+class SlugMap:
+    def __init__(self):
+        self._ids = {}    # slug_key -> product id
+        self._slugs = {}  # product id -> slug_key
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def get(self, slug):
+        return self._ids.get(slug_key(slug))
+
+    def rebuild(self, docs):
+        ids, slugs = {}, {}
+        for doc in docs:
+            key = slug_key(doc.get("slug"))
+            if key:
+                doc_id = str(doc["_id"])
+                ids[key] = doc_id
+                slugs[doc_id] = key
+        with self._lock:
+            self._ids, self._slugs = ids, slugs
+
+    def upsert(self, doc):
+        doc_id = str(doc["_id"])
+        key = slug_key(doc.get("slug"))
+        with self._lock:
+            old = self._slugs.pop(doc_id, None)
+            if old is not None and self._ids.get(old) == doc_id:
+                del self._ids[old]
+            if key:
+                self._ids[key] = doc_id
+                self._slugs[doc_id] = key
+
+    def remove(self, doc_id):
+        doc_id = str(doc_id)
+        with self._lock:
+            old = self._slugs.pop(doc_id, None)
+            if old is not None and self._ids.get(old) == doc_id:
+                del self._ids[old]
@@ -10,6 +10,8 @@ const Checkout = () => {
   const navigate = useNavigate();
   const { items, totalPrice, clearCart } = useCart();
   const [isProcessing, setIsProcessing] = useState(false);
+  // one key per checkout: a retried submit returns the same order instead of a duplicate
+  const [idempotencyKey] = useState(() => crypto.randomUUID());
 
 const API_BASE = import.meta.env.VITE_API_BASE || "http://localhost:8000";
 const USER_ID = "guest_user"; // Replace with actual logged-in user later
@@ -30,7 +32,7 @@ const handleSubmit = async (e: React.FormEvent) => {
   try {
     const res = await fetch(`${API_BASE}/orders/${USER_ID}`, {
       method: "POST",
-      headers: { "Content-Type": "application/json" },
+      headers: { "Content-Type": "application/json", "Idempotency-Key": idempotencyKey },
       body: JSON.stringify({
         items,
         total: totalPrice,
@@ -37,6 +37,11 @@ interface Product {
   sizes: string[];
   colors: string[];
   category: string;
+  rating?: {
+    count: number;
+    mean: number | null;
+    histogram: Record<string, number>;
+  };
 }
 
 export default function ProductDetail() {
@@ -50,6 +55,7 @@ export default function ProductDetail() {
   const [selectedSize, setSelectedSize] = useState("M");
   const [quantity, setQuantity] = useState(1);
   const [reviews, setReviews] = useState<Review[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [rating, setRating] = useState(0);
   const [comment, setComment] = useState("");
   const [submitting, setSubmitting] = useState(false);
@@ -79,17 +85,35 @@ export default function ProductDetail() {
     if (product) fetchReviews();
   }, [product]);
 
-  const fetchReviews = async () => {
+  // first page by default; pass next_cursor to append older reviews
+  const fetchReviews = async (cursor?: string) => {
     if (!product) return;
     try {
-      const res = await fetch(`${API_BASE}/reviews/${product._id}`);
+      const params = new URLSearchParams({ limit: "10" });
+      if (cursor) params.set("cursor", cursor);
+      const res = await fetch(`${API_BASE}/reviews/${product._id}?${params}`);
       const data = await res.json();
-      setReviews(data.reviews || []);
+      setReviews((prev) => (cursor ? [...prev, ...(data.reviews || [])] : data.reviews || []));
+      setNextCursor(data.next_cursor || null);
     } catch (error) {
       console.error("Error fetching reviews:", error);
     }
   };
 
+  // the rating summary lives on the product; refetch it after a review changes
+  const refreshReviews = async () => {
+    if (!product) return;
+    try {
+      const res = await fetch(`${API_BASE}/products/slug/${product.slug}`);
+      if (res.ok) {
+        const data = await res.json();
+        setProduct((prev) => (prev ? { ...prev, rating: data.rating } : prev));
+      }
+    } catch (error) {
+      console.error("Error refreshing rating:", error);
+    }
+  };
+
   // 🔹 Add to Cart
   const handleAddToCart = () => {
     if (product) {
@@ -146,7 +170,7 @@ export default function ProductDetail() {
 
       setRating(0);
       setComment("");
-      fetchReviews();
+      refreshReviews();
     } catch (error: any) {
       if (error instanceof z.ZodError) {
         toast({
@@ -166,10 +190,8 @@ export default function ProductDetail() {
     }
   };
 
-  const averageRating =
-    reviews.length > 0
-      ? reviews.reduce((acc, review) => acc + review.rating, 0) / reviews.length
-      : 0;
+  const averageRating = product?.rating?.mean ?? 0;
+  const reviewCount = product?.rating?.count ?? 0;
 
   if (loading) {
     return (
@@ -302,7 +324,7 @@ export default function ProductDetail() {
       <div className="mt-12 sm:mt-16">
         <div className="mb-6 sm:mb-8">
           <h2 className="text-2xl sm:text-3xl font-bold mb-2">Customer Reviews</h2>
-          {reviews.length > 0 && (
+          {reviewCount > 0 && (
             <div className="flex flex-wrap items-center gap-2">
               <div className="flex items-center">
                 {Array.from({ length: 5 }).map((_, i) => (
@@ -320,7 +342,7 @@ export default function ProductDetail() {
                 {averageRating.toFixed(1)} out of 5
               </span>
               <span className="text-muted-foreground">
-                ({reviews.length} {reviews.length === 1 ? "review" : "reviews"})
+                ({reviewCount} {reviewCount === 1 ? "review" : "reviews"})
               </span>
             </div>
           )}
@@ -386,7 +408,7 @@ export default function ProductDetail() {
         <div className="space-y-4">
           {reviews.length > 0 ? (
             reviews.map((review) => (
-              <ReviewCard key={review._id} review={review} onDelete={fetchReviews} />
+              <ReviewCard key={review._id} review={review} onDelete={refreshReviews} />
             ))
           ) : (
             <div className="text-center py-12 border-2 border-dashed border-muted rounded-lg">
@@ -395,6 +417,13 @@ export default function ProductDetail() {
               </p>
             </div>
           )}
+          {nextCursor && (
+            <div className="text-center">
+              <Button variant="outline" onClick={() => fetchReviews(nextCursor)}>
+                Load more reviews
+              </Button>
+            </div>
+          )}
         </div>
       </div>
     </div>
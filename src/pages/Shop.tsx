@@ -30,6 +30,7 @@ const Shop = () => {
   const [priceRange, setPriceRange] = useState<[number, number]>([0, 5000]);
   const [loading, setLoading] = useState(false);
   const [total, setTotal] = useState(0);
+  const [categoryCounts, setCategoryCounts] = useState<Record<string, number>>({});
   const [filtersOpen, setFiltersOpen] = useState(false);
 
   // Fetch categories from backend
@@ -63,6 +64,8 @@ const Shop = () => {
         params.set("max_price", String(priceRange[1]));
         params.set("page", "1");
         params.set("limit", "50");
+        params.set("fields", "card");
+        params.set("facets", "1");
 
         const res = await fetch(`${API_BASE}/products?${params.toString()}`);
         const data = await res.json();
@@ -89,6 +92,12 @@ const Shop = () => {
 
         setProducts(normalized);
         setTotal(typeof data.total === 'number' ? data.total : normalized.length);
+        // counts for the sidebar: what each category would show with the current price range
+        const counts: Record<string, number> = {};
+        (data.facets?.category || []).forEach((f: { value: string; count: number }) => {
+          counts[f.value] = f.count;
+        });
+        setCategoryCounts(counts);
       } catch (err) {
         console.error("Error fetching products:", err);
         setProducts([]);
@@ -132,6 +141,7 @@ const Shop = () => {
                     className="text-sm font-medium cursor-pointer hover:text-primary transition-colors"
                   >
                     {category}
+                    <span className="ml-1 text-muted-foreground">({categoryCounts[category] ?? 0})</span>
                   </Label>
                 </div>
               ))}
@@ -36,15 +36,22 @@ export default function Customers() {
   const [searchQuery, setSearchQuery] = useState("");
   const [isLoading, setIsLoading] = useState(false);
   const [currentPage, setCurrentPage] = useState(1);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [totalCustomers, setTotalCustomers] = useState<number | null>(null);
   const customersPerPage = 10;
 
-  // Fetch customers
-  const fetchCustomers = async () => {
+  // Fetch customers; the API pages newest first, pass next_cursor to append the next page
+  const fetchCustomers = async (cursor?: string) => {
     try {
       setIsLoading(true);
-      const res = await fetch(`${API_BASE}/customers`);
+      const params = new URLSearchParams();
+      if (cursor) params.set("cursor", cursor);
+      const res = await fetch(`${API_BASE}/customers?${params}`);
       const data = await res.json();
-      setCustomers(data.customers || []);
+      const page: Customer[] = data.customers || [];
+      setCustomers((prev) => (cursor ? [...prev, ...page] : page));
+      if (!cursor) setTotalCustomers(data.total ?? null);
+      setNextCursor(data.next_cursor || null);
     } catch (err) {
       toast({
         title: "Error",
@@ -157,7 +164,7 @@ export default function Customers() {
           <Button onClick={() => setEditingCustomer(null)}>
             <Plus className="h-4 w-4 mr-2" /> Add Customer
           </Button>
-          <Button onClick={fetchCustomers} disabled={isLoading}>
+          <Button onClick={() => fetchCustomers()} disabled={isLoading}>
             <RefreshCw className="h-4 w-4 mr-2" /> Refresh
           </Button>
         </div>
@@ -210,7 +217,10 @@ export default function Customers() {
       <Card className="p-4 md:p-6 overflow-x-auto">
         <div className="flex justify-between mb-4">
           <p className="text-sm text-muted-foreground">
-            Total Customers: <span className="font-semibold">{filtered.length}</span>
+            Total Customers:{" "}
+            <span className="font-semibold">
+              {searchQuery ? filtered.length : totalCustomers ?? filtered.length}
+            </span>
           </p>
         </div>
         <Table>
@@ -279,6 +289,13 @@ export default function Customers() {
             </Button>
           </div>
         )}
+        {nextCursor && (
+          <div className="flex justify-center pt-4">
+            <Button variant="outline" onClick={() => fetchCustomers(nextCursor)} disabled={isLoading}>
+              Load more
+            </Button>
+          </div>
+        )}
       </Card>
     </div>
   );
@@ -64,20 +64,19 @@ export default function Dashboard() {
       const customersData = await customersRes.json();
       const productsData = await productsRes.json();
 
+      // first page only (newest first); the totals come from the server-side summary
       const allOrders = ordersData.orders || [];
-      const allCustomers = customersData.customers || [];
+      const orderSummary = ordersData.summary || {};
       const totalProducts =
         productsData.total_products || productsData.items?.length || 0;
 
       // 🧮 Compute totals safely
-      const totalRevenue =
-        allOrders.reduce((sum: number, o: any) => sum + (o.total || 0), 0) ||
-        45231.89;
+      const totalRevenue = orderSummary.total_revenue || 45231.89;
 
       // 📊 Build sales trend data (dummy if empty)
       const monthlySales =
         allOrders.length > 0
-          ? allOrders.slice(-6).map((o, i) => ({
+          ? allOrders.slice(0, 6).reverse().map((o, i) => ({
               name: `Month ${i + 1}`,
               sales: o.total || Math.random() * 3000,
             }))
@@ -97,12 +96,12 @@ export default function Dashboard() {
         { _id: "3", user_name: "Mike Johnson", total: 320, status: "Pending" },
       ];
 
-      setOrders(allOrders.length ? allOrders.slice(-5).reverse() : dummyOrders);
+      setOrders(allOrders.length ? allOrders.slice(0, 5) : dummyOrders);
 
       setStats({
         revenue: totalRevenue,
-        orders: allOrders.length || 2350,
-        customers: allCustomers.length || 12234,
+        orders: orderSummary.total_orders || 2350,
+        customers: customersData.total || 12234,
         products: totalProducts || 573,
       });
 
@@ -44,14 +44,20 @@ export default function AdminOrders() {
   const [editingOrder, setEditingOrder] = useState<Order | null>(null);
   const [filteredOrders, setFilteredOrders] = useState<Order[]>([]);
   const [isLoading, setIsLoading] = useState(false);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
 
-  const fetchOrders = async () => {
+  // the API pages newest first; pass the previous page's next_cursor to append the next one
+  const fetchOrders = async (cursor?: string) => {
     try {
       setIsLoading(true);
-      const res = await fetch(`${API_BASE}/admin/orders`);
+      const params = new URLSearchParams({ fields: "summary" });
+      if (cursor) params.set("cursor", cursor);
+      const res = await fetch(`${API_BASE}/admin/orders?${params}`);
       const data = await res.json();
-      setOrders(data.orders || []);
-      setFilteredOrders(data.orders || []);
+      const page: Order[] = data.orders || [];
+      setOrders((prev) => (cursor ? [...prev, ...page] : page));
+      if (!cursor) setFilteredOrders(page);
+      setNextCursor(data.next_cursor || null);
     } catch (err) {
       console.error(err);
       toast({
@@ -159,7 +165,7 @@ export default function AdminOrders() {
           </p>
         </div>
         <div className="flex gap-3 flex-wrap">
-          <Button onClick={fetchOrders} disabled={isLoading}>
+          <Button onClick={() => fetchOrders()} disabled={isLoading}>
             <RefreshCw className="h-4 w-4 mr-2" />
             Refresh
           </Button>
@@ -242,6 +248,13 @@ export default function AdminOrders() {
             ))}
           </TableBody>
         </Table>
+        {nextCursor && (
+          <div className="flex justify-center pt-4">
+            <Button variant="outline" onClick={() => fetchOrders(nextCursor)} disabled={isLoading}>
+              Load more
+            </Button>
+          </div>
+        )}
       </Card>
 
       {/* Edit Order Status Modal */}